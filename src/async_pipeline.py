@@ -0,0 +1,360 @@
+"""asyncio pipeline: same Notion output as Pipeline, one event loop for all documents."""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from openai import AsyncOpenAI
+
+from . import metrics
+from .catalog import SourceCatalog
+from .concurrency import AdaptiveLimit, AsyncAdaptiveLimit
+from .config import PipelineConfig
+from .drive_client import DriveClient
+from .drive_sync import DriveSync
+from .enrichment import build_async_client, enrich_async, input_budget
+from .extraction import ExtractionError, build_extractor
+from .formatter import format_blocks, format_properties, format_property_updates
+from .index import DedupIndex
+from .models import ContentStatus, EnrichmentResult
+from .notion_client import (
+    BLOCKS_PER_REQUEST, AsyncNotionClient, NotionClient, is_validation_error, source_record,
+)
+from .pipeline import Pipeline, _Document, _DocumentRules, discover_pdfs, source_content
+from .result_cache import build_result_cache
+from .retry import configure_services, retrier
+from .tool_cache import build_tool_cache
+from .workspace_index import build_workspace_index, refresh_workspace
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncPipeline(_DocumentRules):
+    """Ingest PDFs like Pipeline, but with async OpenAI and Notion clients.
+
+    Hundreds of documents can be in flight at once: each one is a task on a
+    single event loop, and waiting on OpenAI or Notion does not tie up a
+    thread. Drive (googleapiclient) and pdfminer are blocking, so downloads
+    and text extraction run in worker threads via asyncio.to_thread. The
+    steps mirror Pipeline's and share its skip, resume and record rules.
+    """
+
+    def __init__(
+        self,
+        config: PipelineConfig,
+        drive: Optional[DriveClient] = None,
+        notion: Optional[AsyncNotionClient] = None,
+        openai_client: Optional[AsyncOpenAI] = None,
+    ):
+        self.config = config
+        configure_services(config)
+        self.drive = drive or DriveClient(config.drive)
+        self.tool_cache = build_tool_cache(config.notion)
+        self.notion = notion or AsyncNotionClient(config.notion, tool_cache=self.tool_cache)
+        self.sync = DriveSync(
+            self.drive, config.state_dir, config.drive.incremental, config.drive.reconcile
+        )
+        self.openai = openai_client or build_async_client(config.openai)
+        self.extractor = build_extractor(config.extraction)
+        self.index = (
+            DedupIndex(os.path.join(config.state_dir, "index.sqlite3"))
+            if config.state_dir
+            else None
+        )
+        self.results = build_result_cache(config)
+        self.workspace = build_workspace_index(config)
+        # Sources preload, armed by run() and read on first use (see Pipeline)
+        self.catalog: Optional[SourceCatalog] = None
+        self._catalog_pending = False
+        self._catalog_lock = asyncio.Lock()
+        # Adaptive caps on in-flight calls (see Pipeline); Notion caps itself
+        # inside AsyncNotionClient
+        self._drive_slot = AsyncAdaptiveLimit(
+            "drive", config.drive.max_concurrency, config.drive.concurrency_ceiling
+        )
+        self._openai_slot = AsyncAdaptiveLimit(
+            "openai", config.openai.max_concurrency, config.openai.concurrency_ceiling
+        )
+        self._print_lock = threading.Lock()
+
+    def run_sync(self) -> Dict[str, int]:
+        """Run the pipeline on a fresh event loop."""
+        return asyncio.run(self.run())
+
+    async def run(self) -> Dict[str, int]:
+        """Process all new PDFs. Returns stats dict."""
+        start_time = time.monotonic()
+        metrics.start_run()
+        stats = {"total": 0, "processed": 0, "skipped": 0, "failed": 0}
+
+        # The crawl runs once, before any document, on the blocking client
+        if self.workspace is not None and await asyncio.to_thread(
+            refresh_workspace, self.workspace, NotionClient(self.config.notion)
+        ):
+            self.notion.workspace = self.workspace
+
+        self.catalog = None
+        self._catalog_pending = True
+
+        # Bound the number of documents (and so downloaded PDFs) in flight
+        in_flight = asyncio.Semaphore(max(1, self.config.async_tasks))
+
+        async def bounded(f: Dict[str, Any], idx: int) -> str:
+            async with in_flight:
+                return await self.process_one(f, idx, None)
+
+        # The Drive listing is blocking: pull each file in a worker thread and
+        # start its task right away, while the rest is still being listed.
+        files = discover_pdfs(self.sync.files(), self.config.drive.sort_window)
+        tasks: List[asyncio.Task[str]] = []
+        while True:
+            f = await asyncio.to_thread(next, files, None)
+            if f is None:
+                break
+            tasks.append(asyncio.create_task(bounded(f, len(tasks) + 1)))
+
+        # Single event loop thread: tallying outcomes needs no lock
+        for outcome in await asyncio.gather(*tasks):
+            stats[outcome] += 1
+        stats["total"] = len(tasks)
+        self.sync.commit()
+
+        Pipeline._summarize(stats, start_time, self.tool_cache, self._limits(), self.config)
+        return stats
+
+    def _limits(self) -> Dict[str, Any]:
+        limits = {"drive": self._drive_slot, "openai": self._openai_slot}
+        if isinstance(getattr(self.notion, "_slot", None), AdaptiveLimit):
+            limits["notion"] = self.notion._slot
+        return limits
+
+    async def _drive(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a blocking Drive call in a thread, each attempt holding a Drive slot."""
+        async def attempt() -> T:
+            async with self._drive_slot:
+                return await asyncio.to_thread(fn, *args)
+        return await retrier("drive").acall(attempt)
+
+    async def _sources(self) -> Optional[SourceCatalog]:
+        """Return the catalog, reading the whole Sources database once if armed."""
+        async with self._catalog_lock:
+            if self._catalog_pending:
+                try:
+                    pages = [page async for page in self.notion.iter_source_pages()]
+                    self.catalog = SourceCatalog.from_pages(pages)
+                    print(f"Loaded {len(self.catalog)} existing sources from Notion")
+                except Exception as e:
+                    log.warning("Could not preload Sources, querying Notion per file: %s", e)
+                self._catalog_pending = False
+        return self.catalog
+
+    async def _existing(self, doc: _Document) -> Optional[Dict[str, Any]]:
+        """Return the Sources record for this Drive file ID or title (see Pipeline._existing)."""
+        with metrics.timed("title_check"):
+            catalog = await self._sources()
+            if catalog is not None:
+                return catalog.find("drive_id", doc.file["id"]) or catalog.find("name", doc.name)
+            exists = await self.notion.title_exists(doc.name)
+        return {"page_id": None, "content_hash": None, "status": None} if exists else None
+
+    async def _find_source(self, key: str, value: str) -> Optional[Dict[str, Any]]:
+        """Find a Sources page by "content_hash" or "md5" as a source_record dict."""
+        catalog = await self._sources()
+        if catalog is not None:
+            return catalog.find(key, value)
+        find = self.notion.find_by_hash if key == "content_hash" else self.notion.find_by_md5
+        page = await find(value)
+        return source_record(page) if page else None
+
+    async def _md5_entry(self, doc: _Document) -> Optional[Dict[str, Any]]:
+        """Look the listing's md5Checksum up in the index, then in Notion."""
+        md5 = doc.file.get("md5Checksum")
+        if not md5:
+            return None
+        with metrics.timed("md5_check"):
+            entry = self.index.md5_known(md5) if self.index is not None else None
+            if entry is None:
+                entry = await self._find_source("md5", md5)
+        return entry
+
+    async def process_one(
+        self, f: Dict[str, Any], idx: int = 1, total: Optional[int] = 1
+    ) -> str:
+        """Process a single Drive file end to end.
+
+        Returns the outcome as a stats key: "processed", "skipped", or "failed".
+        """
+        doc = _Document(f, idx, total)
+        for step in (self._fetch_step, self._extract_step, self._enrich_step, self._write_step):
+            await self._run_step(step, doc)
+            if doc.outcome is not None:
+                break
+        return doc.outcome or "failed"
+
+    async def _run_step(
+        self, step: Callable[[_Document], Awaitable[None]], doc: _Document
+    ) -> None:
+        """Run one step, turning an unexpected error into a failed outcome."""
+        try:
+            await step(doc)
+        except Exception as e:
+            self._step_failed(doc, e)
+        self._step_done(doc)
+
+    async def _fetch_step(self, doc: _Document) -> None:
+        """Dedup, download and hash, then dedup by content hash (see Pipeline._fetch_step)."""
+        self._say(Pipeline._header(doc.file, doc.idx, doc.total))
+
+        # Local index: already-processed files cost no network calls
+        if self._skip_indexed(doc):
+            return
+
+        # Drive file ID or title already in Sources (before downloading)
+        if doc.page_id is None and self._skip_existing(doc, await self._existing(doc)):
+            return
+
+        # Drive's own checksum: a known md5 means known content, no download needed
+        if doc.page_id is None and self._skip_md5(doc, await self._md5_entry(doc)):
+            return
+
+        if doc.content_hash and self._use_cached_result(doc):
+            return
+
+        # Download, hashing as the chunks stream in
+        with metrics.timed("download"):
+            doc.pdf = await self._drive(self.drive.download, doc.file["id"])
+        metrics.add("bytes_downloaded", doc.pdf.size)
+        doc.content_hash = doc.pdf.sha256
+
+        if doc.page_id is None:
+            with metrics.timed("hash_check"):
+                indexed = self.index is not None and self.index.hash_known(doc.content_hash)
+                known = None if indexed else await self._find_source(
+                    "content_hash", doc.content_hash
+                )
+            if self._skip_hash(doc, indexed, known):
+                return
+
+        if self._use_cached_result(doc):
+            doc.pdf.close()
+            doc.pdf = None
+
+    async def _extract_step(self, doc: _Document) -> None:
+        """Extract text in a worker thread (CPU-bound, off the event loop), then release the PDF."""
+        if doc.result is not None:
+            return  # Enrichment came from the cache; the text is not needed
+        pdf = doc.pdf
+        if pdf is None:
+            raise ValueError(f"{doc.name} was not downloaded")
+        try:
+            with metrics.timed("extract"):
+                extracted = await asyncio.to_thread(
+                    self.extractor.extract, pdf, input_budget(self.config.openai)
+                )
+        except ExtractionError as e:
+            self._extraction_failed(doc, e)
+            return
+        finally:
+            pdf.close()
+            doc.pdf = None
+        self._extracted(doc, extracted)
+
+    async def _enrich_step(self, doc: _Document) -> None:
+        """Run AI enrichment unless the result came from the cache (see Pipeline._enrich_step)."""
+        if doc.result is not None:
+            return
+        if doc.text is None:
+            raise ValueError(f"{doc.name} has no extracted text to enrich")
+        with metrics.timed("enrich"):
+            doc.result = await enrich_async(
+                doc.text,
+                self.config.openai,
+                notion=self.notion,
+                client=self.openai,
+                slot=self._openai_slot,
+                truncated=doc.truncated,
+            )
+        doc.text = None
+        if not doc.result:
+            # A new document gets a Failed page
+            if doc.page_id is None:
+                doc.page_id = await retrier("notion").acall(
+                    self.notion.create_page,
+                    source_content(doc.file, doc.content_hash, ContentStatus.FAILED),
+                )
+            else:
+                await retrier("notion").acall(
+                    self.notion.set_status, doc.page_id, ContentStatus.FAILED
+                )
+            self._enrich_failed(doc)
+            return
+        self._cache_result(doc)
+
+    async def _write_step(self, doc: _Document) -> None:
+        """Write the enriched page to Notion and mark it Enriched."""
+        result = doc.result
+        if result is None:
+            raise ValueError(f"{doc.name} has no enrichment result to write")
+        blocks = format_blocks(result)
+        with metrics.timed("notion_write"):
+            if doc.page_id is None:
+                await self._create_enriched(doc, result, blocks)
+            else:
+                await self._update_enriched(doc, result, blocks)
+        self._written(doc)
+
+    async def _create_enriched(
+        self, doc: _Document, result: EnrichmentResult, blocks: List[Dict[str, Any]]
+    ) -> None:
+        """Create a new page complete in one request (see Pipeline._create_enriched)."""
+        first, overflow = blocks[:BLOCKS_PER_REQUEST], blocks[BLOCKS_PER_REQUEST:]
+        status = ContentStatus.PROCESSING if overflow else ContentStatus.ENRICHED
+        try:
+            doc.page_id = await retrier("notion").acall(
+                self.notion.create_page,
+                source_content(doc.file, doc.content_hash, status),
+                format_properties(result),
+                first,
+            )
+        except Exception as e:
+            if not is_validation_error(e):
+                raise
+            log.warning("Creating the page for %s in one request failed, writing it in steps: %s",
+                        doc.name, e)
+            doc.page_id = await retrier("notion").acall(
+                self.notion.create_page, source_content(doc.file, doc.content_hash)
+            )
+            self._record(doc, ContentStatus.PROCESSING.value)
+            await self._update_enriched(doc, result, blocks, resumed=False)  # New, empty page
+            return
+        if overflow:
+            self._record(doc, ContentStatus.PROCESSING.value)
+            await self.notion.add_blocks(doc.page_id, overflow)  # Retries each request itself
+            await retrier("notion").acall(
+                self.notion.set_status, doc.page_id, ContentStatus.ENRICHED
+            )
+
+    async def _update_enriched(
+        self,
+        doc: _Document,
+        result: EnrichmentResult,
+        blocks: List[Dict[str, Any]],
+        resumed: bool = True,
+    ) -> None:
+        """Write enrichment onto an existing page, then mark it Enriched.
+
+        A resumed page's leftover blocks are deleted first (see Pipeline._update_enriched).
+        """
+        page_id = doc.page_id
+        if page_id is None:
+            raise ValueError(f"{doc.name} has no page to update")
+        if resumed and await self.notion.clear_blocks(page_id):
+            log.info("Cleared the partly written body of %s", doc.name)
+        for props in format_property_updates(result):
+            await retrier("notion").acall(self.notion.update_page_properties, page_id, props)
+        await self.notion.add_blocks(page_id, blocks)
+        await retrier("notion").acall(self.notion.set_status, page_id, ContentStatus.ENRICHED)
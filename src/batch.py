@@ -0,0 +1,171 @@
+"""OpenAI Batch API mode: enrich a backlog as one asynchronous batch."""
+import json
+import logging
+import os
+import time
+from typing import IO, Any, Callable, Dict, Iterable, Optional
+
+from .config import OpenAIConfig
+from .enrichment import parse_result, single_shot_request
+from .models import EnrichmentResult
+
+log = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/responses"
+
+# Batch API input limits (requests per batch, size of the uploaded file)
+MAX_REQUESTS = 50_000
+MAX_INPUT_BYTES = 190 * 1_048_576
+
+_FINISHED = ("completed", "failed", "expired", "cancelled")
+
+
+def batch_line(custom_id: str, text: str, config: OpenAIConfig, truncated: bool = False) -> str:
+    """One JSONL request: the tool-less json_object call enrich() makes without notion."""
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": single_shot_request(text, config, truncated),
+    }) + "\n"
+
+
+def _output_text(body: Dict[str, Any]) -> str:
+    """Concatenated output_text of a Responses API response object."""
+    return "".join(
+        part.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for part in item.get("content", [])
+        if part.get("type") == "output_text"
+    )
+
+
+def parse_output(lines: Iterable[str]) -> Dict[str, Optional[EnrichmentResult]]:
+    """Map custom_id to its EnrichmentResult (None for errors and bad output)."""
+    results: Dict[str, Optional[EnrichmentResult]] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record["custom_id"]
+        response = record.get("response") or {}
+        results[custom_id] = None
+        if record.get("error") or response.get("status_code") != 200:
+            log.warning("Batch request %s failed: %s", custom_id, record.get("error") or response)
+            continue
+        try:
+            results[custom_id] = parse_result(_output_text(response.get("body") or {}))
+        except ValueError as e:
+            log.warning("Batch request %s returned unreadable JSON: %s", custom_id, e)
+    return results
+
+
+class BatchJob:
+    """A batch of enrichment requests and the documents waiting on it.
+
+    Requests are appended to state_dir/batch_input.jsonl. Once submitted,
+    the batch ID and each document's page and hash are kept in
+    state_dir/batch.json, so a run that is stopped while the batch is
+    pending picks the same batch up again instead of submitting another.
+    done() drops each document as its result is written, and clear()
+    removes both files once all of them are.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        state_dir: str,
+        poll_interval: float = 60.0,
+        sleep: Optional[Callable[[float], None]] = None,
+    ):
+        os.makedirs(state_dir, exist_ok=True)
+        self.client = client
+        self.path = os.path.join(state_dir, "batch.json")
+        self.input_path = os.path.join(state_dir, "batch_input.jsonl")
+        self.poll_interval = poll_interval
+        self._sleep = sleep or time.sleep
+        self.batch_id: Optional[str] = None
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._input: Optional[IO[str]] = None
+        self._input_bytes = 0
+
+    def load(self) -> bool:
+        """Read the state of a batch an earlier run submitted. False if there is none."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.batch_id = state["batch_id"]
+        self.documents = state["documents"]
+        return True
+
+    def _save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"batch_id": self.batch_id, "documents": self.documents}, f)
+        os.replace(tmp, self.path)
+
+    def fits(self, line: str) -> bool:
+        """Whether one more request stays within the Batch API input limits."""
+        return (
+            len(self.documents) < MAX_REQUESTS
+            and self._input_bytes + len(line.encode()) <= MAX_INPUT_BYTES
+        )
+
+    def add(self, custom_id: str, line: str, document: Dict[str, Any]) -> None:
+        """Append a request (see batch_line) for a document."""
+        if self._input is None:
+            self._input = open(self.input_path, "w")
+        self._input.write(line)
+        self._input_bytes += len(line.encode())
+        self.documents[custom_id] = document
+
+    def submit(self) -> str:
+        """Upload the requests, create the batch and save its state."""
+        if self._input is not None:
+            self._input.close()
+        with open(self.input_path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+        )
+        self.batch_id = batch.id
+        self._save()
+        return str(batch.id)
+
+    def wait(self) -> Any:
+        """Poll until the batch has finished; returns the final batch object."""
+        while True:
+            batch = self.client.batches.retrieve(self.batch_id)
+            if batch.status in _FINISHED:
+                return batch
+            counts = getattr(batch, "request_counts", None)
+            if counts is not None:
+                log.info(
+                    "Batch %s %s: %d/%d requests done",
+                    self.batch_id, batch.status, counts.completed + counts.failed, counts.total,
+                )
+            self._sleep(self.poll_interval)
+
+    def results(self, batch: Any) -> Dict[str, Optional[EnrichmentResult]]:
+        """Read the output and error files of a finished batch."""
+        results: Dict[str, Optional[EnrichmentResult]] = {}
+        for file_id in (getattr(batch, "error_file_id", None), getattr(batch, "output_file_id", None)):
+            if file_id:
+                results.update(parse_output(self.client.files.content(file_id).text.splitlines()))
+        return results
+
+    def done(self, custom_id: str) -> None:
+        """Forget one document once its result is written, so a resumed run skips it."""
+        self.documents.pop(custom_id, None)
+        self._save()
+
+    def clear(self) -> None:
+        """Forget the batch once its results have been written."""
+        for path in (self.path, self.input_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,68 @@
+"""In-memory catalog of the Sources database, loaded once per run for dedup."""
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+
+from .notion_client import source_record
+
+_KEYS = ("content_hash", "md5", "drive_id", "name")
+
+
+class SourceCatalog:
+    """Content hashes, Drive file IDs, md5s and titles of existing Sources pages.
+
+    Built from one paginated read of the database (100 pages per request),
+    so each dedup check during the run is a dict lookup rather than a
+    Notion query per file. Pages the run creates are added as they are
+    written; all access goes through one lock, so worker threads can share
+    a catalog.
+    """
+
+    def __init__(self) -> None:
+        self._tables: Dict[str, Dict[str, Dict[str, Any]]] = {k: {} for k in _KEYS}
+        self._page_ids: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[Dict[str, Any]]) -> "SourceCatalog":
+        """Build a catalog from raw Sources database pages."""
+        catalog = cls()
+        for page in pages:
+            catalog.add(source_record(page))
+        return catalog
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._page_ids)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Add a record shaped like notion_client.source_record()."""
+        with self._lock:
+            self._page_ids.add(record["page_id"])
+            for key in _KEYS:
+                if record.get(key):
+                    self._tables[key][record[key]] = record
+
+    def add_file(
+        self,
+        f: Dict[str, Any],
+        content_hash: str,
+        page_id: str,
+        status: Optional[str],
+    ) -> None:
+        """Add a page just created for Drive file f."""
+        self.add({
+            "page_id": page_id,
+            "drive_id": f["id"],
+            "name": f["name"],
+            "content_hash": content_hash,
+            "md5": f.get("md5Checksum"),
+            "status": status,
+        })
+
+    def find(self, key: str, value: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the record whose key ("content_hash", "md5", "drive_id" or
+        "name") equals value, or None."""
+        if not value:
+            return None
+        with self._lock:
+            return self._tables[key].get(value)
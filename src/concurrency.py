@@ -0,0 +1,182 @@
+"""Adaptive (AIMD) limits on in-flight calls to each external service."""
+import asyncio
+import logging
+import threading
+import time
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Optional, Type, TypeVar
+
+from .retry import _is_transient
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AdaptiveLimit:
+    """Concurrency cap for one service that adapts to how the service copes.
+
+    Used like a BoundedSemaphore around each request. Healthy responses
+    raise the limit additively, by about one slot per limit's worth of
+    completed calls, as long as the slots are in use and latency stays
+    within tolerance times the best seen. A transient error (as classified
+    by retry._is_transient: 429s, 5xx, timeouts) cuts it multiplicatively
+    by backoff, at most once per round trip, so one burst of errors counts
+    once. The limit stays within [minimum, maximum].
+    """
+
+    def __init__(
+        self,
+        service: str,
+        initial: int,
+        maximum: int = 0,
+        minimum: int = 1,
+        backoff: float = 0.5,
+        tolerance: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.service = service
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial * 4)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._started: Dict[Any, List[float]] = {}
+        self._best: Optional[float] = None  # Lowest recent latency (drifts up 1% a call)
+        self._last_cut = float("-inf")
+        self.in_flight = 0
+        self.low = self.high = int(self.limit)
+        self.calls = self.increases = self.decreases = self.errors = 0
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _key(self) -> Any:
+        return threading.get_ident()
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self._started.setdefault(self._key(), []).append(self._clock())
+
+    def _finish(self, exc: Optional[BaseException]) -> None:
+        """Release a slot and adjust the limit from the call's outcome."""
+        with self._lock:
+            self.in_flight -= 1
+            key = self._key()
+            started = self._started[key].pop()
+            if not self._started[key]:
+                del self._started[key]
+            now = self._clock()
+            latency = now - started
+            if exc is not None:
+                if _is_transient(exc):
+                    self.errors += 1
+                    self._decrease(now, latency)
+                return  # Other errors say nothing about load
+            healthy = self._best is None or latency <= self.tolerance * self._best
+            self._best = latency if self._best is None else min(latency, self._best * 1.01)
+            if healthy and self.in_flight + 1 >= int(self.limit):
+                self._increase()
+
+    def _increase(self) -> None:
+        before = int(self.limit)
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        if int(self.limit) > before:
+            self.increases += 1
+            self.high = max(self.high, int(self.limit))
+            log.debug("%s concurrency limit raised to %d", self.service, int(self.limit))
+
+    def _decrease(self, now: float, latency: float) -> None:
+        if now - self._last_cut < latency:
+            return  # Same congestion episode as the last cut
+        self._last_cut = now
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        self.decreases += 1
+        self.low = min(self.low, int(self.limit))
+        log.info("%s: transient error, concurrency limit cut to %d", self.service, int(self.limit))
+
+    def __enter__(self) -> "AdaptiveLimit":
+        with self._cond:
+            self._cond.wait_for(self._has_room)
+            self._enter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        with self._cond:
+            self._finish(exc)
+            self._cond.notify_all()
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call fn holding one slot."""
+        with self:
+            return fn(*args, **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limit and counters, for the run summary and metrics."""
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "low": self.low,
+                "high": self.high,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "errors": self.errors,
+            }
+
+
+class AsyncAdaptiveLimit(AdaptiveLimit):
+    """asyncio counterpart of AdaptiveLimit, used with async with on one event loop."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._waiters: Optional[asyncio.Condition] = None
+
+    def _key(self) -> Any:
+        return asyncio.current_task()
+
+    def _condition(self) -> asyncio.Condition:
+        if self._waiters is None:
+            self._waiters = asyncio.Condition()
+        return self._waiters
+
+    async def __aenter__(self) -> "AsyncAdaptiveLimit":
+        waiters = self._condition()
+        async with waiters:
+            await waiters.wait_for(self._has_room)
+            self._enter()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        waiters = self._condition()
+        async with waiters:
+            self._finish(exc)
+            waiters.notify_all()
+
+
+def report_limits(limits: Dict[str, AdaptiveLimit]) -> None:
+    """Print each service's concurrency limit at the end of a run."""
+    for service, limit in limits.items():
+        s = limit.snapshot()
+        if s["calls"]:
+            print(
+                f"Concurrency ({service}): limit {s['limit']} "
+                f"(ranged {s['low']}-{s['high']}), cut {s['decreases']}x after "
+                f"{s['errors']} transient error(s)"
+            )
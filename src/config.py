@@ -1,21 +1,72 @@
 """Pipeline configuration loaded from environment variables."""
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+@dataclass
+class RetryPolicy:
+    """How one service's transient errors are retried (see retry.Retrier).
+
+    Backoff uses decorrelated jitter between base_delay and max_delay unless
+    the server sends Retry-After. Retries are budgeted: up to budget_burst at
+    once, refilled by budget_ratio per call. After breaker_threshold
+    transient failures in a row the service's circuit opens for
+    breaker_cooldown seconds.
+    """
+    max_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    budget_ratio: float = 0.2
+    budget_burst: int = 10
+    breaker_threshold: int = 5  # 0 disables the circuit breaker
+    breaker_cooldown: float = 30.0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "RetryPolicy":
+        """Read {prefix}_MAX_RETRIES, {prefix}_RETRY_BASE_DELAY, ... (e.g. prefix NOTION)."""
+        return cls(
+            max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", "3")),
+            base_delay=float(os.getenv(f"{prefix}_RETRY_BASE_DELAY", "1")),
+            max_delay=float(os.getenv(f"{prefix}_RETRY_MAX_DELAY", "30")),
+            budget_ratio=float(os.getenv(f"{prefix}_RETRY_BUDGET_RATIO", "0.2")),
+            budget_burst=int(os.getenv(f"{prefix}_RETRY_BUDGET_BURST", "10")),
+            breaker_threshold=int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", "5")),
+            breaker_cooldown=float(os.getenv(f"{prefix}_BREAKER_COOLDOWN", "30")),
+        )
+
+
 @dataclass
 class NotionConfig:
     token: str
     sources_db_id: str
+    max_concurrency: int = 3  # Starting in-flight limit; adapts between 1 and the ceiling
+    concurrency_ceiling: int = 0  # Highest in-flight limit; 0 = 4 x max_concurrency
+    tool_cache_size: int = 512  # Cached search/fetch results for tool calls; 0 disables
+    tool_cache_ttl: float = 600.0  # Seconds before a cached tool result is refetched
+    workspace_index: bool = False  # Answer tool lookups from a local index of the workspace
+    requests_per_second: float = 3.0  # Average request rate for the integration; 0 disables
+    burst: int = 3  # Requests that may go out back to back after an idle spell
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
 
     @classmethod
     def from_env(cls) -> "NotionConfig":
         token = os.environ["NOTION_TOKEN"]
         db_id = os.environ["NOTION_SOURCES_DB"]
-        return cls(token=token, sources_db_id=db_id)
+        return cls(
+            token=token,
+            sources_db_id=db_id,
+            max_concurrency=int(os.getenv("NOTION_MAX_CONCURRENCY", "3")),
+            concurrency_ceiling=int(os.getenv("NOTION_CONCURRENCY_CEILING", "0")),
+            tool_cache_size=int(os.getenv("NOTION_TOOL_CACHE_SIZE", "512")),
+            tool_cache_ttl=float(os.getenv("NOTION_TOOL_CACHE_TTL", "600")),
+            workspace_index=os.getenv("NOTION_WORKSPACE_INDEX", "").lower() in ("1", "true", "yes"),
+            requests_per_second=float(os.getenv("NOTION_RATE_LIMIT", "3")),
+            burst=int(os.getenv("NOTION_RATE_BURST", "3")),
+            retry=RetryPolicy.from_env("NOTION"),
+        )
 
 
 @dataclass
@@ -24,6 +75,14 @@ class DriveConfig:
     service_account_path: str = ""
     oauth_client_secret_path: str = ""
     oauth_token_path: str = ""
+    max_concurrency: int = 4  # Starting in-flight limit; adapts between 1 and the ceiling
+    concurrency_ceiling: int = 0  # Highest in-flight limit; 0 = 4 x max_concurrency
+    spool_threshold_mb: int = 8  # Downloads larger than this spill to a temp file
+    recursive: bool = False  # Also list PDFs in subfolders
+    sort_window: int = 100  # Files buffered to order discovery smallest first
+    incremental: bool = False  # Only list files changed since the last run
+    reconcile: bool = False  # In incremental mode, list the full folder this run
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
 
     @classmethod
     def from_env(cls) -> "DriveConfig":
@@ -32,6 +91,13 @@ class DriveConfig:
             service_account_path=os.getenv("GOOGLE_APP_CREDENTIALS", ""),
             oauth_client_secret_path=os.getenv("GOOGLE_OAUTH_CLIENT_SECRET", ""),
             oauth_token_path=os.getenv("GOOGLE_OAUTH_TOKEN", "token.json"),
+            max_concurrency=int(os.getenv("DRIVE_MAX_CONCURRENCY", "4")),
+            concurrency_ceiling=int(os.getenv("DRIVE_CONCURRENCY_CEILING", "0")),
+            spool_threshold_mb=int(os.getenv("DRIVE_SPOOL_THRESHOLD_MB", "8")),
+            recursive=os.getenv("DRIVE_RECURSIVE", "").lower() in ("1", "true", "yes"),
+            sort_window=int(os.getenv("DRIVE_SORT_WINDOW", "100")),
+            incremental=os.getenv("DRIVE_INCREMENTAL", "").lower() in ("1", "true", "yes"),
+            retry=RetryPolicy.from_env("DRIVE"),
         )
 
 
@@ -40,6 +106,20 @@ class OpenAIConfig:
     api_key: str
     model: str = "gpt-5.3-codex"
     max_tool_iterations: int = 50
+    max_concurrency: int = 8  # Starting in-flight limit; adapts between 1 and the ceiling
+    concurrency_ceiling: int = 0  # Highest in-flight limit; 0 = 4 x max_concurrency
+    tool_workers: int = 4  # Tool calls from one model response run concurrently
+    chain_responses: bool = True  # Send only new tool outputs, via previous_response_id
+    digest_threshold: int = 0  # Longer texts are condensed section by section; 0 truncates
+    chunk_tokens: int = 8_000  # Approximate size of one section
+    digest_workers: int = 4  # Sections summarized concurrently
+    summary_model: str = "gpt-5-mini"  # Small model for section summaries; "" = model
+    max_document_chars: int = 1_000_000  # Extraction limit when condensing (else MAX_INPUT_CHARS)
+    timeout: float = 120.0  # Seconds to wait on a response (read/write/pool)
+    connect_timeout: float = 10.0
+    max_connections: int = 0  # HTTP connection pool size; 0 = concurrency_ceiling, else 4 x max_concurrency
+    keepalive_expiry: float = 30.0  # Seconds an idle connection is kept open
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
 
     @classmethod
     def from_env(cls) -> "OpenAIConfig":
@@ -47,6 +127,60 @@ class OpenAIConfig:
             api_key=os.environ["OPENAI_API_KEY"],
             model=os.getenv("OPENAI_MODEL", "gpt-5.3-codex"),
             max_tool_iterations=int(os.getenv("ENRICHMENT_MAX_ITERATIONS", "5")),
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+            concurrency_ceiling=int(os.getenv("OPENAI_CONCURRENCY_CEILING", "0")),
+            tool_workers=int(os.getenv("ENRICHMENT_TOOL_WORKERS", "4")),
+            chain_responses=os.getenv("ENRICHMENT_CHAIN_RESPONSES", "true").lower() in ("1", "true", "yes"),
+            digest_threshold=int(os.getenv("ENRICHMENT_DIGEST_THRESHOLD", "0")),
+            chunk_tokens=int(os.getenv("ENRICHMENT_CHUNK_TOKENS", "8000")),
+            digest_workers=int(os.getenv("ENRICHMENT_DIGEST_WORKERS", "4")),
+            summary_model=os.getenv("OPENAI_SUMMARY_MODEL", "gpt-5-mini"),
+            max_document_chars=int(os.getenv("ENRICHMENT_MAX_DOCUMENT_CHARS", "1000000")),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "120")),
+            connect_timeout=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10")),
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "0")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+            retry=RetryPolicy.from_env("OPENAI"),
+        )
+
+
+@dataclass
+class ExtractionConfig:
+    """PDF text extraction backend: "inline" (calling thread) or "process"."""
+    backend: str = "inline"
+    workers: int = 0  # 0 = one worker process per CPU core
+    timeout: float = 120.0
+    max_memory_mb: int = 0  # 0 = no limit
+
+    @classmethod
+    def from_env(cls) -> "ExtractionConfig":
+        return cls(
+            backend=os.getenv("EXTRACT_BACKEND", "inline"),
+            workers=int(os.getenv("EXTRACT_WORKERS", "0")),
+            timeout=float(os.getenv("EXTRACT_TIMEOUT", "120")),
+            max_memory_mb=int(os.getenv("EXTRACT_MAX_MEMORY_MB", "0")),
+        )
+
+
+@dataclass
+class StagesConfig:
+    """Worker and queue sizes for the staged engine (Pipeline.run_staged)."""
+    download_workers: int = 4
+    extract_workers: int = 2
+    enrich_workers: int = 8
+    write_workers: int = 2
+    queue_size: int = 4
+    report_interval: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "StagesConfig":
+        return cls(
+            download_workers=int(os.getenv("STAGE_DOWNLOAD_WORKERS", "4")),
+            extract_workers=int(os.getenv("STAGE_EXTRACT_WORKERS", "2")),
+            enrich_workers=int(os.getenv("STAGE_ENRICH_WORKERS", "8")),
+            write_workers=int(os.getenv("STAGE_WRITE_WORKERS", "2")),
+            queue_size=int(os.getenv("STAGE_QUEUE_SIZE", "4")),
+            report_interval=float(os.getenv("STAGE_REPORT_INTERVAL", "0")),
         )
 
 
@@ -55,6 +189,19 @@ class PipelineConfig:
     notion: NotionConfig
     drive: DriveConfig
     openai: OpenAIConfig
+    workers: int = 1
+    async_tasks: int = 32  # Documents in flight with --async (one task each)
+    state_dir: str = ""  # Local run state (dedup index, ...); "" disables it
+    result_cache_mb: int = 64  # Size cap of cached enrichment results; 0 disables
+    retry_failed: bool = False  # Resume pages left Processing or Failed
+    batch_poll_interval: float = 60.0  # Seconds between Batch API status checks
+    report_dir: str = ""  # JSON run reports; "" = <state_dir>/reports
+    prometheus_textfile: str = ""  # Also write run metrics here for node_exporter; "" = off
+    profile: bool = False  # cProfile and tracemalloc each document (--profile)
+    profile_dir: str = ""  # Per-document profiles; "" = <state_dir>/profiles
+    profile_top: int = 25  # Allocation sites listed per document
+    stages: StagesConfig = field(default_factory=StagesConfig)
+    extraction: ExtractionConfig = field(default_factory=ExtractionConfig)
 
     @classmethod
     def from_env(cls) -> "PipelineConfig":
@@ -62,4 +209,16 @@ class PipelineConfig:
             notion=NotionConfig.from_env(),
             drive=DriveConfig.from_env(),
             openai=OpenAIConfig.from_env(),
+            workers=int(os.getenv("PIPELINE_WORKERS", "1")),
+            async_tasks=int(os.getenv("PIPELINE_ASYNC_TASKS", "32")),
+            state_dir=os.getenv("PIPELINE_STATE_DIR", ".pipeline"),
+            result_cache_mb=int(os.getenv("PIPELINE_RESULT_CACHE_MB", "64")),
+            retry_failed=os.getenv("PIPELINE_RETRY_FAILED", "").lower() in ("1", "true", "yes"),
+            batch_poll_interval=float(os.getenv("PIPELINE_BATCH_POLL_INTERVAL", "60")),
+            report_dir=os.getenv("PIPELINE_REPORT_DIR", ""),
+            prometheus_textfile=os.getenv("PIPELINE_PROMETHEUS_TEXTFILE", ""),
+            profile_dir=os.getenv("PIPELINE_PROFILE_DIR", ""),
+            profile_top=int(os.getenv("PIPELINE_PROFILE_TOP", "25")),
+            stages=StagesConfig.from_env(),
+            extraction=ExtractionConfig.from_env(),
         )
@@ -1,26 +1,40 @@
-"""Google Drive client: list files, download PDFs, extract text."""
-import hashlib
-import io
+"""Google Drive client: list files and changes, download PDFs."""
 import logging
 import os
-import warnings
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
-from pdfminer.high_level import extract_text as pdfminer_extract
 
+from . import metrics
 from .config import DriveConfig
-
-logging.getLogger("pdfminer").setLevel(logging.ERROR)
-warnings.filterwarnings("ignore", message=".*FontBBox.*")
+from .retry import retrier
+from .spool import SpooledPdf
 
 log = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 
+# Bytes fetched per HTTP range request while downloading (the client default is 100 MB)
+DOWNLOAD_CHUNK_SIZE = 4 * 1_048_576
+
+PDF_MIME = "application/pdf"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+_LIST_FIELDS = (
+    "nextPageToken, "
+    "files(id, name, mimeType, webViewLink, createdTime, size, md5Checksum, modifiedTime)"
+)
+_CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, "
+    "parents, trashed, webViewLink, createdTime, size, md5Checksum, modifiedTime))"
+)
+_FOLDER_DONE = object()  # Queue marker: one folder walker has finished
+
 
-def _build_credentials(config: DriveConfig):
+def _build_credentials(config: DriveConfig) -> Any:
     """Build Google credentials from service account or OAuth desktop flow."""
     # Option 1: Service account key file
     if config.service_account_path and os.path.exists(config.service_account_path):
@@ -73,49 +87,168 @@ class DriveClient:
     """Minimal Google Drive client supporting service account or OAuth."""
 
     def __init__(self, config: DriveConfig):
-        creds = _build_credentials(config)
-        self.service = build("drive", "v3", credentials=creds, cache_discovery=False)
+        self._creds = _build_credentials(config)
+        self._local = threading.local()
         self.folder_id = config.folder_id
-
-    def list_pdfs(self) -> List[Dict[str, Any]]:
-        """List all PDF files in the configured Drive folder."""
-        query = (
-            f"'{self.folder_id}' in parents and trashed=false "
-            f"and mimeType='application/pdf'"
-        )
-        response = self.service.files().list(
-            q=query,
-            fields="files(id, name, webViewLink, createdTime, size)",
-            pageSize=1000,
-        ).execute()
-        return response.get("files", [])
-
-    def download_pdf(self, file_id: str) -> bytes:
-        """Download a file's content from Drive."""
+        self.recursive = config.recursive
+        self.max_concurrency = config.max_concurrency
+        self.spool_threshold = config.spool_threshold_mb * 1_048_576
+
+    @property
+    def service(self) -> Any:
+        """Drive API service for the calling thread.
+
+        httplib2 transports are not thread-safe, so each worker thread
+        builds its own service object on first use.
+        """
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = build("drive", "v3", credentials=self._creds, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def _iter_folder(self, folder_id: str, folders: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield the PDFs (and optionally subfolders) directly in a folder.
+
+        Follows nextPageToken, so folders of any size are listed in full, one
+        page of up to 1000 files at a time.
+        """
+        kinds = f"mimeType='{PDF_MIME}'"
+        if folders:
+            kinds = f"({kinds} or mimeType='{FOLDER_MIME}')"
+        query = f"'{folder_id}' in parents and trashed=false and {kinds}"
+        page_token = None
+        while True:
+            with metrics.timed("list"):
+                response = retrier("drive").call(
+                    self.service.files().list(
+                        q=query, fields=_LIST_FIELDS, pageSize=1000, pageToken=page_token
+                    ).execute
+                )
+            metrics.add("files_listed", len(response.get("files", [])))
+            yield from response.get("files", [])
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+    def iter_pdfs(self, recursive: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+        """Yield PDF files in the configured folder as the listing arrives.
+
+        With recursive (default: config.recursive), subfolders are listed
+        too, up to max_concurrency folders at a time, each on its own
+        thread's service. Files come out in whatever order the pages arrive.
+        """
+        if not (self.recursive if recursive is None else recursive):
+            yield from self._iter_folder(self.folder_id)
+            return
+
+        results: "queue.Queue[Any]" = queue.Queue()
+        stop = threading.Event()
+
+        def walk(folder_id: str) -> None:
+            try:
+                for f in self._iter_folder(folder_id, folders=True):
+                    if stop.is_set():
+                        return
+                    results.put(f)
+            except Exception as e:
+                results.put(e)
+            finally:
+                results.put(_FOLDER_DONE)
+
+        seen = {self.folder_id}
+        pending = 1
+        with ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="drive-list") as pool:
+            pool.submit(walk, self.folder_id)
+            try:
+                while pending:
+                    item = results.get()
+                    if item is _FOLDER_DONE:
+                        pending -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    elif item.get("mimeType") == FOLDER_MIME:
+                        # A folder can have several parents; list it once
+                        if item["id"] not in seen:
+                            seen.add(item["id"])
+                            pending += 1
+                            pool.submit(walk, item["id"])
+                    else:
+                        yield item
+            finally:
+                stop.set()
+
+    def start_page_token(self) -> str:
+        """Changes API token for "now": list_changes(token) later returns what changed since."""
+        response = retrier("drive").call(self.service.changes().getStartPageToken().execute)
+        return str(response["startPageToken"])
+
+    def list_changes(self, page_token: str) -> Tuple[List[Dict[str, Any]], str]:
+        """Return PDFs in the folder added or modified since page_token.
+
+        Also returns the token to pass next time. A file changed several
+        times is reported once, in its latest state; files that were
+        trashed, removed or moved out of the folder are left out.
+        """
+        changed: Dict[str, Dict[str, Any]] = {}
+        ancestry: Dict[str, bool] = {}
+        while True:
+            with metrics.timed("list"):
+                response = retrier("drive").call(
+                    self.service.changes().list(
+                        pageToken=page_token, fields=_CHANGE_FIELDS, pageSize=1000, spaces="drive"
+                    ).execute
+                )
+            for change in response.get("changes", []):
+                f = change.get("file")
+                changed.pop(change.get("fileId"), None)
+                if (
+                    change.get("removed")
+                    or not f
+                    or f.get("trashed")
+                    or f.get("mimeType") != PDF_MIME
+                    or not self._in_folder(f.get("parents", []), ancestry)
+                ):
+                    continue
+                changed[f["id"]] = f
+            if "newStartPageToken" in response:
+                return list(changed.values()), response["newStartPageToken"]
+            page_token = response["nextPageToken"]
+
+    def _in_folder(self, parents: List[str], ancestry: Dict[str, bool]) -> bool:
+        """True if any parent is the configured folder (or, when recursive, below it).
+
+        ancestry caches the answer per folder ID across one list_changes call.
+        """
+        if self.folder_id in parents:
+            return True
+        if not self.recursive:
+            return False
+        for parent in parents:
+            if parent not in ancestry:
+                ancestry[parent] = False  # Guards against cycles while walking up
+                meta = retrier("drive").call(
+                    self.service.files().get(fileId=parent, fields="id, parents").execute
+                )
+                ancestry[parent] = self._in_folder(meta.get("parents", []), ancestry)
+            if ancestry[parent]:
+                return True
+        return False
+
+    def download(self, file_id: str) -> SpooledPdf:
+        """Stream a file from Drive into a SpooledPdf.
+
+        Chunks are hashed as they arrive and spill to a temp file once the
+        download passes the spool threshold. The caller must close() it.
+        """
         request = self.service.files().get_media(fileId=file_id)
-        buf = io.BytesIO()
-        downloader = MediaIoBaseDownload(buf, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-        return buf.getvalue()
-
-    @staticmethod
-    def extract_text(pdf_bytes: bytes) -> Optional[str]:
-        """Extract text from PDF bytes using pdfminer."""
+        spool = SpooledPdf(self.spool_threshold)
         try:
-            text = pdfminer_extract(io.BytesIO(pdf_bytes))
-            if not text or not text.strip():
-                return None
-            # Basic cleanup
-            lines = [l.strip() for l in text.split("\n") if l.strip()]
-            cleaned = "\n".join(lines)
-            return cleaned.replace("\x0c", "").replace("\xa0", " ")
-        except Exception as e:
-            log.error("PDF extraction failed: %s", e)
-            return None
-
-    @staticmethod
-    def content_hash(data: bytes) -> str:
-        """SHA-256 hash of raw PDF bytes for deduplication."""
-        return hashlib.sha256(data).hexdigest()
+            downloader = MediaIoBaseDownload(spool, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+        except BaseException:
+            spool.close()
+            raise
+        return spool
@@ -0,0 +1,104 @@
+"""Incremental Drive discovery: full listings, or Changes API deltas between runs."""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from .drive_client import DriveClient
+
+log = logging.getLogger(__name__)
+
+
+class DriveSync:
+    """Choose the files a run looks at, and remember where the next run starts.
+
+    In incremental mode, a Changes API startPageToken is stored in
+    state_dir. Later runs only list files added or modified since then. The
+    first run, a run with reconcile=True, and any run whose token Drive
+    rejects fall back to a full listing. The token is taken before that
+    listing starts, so nothing that changes during the run is missed.
+
+    The new token is written by commit() only after the run has finished,
+    so a run that dies halfway looks at the same changes again next time.
+    Files passed to retry_later() (failed before they had a Notion page)
+    are saved with it and listed again by the next incremental run.
+    """
+
+    def __init__(
+        self,
+        drive: DriveClient,
+        state_dir: str = "",
+        incremental: bool = False,
+        reconcile: bool = False,
+    ):
+        self.drive = drive
+        self.incremental = incremental and bool(state_dir)
+        if incremental and not state_dir:
+            log.warning("Incremental Drive sync needs PIPELINE_STATE_DIR; listing the full folder")
+        self.reconcile = reconcile
+        self.path = os.path.join(state_dir, "drive_sync.json") if state_dir else ""
+        self._next_token: Optional[str] = None
+        self._retry: Dict[str, Dict[str, Any]] = {}
+        self._retry_lock = threading.Lock()
+
+    def _state_key(self) -> Dict[str, Any]:
+        # A token only describes the folder (and recursion) it was taken for
+        return {"folder_id": self.drive.folder_id, "recursive": self.drive.recursive}
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                state: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if {k: state.get(k) for k in self._state_key()} != self._state_key():
+            return {}
+        return state
+
+    def files(self) -> Iterator[Dict[str, Any]]:
+        """Yield the PDFs this run should look at."""
+        if not self.incremental:
+            yield from self.drive.iter_pdfs()
+            return
+
+        state = {} if self.reconcile else self._load_state()
+        token = state.get("start_page_token")
+        if token is not None:
+            try:
+                changed, self._next_token = self.drive.list_changes(token)
+            except Exception as e:
+                log.warning("Drive changes since last run unavailable, listing the full folder: %s", e)
+            else:
+                seen = {f["id"] for f in changed}
+                retry: List[Dict[str, Any]] = [
+                    f for f in state.get("retry", []) if f["id"] not in seen
+                ]
+                print(f"Drive changes since last run: {len(changed)} PDF(s), "
+                      f"{len(retry)} retried")
+                yield from changed
+                yield from retry
+                return
+
+        self._next_token = self.drive.start_page_token()
+        yield from self.drive.iter_pdfs()
+
+    def retry_later(self, f: Dict[str, Any]) -> None:
+        """List f again next run: it failed before any page or index record existed."""
+        if self.incremental:
+            with self._retry_lock:
+                self._retry[f["id"]] = f
+
+    def commit(self) -> None:
+        """Persist the token and the files to retry (call once the run has finished)."""
+        if not self.incremental or self._next_token is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                **self._state_key(),
+                "start_page_token": self._next_token,
+                "retry": list(self._retry.values()),
+            }, f)
+        os.replace(tmp, self.path)
@@ -1,12 +1,25 @@
 """AI enrichment: agentic OpenAI loop with Notion tool-use via Responses API."""
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Any, Dict, List, Optional
-
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import (
+    DEFAULT_CONNECTION_LIMITS,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+    Timeout,
+)
 
 from .config import OpenAIConfig
+from . import metrics
 from .models import EnrichmentResult
+from .retry import retrier
 
 log = logging.getLogger(__name__)
 
@@ -122,70 +135,447 @@ these keys:
 Return ONLY valid JSON, no markdown fences.
 """
 
+# Map step for long documents: each section is condensed on its own
+SECTION_PROMPT = """\
+You are condensing one section of a long document so that an analyst can
+work from the summaries of all sections instead of the full text. Write at
+most 250 words of plain prose. Keep every finding, conclusion, figure, date,
+company, product and client name the section contains; drop boilerplate,
+references and repetition. Do not add commentary of your own.
+"""
+
+# Identifies the prompts and tool definitions a cached result was produced with
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + SECTION_PROMPT + json.dumps(NOTION_TOOLS, sort_keys=True)).encode()
+).hexdigest()[:16]
+
+MAX_INPUT_CHARS = 80_000  # Longer documents are condensed (or truncated) to stay within context limits
+
+CHARS_PER_TOKEN = 4  # Rough average for English prose, used to size chunks without a tokenizer
+
+
+def _http_options(config: OpenAIConfig) -> Dict[str, Any]:
+    """Connection pool and timeout settings for the OpenAI HTTP client.
+
+    Limits and Timeout are the classes of the HTTP library the installed
+    SDK is built on, so the options fit its DefaultHttpxClient.
+    """
+    connections = config.max_connections or config.concurrency_ceiling or 4 * config.max_concurrency
+    return {
+        "limits": type(DEFAULT_CONNECTION_LIMITS)(
+            max_connections=connections,
+            max_keepalive_connections=connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        "timeout": Timeout(config.timeout, connect=config.connect_timeout),
+        "follow_redirects": True,
+    }
+
+
+def build_client(config: OpenAIConfig) -> OpenAI:
+    """Create the long-lived OpenAI client a run shares across documents.
+
+    The client is safe to use from several threads. Its connection pool
+    keeps connections and TLS sessions open between requests. The SDK's own
+    retries are off; calls retry under the "openai" policy (see retry.py).
+    """
+    return OpenAI(
+        api_key=config.api_key,
+        http_client=DefaultHttpxClient(**_http_options(config)),
+        max_retries=0,
+    )
+
+
+def build_async_client(config: OpenAIConfig) -> AsyncOpenAI:
+    """asyncio counterpart of build_client(), for use on a single event loop."""
+    return AsyncOpenAI(
+        api_key=config.api_key,
+        http_client=DefaultAsyncHttpxClient(**_http_options(config)),
+        max_retries=0,
+    )
+
 
 def _execute_tool(tool_name: str, arguments: Dict[str, Any], notion: Any) -> str:
     """Dispatch a tool call to the appropriate NotionClient method."""
     try:
-        if tool_name == "search_notion":
-            results = notion.search_workspace(arguments["query"])
-            return json.dumps(results)
-        elif tool_name == "fetch_notion_page":
-            content = notion.fetch_page_content(arguments["page_id"])
-            return json.dumps({"content": content})
-        else:
-            return json.dumps({"error": f"Unknown tool: {tool_name}"})
+        with metrics.timed("tool_call"):
+            if tool_name == "search_notion":
+                results = notion.search_workspace(arguments["query"])
+                return json.dumps(results)
+            elif tool_name == "fetch_notion_page":
+                content = notion.fetch_page_content(arguments["page_id"])
+                return json.dumps({"content": content})
+            else:
+                return json.dumps({"error": f"Unknown tool: {tool_name}"})
     except Exception as e:
         log.warning("Tool %s failed: %s", tool_name, e)
         return json.dumps({"error": str(e)})
 
 
+async def _execute_tool_async(tool_name: str, arguments: Dict[str, Any], notion: Any) -> str:
+    """Dispatch a tool call to the appropriate AsyncNotionClient method."""
+    try:
+        with metrics.timed("tool_call"):
+            if tool_name == "search_notion":
+                results = await notion.search_workspace(arguments["query"])
+                return json.dumps(results)
+            elif tool_name == "fetch_notion_page":
+                content = await notion.fetch_page_content(arguments["page_id"])
+                return json.dumps({"content": content})
+            else:
+                return json.dumps({"error": f"Unknown tool: {tool_name}"})
+    except Exception as e:
+        log.warning("Tool %s failed: %s", tool_name, e)
+        return json.dumps({"error": str(e)})
+
+
+def _execute_tools(calls: List[Any], notion: Any, workers: int) -> List[str]:
+    """Run one response's function calls, up to workers at a time.
+
+    The calls are independent lookups, so they run concurrently; outputs
+    come back in call order.
+    """
+    def run(call: Any) -> str:
+        return _execute_tool(call.name, json.loads(call.arguments), notion)
+
+    if len(calls) <= 1 or workers <= 1:
+        return [run(call) for call in calls]
+    with ThreadPoolExecutor(max_workers=min(workers, len(calls)), thread_name_prefix="tool") as pool:
+        return list(pool.map(run, calls))
+
+
+async def _execute_tools_async(calls: List[Any], notion: Any) -> List[str]:
+    """asyncio version of _execute_tools(); AsyncNotionClient caps the requests."""
+    return await asyncio.gather(*(
+        _execute_tool_async(call.name, json.loads(call.arguments), notion) for call in calls
+    ))
+
+
+def _append_turn(input_items: List[Dict[str, Any]], output: List[Any], results: List[str]) -> None:
+    """Append the model's output and the tool results, each after its function_call.
+
+    Items keep the model's order, so the conversation sent back is the same
+    however the calls were scheduled.
+    """
+    outputs = iter(results)
+    for item in output:
+        if item.type == "function_call":
+            input_items.append({
+                "type": "function_call",
+                "call_id": item.call_id,
+                "name": item.name,
+                "arguments": item.arguments,
+            })
+            input_items.append({
+                "type": "function_call_output",
+                "call_id": item.call_id,
+                "output": next(outputs),
+            })
+        elif item.type == "message":
+            # Append any interleaved message content too
+            input_items.append({
+                "role": "assistant",
+                "content": item.content[0].text if item.content else "",
+            })
+
+
+def _tool_outputs(calls: List[Any], results: List[str]) -> List[Dict[str, Any]]:
+    """function_call_output items answering calls, in call order."""
+    return [
+        {"type": "function_call_output", "call_id": call.call_id, "output": output}
+        for call, output in zip(calls, results)
+    ]
+
+
+def _initial_input(text: str, truncated: bool = False, sections: int = 0) -> List[Dict[str, Any]]:
+    """Build the first Responses API input item for a document.
+
+    truncated marks text the extractor already cut at its budget. sections
+    is the number of section summaries when text is a digest (see
+    build_digest); the digest notes truncation itself.
+    """
+    if sections:
+        if len(text) > MAX_INPUT_CHARS:
+            text = text[:MAX_INPUT_CHARS] + "\n\n[...truncated]"
+        return [{
+            "role": "user",
+            "content": (
+                "Analyze this document and return your response as json. It is too "
+                f"long to send in full, so here are summaries of its {sections} "
+                f"consecutive sections:\n\n{text}"
+            ),
+        }]
+    if truncated or len(text) > MAX_INPUT_CHARS:
+        text = text[:MAX_INPUT_CHARS] + "\n\n[...truncated]"
+    # Note: include "json" in the user message to satisfy json_object format requirement
+    return [
+        {"role": "user", "content": f"Analyze this document and return your response as json:\n\n{text}"},
+    ]
+
+
+def digest_settings(config: OpenAIConfig) -> str:
+    """The settings that decide what text a long document is enriched from (for cache keys)."""
+    if not config.digest_threshold:
+        return "truncate"
+    return (f"{config.summary_model or config.model}:{config.chunk_tokens}:"
+            f"{config.digest_threshold}:{config.max_document_chars}")
+
+
+def input_budget(config: OpenAIConfig) -> int:
+    """Characters worth extracting: more than MAX_INPUT_CHARS only if long documents are condensed."""
+    if config.digest_threshold:
+        return max(MAX_INPUT_CHARS, config.max_document_chars)
+    return MAX_INPUT_CHARS
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Split text into pieces of about max_tokens, at paragraph, line or word breaks."""
+    limit = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = []
+    while len(text) > limit:
+        for sep in ("\n\n", "\n", " "):
+            cut = text.rfind(sep, 0, limit)
+            if cut > limit // 2:
+                break
+        else:
+            cut = limit
+        chunks.append(text[:cut].strip())
+        text = text[cut:].lstrip()
+    if text.strip():
+        chunks.append(text.strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def _section_request(config: OpenAIConfig, chunk: str, part: int, parts: int) -> Dict[str, Any]:
+    """Arguments for the tool-less call that summarizes one section."""
+    return {
+        "model": config.summary_model or config.model,
+        "instructions": SECTION_PROMPT,
+        "input": [{"role": "user", "content": f"Section {part} of {parts}:\n\n{chunk}"}],
+        "temperature": 0.2,
+    }
+
+
+def _join_digest(summaries: List[str], truncated: bool) -> str:
+    digest = "\n\n".join(
+        f"[Section {i}/{len(summaries)}]\n{summary.strip()}"
+        for i, summary in enumerate(summaries, 1)
+    )
+    if truncated:
+        digest += "\n\n[...the rest of the document was not read]"
+    return digest
+
+
+def _create(client: OpenAI, request: Dict[str, Any], slot: Any = None, stage: str = "enrich_iteration") -> Any:
+    """responses.create under the openai retry policy, each attempt holding slot.
+
+    Backoff waits hold no slot, and every error passes through slot (see
+    concurrency.AdaptiveLimit). The call, retries included, is timed as
+    stage and its token usage counted in the run metrics.
+    """
+    def attempt() -> Any:
+        with slot if slot is not None else nullcontext():
+            return client.responses.create(**request)
+    with metrics.timed(stage):
+        response = retrier("openai").call(attempt)
+    metrics.add_usage(getattr(response, "usage", None))
+    return response
+
+
+async def _create_async(
+    client: AsyncOpenAI, request: Dict[str, Any], slot: Any = None, stage: str = "enrich_iteration"
+) -> Any:
+    """asyncio version of _create()."""
+    async def attempt() -> Any:
+        async with slot if slot is not None else nullcontext():
+            return await client.responses.create(**request)
+    with metrics.timed(stage):
+        response = await retrier("openai").acall(attempt)
+    metrics.add_usage(getattr(response, "usage", None))
+    return response
+
+
+def build_digest(
+    text: str, config: OpenAIConfig, client: OpenAI, truncated: bool = False, slot: Any = None
+) -> Tuple[str, int]:
+    """Summarize a long document's sections in parallel (the map step).
+
+    Returns the joined summaries and the number of sections.
+    """
+    chunks = chunk_text(text, config.chunk_tokens)
+
+    def summarize(part: int) -> str:
+        request = _section_request(config, chunks[part - 1], part, len(chunks))
+        return str(_create(client, request, slot, "enrich_section").output_text)
+
+    workers = max(1, min(config.digest_workers, len(chunks)))
+    if workers == 1:
+        summaries = [summarize(part) for part in range(1, len(chunks) + 1)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="digest") as pool:
+            summaries = list(pool.map(summarize, range(1, len(chunks) + 1)))
+    digest = _join_digest(summaries, truncated)
+    log.info("Condensed %d characters into %d section summaries (%d characters)",
+             len(text), len(chunks), len(digest))
+    return digest, len(chunks)
+
+
+async def build_digest_async(
+    text: str, config: OpenAIConfig, client: AsyncOpenAI, truncated: bool = False, slot: Any = None
+) -> Tuple[str, int]:
+    """asyncio version of build_digest(); slot caps the in-flight calls as in enrich_async()."""
+    chunks = chunk_text(text, config.chunk_tokens)
+
+    async def summarize(part: int) -> str:
+        request = _section_request(config, chunks[part - 1], part, len(chunks))
+        response = await _create_async(client, request, slot, "enrich_section")
+        return str(response.output_text)
+
+    summaries = await asyncio.gather(*(summarize(part) for part in range(1, len(chunks) + 1)))
+    digest = _join_digest(list(summaries), truncated)
+    log.info("Condensed %d characters into %d section summaries (%d characters)",
+             len(text), len(chunks), len(digest))
+    return digest, len(chunks)
+
+
+def _request_kwargs(
+    config: OpenAIConfig, input_items: List[Dict[str, Any]], use_tools: bool
+) -> Dict[str, Any]:
+    """Arguments for one responses.create call."""
+    kwargs: Dict[str, Any] = {
+        "model": config.model,
+        "instructions": SYSTEM_PROMPT,
+        "input": input_items,
+        "temperature": 0.2,
+    }
+    if use_tools:
+        kwargs["tools"] = NOTION_TOOLS
+    if not use_tools:
+        kwargs["text"] = {"format": {"type": "json_object"}}
+    return kwargs
+
+
+class _Conversation:
+    """Request inputs for one enrichment loop, plus its input token counts.
+
+    With config.chain_responses, each turn after the first names the
+    previous response (previous_response_id) and sends only the new
+    function_call_output items, so the document is uploaded once instead
+    of on every iteration. Otherwise the whole transcript is resent. In
+    both modes the request starts with the same instructions, tools and
+    document, which keeps that prefix eligible for prompt caching.
+    """
+
+    def __init__(
+        self, config: OpenAIConfig, text: str, truncated: bool, use_tools: bool, sections: int = 0
+    ):
+        self.config = config
+        self.use_tools = use_tools
+        self.chain = config.chain_responses and use_tools
+        self.items = _initial_input(text, truncated, sections)
+        self.previous_id: Optional[str] = None
+        self.requests = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+
+    def request(self) -> Dict[str, Any]:
+        """Arguments for the next responses.create call."""
+        kwargs = _request_kwargs(self.config, self.items, self.use_tools)
+        if self.previous_id is not None:
+            kwargs["previous_response_id"] = self.previous_id
+        return kwargs
+
+    def received(self, response: Any) -> None:
+        """Count the input tokens a response reports (if it reports any)."""
+        self.requests += 1
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "input_tokens", None)
+        if not isinstance(tokens, int):
+            return
+        cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0)
+        self.input_tokens += tokens
+        self.cached_tokens += cached if isinstance(cached, int) else 0
+
+    def answer(self, response: Any, calls: List[Any], results: List[str]) -> None:
+        """Set up the next turn: the tool results for response's calls."""
+        if self.chain:
+            self.previous_id = response.id
+            self.items = _tool_outputs(calls, results)
+        else:
+            _append_turn(self.items, response.output, results)
+
+    def log_usage(self) -> None:
+        log.info(
+            "Enrichment input: %d tokens (%d cached) over %d request(s)",
+            self.input_tokens, self.cached_tokens, self.requests,
+        )
+
+
+def single_shot_request(text: str, config: OpenAIConfig, truncated: bool = False) -> Dict[str, Any]:
+    """responses.create arguments for a tool-less enrichment (enrich() without notion)."""
+    return _request_kwargs(config, _initial_input(text, truncated), use_tools=False)
+
+
+def parse_result(raw: str) -> EnrichmentResult:
+    """Build an EnrichmentResult from the model's final JSON text."""
+    data = json.loads(raw)
+    return EnrichmentResult(
+        summary=data.get("summary", ""),
+        insights=data.get("insights", []),
+        content_type=data.get("content_type", "Other"),
+        ai_primitives=data.get("ai_primitives", []),
+        vendor=data.get("vendor"),
+        topical_tags=data.get("topical_tags", []),
+        domain_tags=data.get("domain_tags", []),
+        client_relevance=data.get("client_relevance", []),
+        created_date=data.get("created_date"),
+        title=data.get("title"),
+    )
+
+
 def enrich(
     text: str,
     config: OpenAIConfig,
     notion: Any = None,
     max_iterations: Optional[int] = None,
+    truncated: bool = False,
+    client: Optional[OpenAI] = None,
+    slot: Any = None,
 ) -> Optional[EnrichmentResult]:
     """Run an agentic OpenAI Responses API loop to enrich extracted PDF text.
 
     When notion is provided, the model can call search_notion and
     fetch_notion_page tools to query the Cornelson Advisory workspace.
     When notion is None, falls back to a single-shot call (no tools).
+    Set truncated when the text was already cut to MAX_INPUT_CHARS upstream.
+    Text longer than config.digest_threshold is first condensed into
+    section summaries (see build_digest) instead of being truncated.
+    Pass the run's shared client (see build_client) to reuse its
+    connections; without one, a client is created for this call. slot, if
+    given, is held around each responses.create attempt.
 
     Returns an EnrichmentResult or None on failure.
     """
     if max_iterations is None:
         max_iterations = config.max_tool_iterations
+    if client is None:
+        client = OpenAI(api_key=config.api_key)
 
-    # Truncate very long documents to stay within context limits
-    max_chars = 80_000
-    if len(text) > max_chars:
-        text = text[:max_chars] + "\n\n[...truncated]"
-
-    client = OpenAI(api_key=config.api_key)
-
-    # Build initial input for the Responses API
-    # Note: include "json" in the user message to satisfy json_object format requirement
-    input_items: List[Dict[str, Any]] = [
-        {"role": "user", "content": f"Analyze this document and return your response as json:\n\n{text}"},
-    ]
+    # Long documents: summarize sections in parallel, then enrich the digest
+    sections = 0
+    if config.digest_threshold and len(text) > config.digest_threshold:
+        try:
+            text, sections = build_digest(text, config, client, truncated, slot)
+        except Exception as e:
+            log.warning("Could not condense long document, truncating it instead: %s", e)
 
     # Only include tools if notion client is available
-    use_tools = notion is not None
+    conversation = _Conversation(config, text, truncated, notion is not None, sections)
 
     try:
         for iteration in range(max_iterations):
-            kwargs: Dict[str, Any] = {
-                "model": config.model,
-                "instructions": SYSTEM_PROMPT,
-                "input": input_items,
-                "temperature": 0.2,
-            }
-            if use_tools:
-                kwargs["tools"] = NOTION_TOOLS
-            if not use_tools:
-                kwargs["text"] = {"format": {"type": "json_object"}}
-
-            response = client.responses.create(**kwargs)
+            response = _create(client, conversation.request(), slot)
+            conversation.received(response)
 
             # Separate function_call items from message items
             function_calls = [
@@ -194,30 +584,9 @@ def enrich(
             ]
 
             if function_calls and notion is not None:
-                # Append the model's output (including function_call items)
-                # then append our function_call_output results
-                for item in response.output:
-                    if item.type == "function_call":
-                        input_items.append({
-                            "type": "function_call",
-                            "call_id": item.call_id,
-                            "name": item.name,
-                            "arguments": item.arguments,
-                        })
-                        # Execute and append result
-                        args = json.loads(item.arguments)
-                        result_str = _execute_tool(item.name, args, notion)
-                        input_items.append({
-                            "type": "function_call_output",
-                            "call_id": item.call_id,
-                            "output": result_str,
-                        })
-                    elif item.type == "message":
-                        # Append any interleaved message content too
-                        input_items.append({
-                            "role": "assistant",
-                            "content": item.content[0].text if item.content else "",
-                        })
+                # Execute the calls; their outputs are the next turn's input
+                results = _execute_tools(function_calls, notion, config.tool_workers)
+                conversation.answer(response, function_calls, results)
 
                 log.info(
                     "Enrichment iteration %d: %d tool call(s)",
@@ -227,26 +596,84 @@ def enrich(
                 continue
 
             # No tool calls — parse the final JSON response
+            conversation.log_usage()
             raw = response.output_text
             if not raw:
                 log.error("Empty response from model on iteration %d", iteration + 1)
                 return None
 
-            data = json.loads(raw)
-            return EnrichmentResult(
-                summary=data.get("summary", ""),
-                insights=data.get("insights", []),
-                content_type=data.get("content_type", "Other"),
-                ai_primitives=data.get("ai_primitives", []),
-                vendor=data.get("vendor"),
-                topical_tags=data.get("topical_tags", []),
-                domain_tags=data.get("domain_tags", []),
-                client_relevance=data.get("client_relevance", []),
-                created_date=data.get("created_date"),
-                title=data.get("title"),
-            )
+            return parse_result(raw)
 
         # Exhausted max iterations without a final response
+        conversation.log_usage()
+        log.error("Enrichment hit max iterations (%d) without completing", max_iterations)
+        return None
+
+    except Exception as e:
+        log.error("Enrichment failed: %s", e)
+        return None
+
+
+async def enrich_async(
+    text: str,
+    config: OpenAIConfig,
+    notion: Any = None,
+    max_iterations: Optional[int] = None,
+    client: Optional[AsyncOpenAI] = None,
+    slot: Any = None,
+    truncated: bool = False,
+) -> Optional[EnrichmentResult]:
+    """asyncio version of enrich() using AsyncOpenAI and an async Notion client.
+
+    Sends the same requests and parses the same output as enrich(). slot is
+    an optional async context manager (e.g. an AsyncAdaptiveLimit) held
+    around each responses.create attempt, so the cap applies to in-flight
+    model calls rather than whole tool loops.
+    """
+    if max_iterations is None:
+        max_iterations = config.max_tool_iterations
+    if client is None:
+        client = AsyncOpenAI(api_key=config.api_key)
+
+    sections = 0
+    if config.digest_threshold and len(text) > config.digest_threshold:
+        try:
+            text, sections = await build_digest_async(text, config, client, truncated, slot)
+        except Exception as e:
+            log.warning("Could not condense long document, truncating it instead: %s", e)
+
+    conversation = _Conversation(config, text, truncated, notion is not None, sections)
+
+    try:
+        for iteration in range(max_iterations):
+            response = await _create_async(client, conversation.request(), slot)
+            conversation.received(response)
+
+            function_calls = [
+                item for item in response.output
+                if item.type == "function_call"
+            ]
+
+            if function_calls and notion is not None:
+                results = await _execute_tools_async(function_calls, notion)
+                conversation.answer(response, function_calls, results)
+
+                log.info(
+                    "Enrichment iteration %d: %d tool call(s)",
+                    iteration + 1,
+                    len(function_calls),
+                )
+                continue
+
+            conversation.log_usage()
+            raw = response.output_text
+            if not raw:
+                log.error("Empty response from model on iteration %d", iteration + 1)
+                return None
+
+            return parse_result(raw)
+
+        conversation.log_usage()
         log.error("Enrichment hit max iterations (%d) without completing", max_iterations)
         return None
 
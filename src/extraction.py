@@ -0,0 +1,257 @@
+"""PDF text extraction: inline pdfminer, or isolated worker processes with limits."""
+import io
+import logging
+import mmap
+import multiprocessing
+import os
+import threading
+import warnings
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Generator, Iterator, List, Optional, Union, cast
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+from .config import ExtractionConfig
+from .spool import SpooledPdf
+
+logging.getLogger("pdfminer").setLevel(logging.ERROR)
+warnings.filterwarnings("ignore", message=".*FontBBox.*")
+
+log = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """A document was killed or crashed during extraction.
+
+    reason is a short label for progress output: "timeout", "memory" or
+    "crashed".
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+@dataclass
+class ExtractedText:
+    """Cleaned document text, and whether it was cut off at the budget."""
+    text: Optional[str]
+    truncated: bool = False
+
+
+def _clean_line(line: str) -> str:
+    """Normalize one line of pdfminer output ("" means drop it)."""
+    line = line.strip()
+    return line.replace("\x0c", "").replace("\xa0", " ") if line else ""
+
+
+def clean_text(text: Optional[str]) -> Optional[str]:
+    """Normalize pdfminer output: drop blank lines, form feeds and nbsp."""
+    if not text or not text.strip():
+        return None
+    return "\n".join(l for l in map(_clean_line, text.split("\n")) if l)
+
+
+def _page_texts(fp: BinaryIO) -> Iterator[str]:
+    """Yield pdfminer's raw text one page at a time.
+
+    Same converter setup as pdfminer.high_level.extract_text, but pages are
+    parsed only as the caller asks for them.
+    """
+    rsrcmgr = PDFResourceManager(caching=True)
+    output = io.StringIO()
+    device = TextConverter(rsrcmgr, output, codec="utf-8", laparams=LAParams())
+    try:
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page in PDFPage.get_pages(fp, caching=True):
+            interpreter.process_page(page)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    finally:
+        device.close()
+
+
+def _clean_lines(chunks: Iterator[str]) -> Generator[str, None, None]:
+    """Split page chunks into cleaned, non-empty lines.
+
+    A line can continue across a page boundary, so the unterminated tail of
+    each chunk is carried into the next one. The result matches clean_text
+    over the whole document.
+    """
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            line = _clean_line(line)
+            if line:
+                yield line
+    line = _clean_line(pending)
+    if line:
+        yield line
+
+
+def stream_pdf_text(
+    pdf: Union[bytes, BinaryIO, mmap.mmap], max_chars: Optional[int] = None
+) -> ExtractedText:
+    """Extract cleaned text page by page, stopping once max_chars is reached.
+
+    With no budget the text equals clean_text(pdfminer's extract_text). With
+    a budget, pages past the cut-off are never parsed, and truncated reports
+    whether anything was left out.
+    """
+    # A memory map reads like a binary file
+    fp = io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else cast(BinaryIO, pdf)
+    parts: List[str] = []
+    size = 0
+    truncated = False
+    lines = _clean_lines(_page_texts(fp))
+    try:
+        for line in lines:
+            sep = 1 if parts else 0
+            if max_chars is not None and size + sep + len(line) > max_chars:
+                room = max_chars - size - sep
+                if room > 0:
+                    parts.append(line[:room])
+                truncated = True
+                break
+            parts.append(line)
+            size += sep + len(line)
+    finally:
+        lines.close()  # Stop pdfminer before it parses the remaining pages
+    return ExtractedText("\n".join(parts) or None, truncated)
+
+
+def extract_pdf_text(
+    pdf: Union[bytes, BinaryIO, mmap.mmap], max_chars: Optional[int] = None
+) -> ExtractedText:
+    """Extract text in the calling thread; a PDF that fails to parse has no text."""
+    try:
+        return stream_pdf_text(pdf, max_chars)
+    except Exception as e:
+        log.error("PDF extraction failed: %s", e)
+        return ExtractedText(None)
+
+
+class InlineExtractor:
+    """Extract text in the calling thread."""
+
+    def extract(
+        self, pdf: Union[bytes, SpooledPdf], max_chars: Optional[int] = None
+    ) -> ExtractedText:
+        if isinstance(pdf, SpooledPdf):
+            with pdf.open() as fp:
+                return extract_pdf_text(fp, max_chars)
+        return extract_pdf_text(pdf, max_chars)
+
+
+def _extract_worker(
+    conn: Any, pdf: Union[bytes, str], max_chars: Optional[int], max_memory_bytes: int
+) -> None:
+    """Child process entry point: extract text and send it back over conn."""
+    if max_memory_bytes:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory_bytes, max_memory_bytes))
+        except (ImportError, ValueError, OSError):
+            pass  # Not supported on this platform; the timeout still applies
+    try:
+        try:
+            if isinstance(pdf, str):
+                # Spilled download: map the temp file instead of copying it over the pipe
+                with open(pdf, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    extracted = stream_pdf_text(m, max_chars)
+            else:
+                extracted = stream_pdf_text(pdf, max_chars)
+        except MemoryError:
+            raise
+        except Exception as e:
+            log.error("PDF extraction failed: %s", e)
+            extracted = ExtractedText(None)
+        conn.send(("ok", extracted))
+    except MemoryError:
+        conn.send(("memory", "memory limit exceeded"))
+    finally:
+        conn.close()
+
+
+class ProcessExtractor:
+    """Run each extraction in its own worker process, up to one per core.
+
+    pdfminer is pure Python and CPU-bound, so threads cannot spread it across
+    cores, and a pathological PDF can spin for minutes. A dedicated process
+    per document can be killed when it runs past the time limit, and an
+    address-space limit turns runaway allocation into a reported failure
+    instead of swapping the host.
+    """
+
+    def __init__(self, config: ExtractionConfig):
+        self.timeout = config.timeout
+        self.max_memory_bytes = config.max_memory_mb * 1_048_576
+        workers = config.workers or os.cpu_count() or 1
+        self._slots = threading.BoundedSemaphore(workers)
+        methods = multiprocessing.get_all_start_methods()
+        # Forking a process that runs worker threads can deadlock the child
+        self._ctx = (
+            multiprocessing.get_context("forkserver")
+            if "forkserver" in methods
+            else multiprocessing.get_context("spawn")
+        )
+
+    def extract(
+        self, pdf: Union[bytes, SpooledPdf], max_chars: Optional[int] = None
+    ) -> ExtractedText:
+        """Extract text in a worker process.
+
+        Returns the same result as extract_pdf_text. Raises ExtractionError if
+        the worker runs out of time or memory, or dies.
+        """
+        source: Union[bytes, str]
+        if isinstance(pdf, SpooledPdf):
+            pdf.flush()
+            source = pdf.path or pdf.getvalue()
+        else:
+            source = pdf
+        with self._slots:
+            recv_conn, send_conn = self._ctx.Pipe(duplex=False)
+            proc = self._ctx.Process(
+                target=_extract_worker,
+                args=(send_conn, source, max_chars, self.max_memory_bytes),
+                daemon=True,
+            )
+            proc.start()
+            send_conn.close()
+            try:
+                if not recv_conn.poll(self.timeout):
+                    raise ExtractionError(
+                        "timeout", f"extraction exceeded {self.timeout:g}s"
+                    )
+                try:
+                    status, payload = recv_conn.recv()
+                except EOFError:
+                    proc.join(1)
+                    raise ExtractionError(
+                        "crashed", f"extraction worker exited with code {proc.exitcode}"
+                    )
+                if status == "memory":
+                    raise ExtractionError("memory", payload)
+                extracted: ExtractedText = payload
+                return extracted
+            finally:
+                recv_conn.close()
+                if proc.is_alive():
+                    proc.kill()
+                proc.join()
+
+
+def build_extractor(config: ExtractionConfig) -> Union[InlineExtractor, ProcessExtractor]:
+    """Return the configured extraction backend."""
+    if config.backend == "process":
+        return ProcessExtractor(config)
+    if config.backend != "inline":
+        raise ValueError(f"Unknown extraction backend: {config.backend}")
+    return InlineExtractor()
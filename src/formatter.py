@@ -1,8 +1,12 @@
-"""Convert an EnrichmentResult into Notion blocks."""
+"""Convert an EnrichmentResult into Notion blocks and property updates."""
+import logging
+from datetime import datetime
 from typing import List, Dict, Any
 
 from .models import EnrichmentResult
 
+log = logging.getLogger(__name__)
+
 MAX_TEXT = 2000  # Notion rich-text character limit
 
 
@@ -85,3 +89,64 @@ def format_blocks(result: EnrichmentResult) -> List[Dict[str, Any]]:
             blocks.append(_bullet(item))
 
     return blocks
+
+
+def format_property_updates(result: EnrichmentResult) -> List[Dict[str, Any]]:
+    """Build the page property updates for an EnrichmentResult, in write order.
+
+    Title and Created Date are separate updates so a rejected value for one
+    does not block the others.
+    """
+    updates: List[Dict[str, Any]] = []
+
+    # AI-generated title
+    if result.title:
+        updates.append({"Title": {"title": [{"text": {"content": result.title}}]}})
+
+    # AI-inferred Created Date overrides the Drive timestamp
+    if result.created_date:
+        try:
+            ai_date = datetime.fromisoformat(result.created_date)
+            updates.append(
+                {"Created Date": {"date": {"start": ai_date.date().isoformat()}}}
+            )
+        except ValueError:
+            log.warning("Invalid created_date from enrichment: %s", result.created_date)
+
+    # Enrichment properties
+    props: Dict[str, Any] = {}
+    if result.content_type:
+        props["Content-Type"] = {"select": {"name": result.content_type}}
+    if result.ai_primitives:
+        props["AI-Primitive"] = {
+            "multi_select": [{"name": t} for t in result.ai_primitives]
+        }
+    if result.vendor:
+        props["Vendor"] = {"select": {"name": result.vendor}}
+    if result.topical_tags:
+        props["Topical-Tags"] = {
+            "multi_select": [{"name": t} for t in result.topical_tags]
+        }
+    if result.domain_tags:
+        props["Domain-Tags"] = {
+            "multi_select": [{"name": t} for t in result.domain_tags]
+        }
+    if result.client_relevance:
+        props["Client-Relevance"] = {
+            "rich_text": [
+                {"text": {"content": "; ".join(result.client_relevance)[:MAX_TEXT]}}
+            ]
+        }
+    if props:
+        updates.append(props)
+
+    return updates
+
+
+def format_properties(result: EnrichmentResult) -> Dict[str, Any]:
+    """All property updates for an EnrichmentResult merged into one dict (for pages.create)."""
+    return {
+        name: value
+        for update in format_property_updates(result)
+        for name, value in update.items()
+    }
@@ -0,0 +1,148 @@
+"""Local SQLite index of processed Drive files, for dedup without network calls."""
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    drive_id      TEXT PRIMARY KEY,
+    name          TEXT,
+    size          INTEGER,
+    md5           TEXT,
+    modified_time TEXT,
+    content_hash  TEXT,
+    page_id       TEXT,
+    status        TEXT,
+    updated_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash);
+CREATE INDEX IF NOT EXISTS files_md5 ON files (md5);
+"""
+
+_COLUMNS = (
+    "drive_id", "name", "size", "md5", "modified_time",
+    "content_hash", "page_id", "status", "updated_at",
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _size(f: Dict[str, Any]) -> Optional[int]:
+    return int(f["size"]) if f.get("size") is not None else None
+
+
+class DedupIndex:
+    """Maps Drive file metadata to content hash, Notion page ID and status.
+
+    One connection is shared by all worker threads behind a lock; every
+    operation is a single short statement, so contention is negligible
+    next to the network calls it replaces.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def lookup(self, f: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the entry for a listed Drive file if its content is unchanged.
+
+        md5Checksum decides when both sides have it; otherwise size and
+        modifiedTime must match. Entries restored from Notion carry no Drive
+        metadata, so they match on file ID alone and are backfilled here.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM files WHERE drive_id = ?", (f["id"],)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        if entry["md5"] and f.get("md5Checksum"):
+            if entry["md5"] != f["md5Checksum"]:
+                return None
+        elif entry["size"] is not None or entry["modified_time"]:
+            if entry["size"] != _size(f) or entry["modified_time"] != f.get("modifiedTime"):
+                return None
+        else:
+            self._update_metadata(f)
+        return entry
+
+    def hash_known(self, content_hash: str) -> bool:
+        """True if any indexed file with this content hash has a Notion page."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM files WHERE content_hash = ? AND page_id IS NOT NULL LIMIT 1",
+                (content_hash,),
+            ).fetchone()
+        return row is not None
+
+    def md5_known(self, md5: str) -> Optional[Dict[str, Any]]:
+        """Return an entry with a Notion page whose Drive md5Checksum matches."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM files WHERE md5 = ? AND page_id IS NOT NULL LIMIT 1",
+                (md5,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _update_metadata(self, f: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET name = ?, size = ?, md5 = ?, modified_time = ?, "
+                "updated_at = ? WHERE drive_id = ?",
+                (f["name"], _size(f), f.get("md5Checksum"), f.get("modifiedTime"),
+                 _now(), f["id"]),
+            )
+
+    def record(
+        self,
+        f: Dict[str, Any],
+        content_hash: str,
+        page_id: Optional[str],
+        status: Optional[str],
+    ) -> None:
+        """Insert or replace the entry for a Drive file."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO files ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                (f["id"], f.get("name"), _size(f), f.get("md5Checksum"),
+                 f.get("modifiedTime"), content_hash, page_id, status, _now()),
+            )
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Replace the index with entries restored from Notion.
+
+        Each entry needs drive_id, and may carry name, content_hash, page_id,
+        status, md5 and modified_time. Returns the number of entries written.
+        """
+        count = 0
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files")
+            for entry in entries:
+                row = {c: entry.get(c) for c in _COLUMNS}
+                row["updated_at"] = _now()
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO files ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                    tuple(row[c] for c in _COLUMNS),
+                )
+                count += 1
+        return count
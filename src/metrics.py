@@ -0,0 +1,232 @@
+"""Run metrics: per-stage latency histograms, counters and the end-of-run report."""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+log = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+PROMETHEUS_PREFIX = "knowledge_pipeline"
+
+
+class Histogram:
+    """Latency distribution of one stage: per-bucket counts, sum, min and max."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(BUCKETS) + 1)  # Last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket)."""
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            "min": round(self.min, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+class RunMetrics:
+    """Stage timings and counters for one run, safe to update from any thread or task.
+
+    Stages are timed with timed(), which also counts failures as
+    "<stage>_errors". Counters hold byte, character and token totals.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Counter = Counter()
+        self.started_at = datetime.now(timezone.utc)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def add(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        start = self._clock()
+        try:
+            yield
+        except BaseException:
+            self.add(f"{stage}_errors")
+            raise
+        finally:
+            self.observe(stage, self._clock() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {name: h.snapshot() for name, h in sorted(self.stages.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+_current = RunMetrics()
+
+
+def start_run() -> RunMetrics:
+    """Start collecting a new run's metrics (the process-wide collector)."""
+    global _current
+    _current = RunMetrics()
+    return _current
+
+
+def current() -> RunMetrics:
+    """The collector of the run in progress."""
+    return _current
+
+
+def timed(stage: str) -> ContextManager[None]:
+    """Time a block as one observation of stage in the current run."""
+    return _current.timed(stage)
+
+
+def add(name: str, n: int = 1) -> None:
+    """Add n to a counter of the current run."""
+    _current.add(name, n)
+
+
+def add_usage(usage: Any) -> None:
+    """Count the tokens an OpenAI response reports (if it reports any)."""
+    if usage is None:
+        return
+    for name in ("input_tokens", "output_tokens"):
+        value = getattr(usage, name, None)
+        if isinstance(value, int):
+            _current.add(name, value)
+    cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", None)
+    if isinstance(cached, int):
+        _current.add("cached_tokens", cached)
+
+
+def build_report(
+    stats: Dict[str, Any],
+    elapsed: float,
+    extra: Optional[Dict[str, Any]] = None,
+    metrics: Optional[RunMetrics] = None,
+) -> Dict[str, Any]:
+    """The machine-readable run report: outcomes, throughput, stages and counters."""
+    metrics = metrics or _current
+    outcomes = {k: v for k, v in stats.items() if isinstance(v, int)}
+    done = outcomes.get("processed", 0)
+    report = {
+        "started_at": metrics.started_at.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "elapsed_seconds": round(elapsed, 3),
+        "documents": outcomes,
+        "throughput_per_min": round(done / (elapsed / 60), 3) if elapsed > 0 else 0.0,
+        **metrics.snapshot(),
+    }
+    report.update(extra or {})
+    return report
+
+
+def write_json(path: str, report: Dict[str, Any]) -> None:
+    """Write the report atomically (so a reader never sees half a file)."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(report: Dict[str, Any]) -> str:
+    """Render a run report in the Prometheus text format (for node_exporter's textfile collector)."""
+    p = PROMETHEUS_PREFIX
+    lines: List[str] = [
+        f"# HELP {p}_stage_seconds Latency of each pipeline stage in the last run.",
+        f"# TYPE {p}_stage_seconds histogram",
+    ]
+    for stage, h in report["stages"].items():
+        cumulative = 0
+        for le, n in h["buckets"].items():
+            cumulative += n
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{_label(stage)}",le="{le}"}} {cumulative}')
+        lines.append(f'{p}_stage_seconds_sum{{stage="{_label(stage)}"}} {h["sum"]}')
+        lines.append(f'{p}_stage_seconds_count{{stage="{_label(stage)}"}} {h["count"]}')
+    lines += [
+        f"# HELP {p}_events_total Bytes, characters, tokens and other counts in the last run.",
+        f"# TYPE {p}_events_total counter",
+    ]
+    for name, value in report["counters"].items():
+        lines.append(f'{p}_events_total{{name="{_label(name)}"}} {value}')
+    lines += [
+        f"# HELP {p}_documents Documents by outcome in the last run.",
+        f"# TYPE {p}_documents gauge",
+    ]
+    for outcome, value in report["documents"].items():
+        lines.append(f'{p}_documents{{outcome="{_label(outcome)}"}} {value}')
+    lines += [
+        f"# HELP {p}_retries_total Retries and circuit-breaker events by service in the last run.",
+        f"# TYPE {p}_retries_total counter",
+    ]
+    for service, counts in report.get("retries", {}).items():
+        for event, value in counts.items():
+            lines.append(
+                f'{p}_retries_total{{service="{_label(service)}",event="{_label(event)}"}} {value}'
+            )
+    lines += [
+        f"# HELP {p}_concurrency_limit Adaptive in-flight limit by service at the end of the last run.",
+        f"# TYPE {p}_concurrency_limit gauge",
+    ]
+    for service, snap in report.get("concurrency", {}).items():
+        lines.append(f'{p}_concurrency_limit{{service="{_label(service)}"}} {snap["limit"]}')
+    lines += [
+        f"# TYPE {p}_run_seconds gauge",
+        f"{p}_run_seconds {report['elapsed_seconds']}",
+        f"# TYPE {p}_last_run_timestamp_seconds gauge",
+        f"{p}_last_run_timestamp_seconds {datetime.fromisoformat(report['finished_at']).timestamp():.0f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, report: Dict[str, Any]) -> None:
+    """Write the textfile atomically, as node_exporter expects."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text(report))
+    os.replace(tmp, path)
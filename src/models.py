@@ -20,6 +20,8 @@ class SourceContent:
     status: ContentStatus = ContentStatus.INBOX
     drive_url: Optional[str] = None
     created_date: Optional[datetime] = None
+    drive_md5: Optional[str] = None
+    drive_modified: Optional[datetime] = None
 
     def to_notion_properties(self) -> Dict[str, Any]:
         props: Dict[str, Any] = {
@@ -32,6 +34,10 @@ class SourceContent:
             props["Drive URL"] = {"url": self.drive_url}
         if self.created_date:
             props["Created Date"] = {"date": {"start": self.created_date.isoformat()}}
+        if self.drive_md5:
+            props["Drive MD5"] = {"rich_text": [{"text": {"content": self.drive_md5}}]}
+        if self.drive_modified:
+            props["Drive Modified"] = {"date": {"start": self.drive_modified.isoformat()}}
         return props
 
 
@@ -1,137 +1,596 @@
 """Notion client: query database, create/update pages, add blocks."""
-import time
+import asyncio
+import re
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterator, List, Dict, Any, Optional, Set
 
-from notion_client import Client
+from notion_client import AsyncClient, Client
 
+from .concurrency import AdaptiveLimit, AsyncAdaptiveLimit
 from .config import NotionConfig
 from .models import SourceContent, ContentStatus
-from .retry import retry_on_transient
+from .rate_limit import TokenBucket, shared_bucket
+from .retry import retrier, retry_after
+from .tool_cache import ToolCache, fetch_key, search_key
+
+if TYPE_CHECKING:
+    from .workspace_index import WorkspaceIndex
 
 log = logging.getLogger(__name__)
 
+# Notion accepts at most 100 blocks per pages.create or blocks.children.append
+BLOCKS_PER_REQUEST = 100
+
+# Sources properties added after the original schema. New pages leave them
+# out if the database does not have them, rather than fail with a 400.
+OPTIONAL_PROPERTIES = ("Drive MD5", "Drive Modified")
+
+
+def page_title(page: Dict[str, Any]) -> str:
+    """Return the plain text of a page's title property ("" if none)."""
+    for prop in page.get("properties", {}).values():
+        if prop.get("type") == "title":
+            return "".join(t.get("plain_text", "") for t in prop.get("title", []))
+    return ""
+
+
+def _plain_text(prop: Dict[str, Any]) -> str:
+    """Plain text of a title or rich_text property value."""
+    return "".join(t.get("plain_text", "") for t in prop.get(prop.get("type", ""), []) or [])
+
+
+def source_record(page: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize a Sources database page for the local dedup index."""
+    props = page.get("properties", {})
+    drive_url = (props.get("Drive URL") or {}).get("url") or ""
+    match = re.search(r"/d/([\w-]+)", drive_url)
+    status = ((props.get("Status") or {}).get("select") or {}).get("name")
+    return {
+        "page_id": page["id"],
+        "drive_id": match.group(1) if match else None,
+        "name": page_title(page),
+        "content_hash": _plain_text(props.get("Hash") or {}) or None,
+        "md5": _plain_text(props.get("Drive MD5") or {}) or None,
+        "status": status,
+    }
+
+
+def notion_limiter(config: NotionConfig) -> Optional[TokenBucket]:
+    """The process-wide request budget for config's integration (None if unlimited)."""
+    return shared_bucket(f"notion:{config.token}", config.requests_per_second, config.burst)
+
+
+def is_validation_error(exc: BaseException) -> bool:
+    """True if Notion rejected the request itself (HTTP 400), so nothing was written."""
+    return getattr(exc, "status", None) == 400
+
+
+def _pause_for(limiter: Optional[TokenBucket], exc: Exception) -> None:
+    """On a 429, hold every caller sharing limiter for the Retry-After period (1 s if not given)."""
+    if limiter is not None and getattr(exc, "status", None) == 429:
+        limiter.pause(retry_after(exc) or 1.0)
+
+
+def _missing_properties(db: Dict[str, Any]) -> Set[str]:
+    """The OPTIONAL_PROPERTIES a databases.retrieve response lacks (none if it has no schema)."""
+    schema = db.get("properties")
+    if not schema:
+        return set()
+    missing = {name for name in OPTIONAL_PROPERTIES if name not in schema}
+    if missing:
+        log.warning("Sources database lacks %s; new pages leave it out (see README)",
+                    ", ".join(sorted(missing)))
+    return missing
+
+
+def _page_args(
+    db_id: str,
+    content: SourceContent,
+    properties: Optional[Dict[str, Any]],
+    children: Optional[List[Dict[str, Any]]],
+    missing: Set[str],
+) -> Dict[str, Any]:
+    """pages.create arguments for a Sources page, without the missing properties."""
+    props = {**content.to_notion_properties(), **(properties or {})}
+    args: Dict[str, Any] = {
+        "parent": {"database_id": db_id},
+        "properties": {k: v for k, v in props.items() if k not in missing},
+    }
+    if children:
+        args["children"] = children[:BLOCKS_PER_REQUEST]
+    return args
+
+
+def _text_query(prop: str, value: str) -> Dict[str, Any]:
+    return {"filter": {"property": prop, "rich_text": {"equals": value}}}
+
+
+def _has_title(resp: Dict[str, Any], db_id: str, title: str) -> bool:
+    """Return True if a search response holds a page in db_id with this exact title."""
+    for page in resp.get("results", []):
+        if page.get("object") != "page":
+            continue
+        parent = page.get("parent", {})
+        if parent.get("database_id", "").replace("-", "") != db_id.replace("-", ""):
+            continue
+        if page_title(page) == title:
+            return True
+    return False
+
+
+def _search_results(resp: Dict[str, Any], max_results: int) -> List[Dict[str, str]]:
+    """Reduce a search response to page_id/title/url dicts."""
+    results: List[Dict[str, str]] = []
+    for page in resp.get("results", []):
+        if page.get("object") != "page":
+            continue
+        results.append({
+            "page_id": page["id"],
+            "title": page_title(page),
+            "url": page.get("url", ""),
+        })
+    return results[:max_results]
+
+
+def _blocks_text(resp: Dict[str, Any], max_chars: int) -> str:
+    """Concatenate rich text from a block children response, up to max_chars."""
+    text_parts: List[str] = []
+    total = 0
+    for block in resp.get("results", []):
+        block_type = block.get("type", "")
+        block_data = block.get(block_type, {})
+        rich_texts = block_data.get("rich_text", [])
+        for rt in rich_texts:
+            plain = rt.get("plain_text", "")
+            if plain:
+                text_parts.append(plain)
+                total += len(plain)
+                if total >= max_chars:
+                    break
+        if total >= max_chars:
+            break
+    content = "\n".join(text_parts)
+    return content[:max_chars]
+
 
 class NotionClient:
     """Simplified Notion client for the knowledge pipeline."""
 
-    def __init__(self, config: NotionConfig):
+    def __init__(
+        self,
+        config: NotionConfig,
+        tool_cache: Optional[ToolCache] = None,
+        workspace: Optional["WorkspaceIndex"] = None,
+    ):
         self.client = Client(auth=config.token)
         self.db_id = config.sources_db_id
+        # Shared by every client for this integration in the process
+        self.limiter = notion_limiter(config)
+        # Shared memo for enrichment tool lookups (None: always ask Notion)
+        self.tool_cache = tool_cache
+        # Local full-text index that answers tool lookups first, if set
+        self.workspace = workspace
+        # Notion limit that requests sent from inside the client (enrichment
+        # tool lookups, add_blocks chunks) share with the caller's own writes
+        # (the pipeline holds a slot around those itself)
+        self.tool_slot: Optional[AdaptiveLimit] = None
+        self._missing: Optional[Set[str]] = None
+        self._schema_lock = threading.Lock()
+
+    def _request(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Send one API request once the rate limiter allows it.
 
-    def hash_exists(self, content_hash: str) -> bool:
-        """Check if a content hash already exists in the database.
+        A 429 pauses the limiter for the Retry-After period and is raised;
+        the caller's retrier("notion") decides whether to send it again.
+        """
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as exc:
+            _pause_for(self.limiter, exc)
+            raise
+
+    def _slot_request(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """_request holding a tool_slot slot if one is set."""
+        if self.tool_slot is None:
+            return self._request(fn, *args, **kwargs)
+        return self.tool_slot.call(self._request, fn, *args, **kwargs)
+
+    def _find_by_text(self, prop: str, value: str) -> Optional[Dict[str, Any]]:
+        """Return the first page whose rich-text prop equals value, or None.
 
-        Falls back to False if the query fails (e.g. Notion API v2025
+        Falls back to None if the query fails (e.g. Notion API v2025
         removed databases.query — dedup is best-effort).
         """
         try:
-            resp = retry_on_transient(
+            resp = retrier("notion").call(
+                self._request,
                 self.client.request,
                 path=f"databases/{self.db_id}/query",
                 method="POST",
-                body={"filter": {"property": "Hash", "rich_text": {"equals": content_hash}}},
+                body=_text_query(prop, value),
             )
-            return len(resp.get("results", [])) > 0
-        except Exception:
-            log.debug("hash_exists query failed, assuming not seen")
-            return False
+        except Exception as e:
+            log.warning("%s query failed, assuming %s… not seen: %s", prop, value[:12], e)
+            return None
+        results = resp.get("results", [])
+        return results[0] if results else None
+
+    def missing_properties(self) -> Set[str]:
+        """OPTIONAL_PROPERTIES the Sources database lacks, read once with databases.retrieve.
+
+        If the schema cannot be read, every property is assumed present.
+        """
+        with self._schema_lock:
+            if self._missing is None:
+                try:
+                    db = retrier("notion").call(
+                        self._request, self.client.databases.retrieve, database_id=self.db_id
+                    )
+                except Exception as e:
+                    log.warning("Could not read the Sources database schema: %s", e)
+                    db = {}
+                self._missing = _missing_properties(db)
+            return self._missing
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the first page whose Hash matches, or None."""
+        return self._find_by_text("Hash", content_hash)
+
+    def find_by_md5(self, md5: str) -> Optional[Dict[str, Any]]:
+        """Return the first page whose Drive MD5 matches, or None."""
+        if "Drive MD5" in self.missing_properties():
+            return None
+        return self._find_by_text("Drive MD5", md5)
+
+    def iter_source_pages(self) -> Iterator[Dict[str, Any]]:
+        """Yield every page in the Sources database, 100 per request."""
+        body: Dict[str, Any] = {"page_size": 100}
+        while True:
+            resp = retrier("notion").call(
+                self._request,
+                self.client.request,
+                path=f"databases/{self.db_id}/query",
+                method="POST",
+                body=body,
+            )
+            yield from resp.get("results", [])
+            if not resp.get("has_more") or not resp.get("next_cursor"):
+                return
+            body = {"page_size": 100, "start_cursor": resp["next_cursor"]}
 
     def title_exists(self, title: str) -> bool:
         """Check if a page with this title already exists in the database."""
         try:
-            resp = retry_on_transient(
-                self.client.search, query=title, page_size=10
+            resp = retrier("notion").call(
+                self._request, self.client.search, query=title, page_size=10
             )
-            for page in resp.get("results", []):
-                if page.get("object") != "page":
-                    continue
-                parent = page.get("parent", {})
-                if parent.get("database_id", "").replace("-", "") != self.db_id.replace("-", ""):
-                    continue
-                props = page.get("properties", {})
-                for prop in props.values():
-                    if prop.get("type") == "title":
-                        page_title = "".join(
-                            t.get("plain_text", "") for t in prop.get("title", [])
-                        )
-                        if page_title == title:
-                            return True
-            return False
+            return _has_title(resp, self.db_id, title)
         except Exception:
             log.debug("title_exists search failed, assuming not seen")
             return False
 
-    def create_page(self, content: SourceContent) -> str:
-        """Create a new page and return its ID."""
-        resp = self.client.pages.create(
-            parent={"database_id": self.db_id},
-            properties=content.to_notion_properties(),
-        )
-        return resp["id"]
+    def create_page(
+        self,
+        content: SourceContent,
+        properties: Optional[Dict[str, Any]] = None,
+        children: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        """Create a new page and return its ID.
 
-    def update_page_properties(self, page_id: str, properties: Dict[str, Any]):
+        properties are added to (and override) content's; children are up
+        to BLOCKS_PER_REQUEST blocks for the page body.
+        """
+        args = _page_args(self.db_id, content, properties, children, self.missing_properties())
+        resp = self._request(self.client.pages.create, **args)
+        return str(resp["id"])
+
+    def update_page_properties(self, page_id: str, properties: Dict[str, Any]) -> None:
         """Update arbitrary properties on a page."""
-        self.client.pages.update(page_id=page_id, properties=properties)
+        self._request(self.client.pages.update, page_id=page_id, properties=properties)
 
-    def set_status(self, page_id: str, status: ContentStatus):
+    def set_status(self, page_id: str, status: ContentStatus) -> None:
         """Set the Status select property on a page."""
         self.update_page_properties(
             page_id, {"Status": {"select": {"name": status.value}}}
         )
 
-    def add_blocks(self, page_id: str, blocks: List[Dict[str, Any]]):
-        """Append content blocks to a page (respects 100-block API limit)."""
-        for i in range(0, len(blocks), 100):
-            self.client.blocks.children.append(
-                block_id=page_id, children=blocks[i : i + 100]
+    def add_blocks(self, page_id: str, blocks: List[Dict[str, Any]]) -> None:
+        """Append content blocks to a page (BLOCKS_PER_REQUEST per request).
+
+        Each request is retried on its own under the notion policy, so a
+        transient error on one chunk does not append the earlier ones again.
+        Callers must not retry the whole call.
+        """
+        for i in range(0, len(blocks), BLOCKS_PER_REQUEST):
+            retrier("notion").call(
+                self._slot_request,
+                self.client.blocks.children.append,
+                block_id=page_id,
+                children=blocks[i : i + BLOCKS_PER_REQUEST],
             )
-            if i + 100 < len(blocks):
-                time.sleep(0.3)
+
+    def clear_blocks(self, page_id: str) -> int:
+        """Delete every top-level block of a page, e.g. before writing its body again.
+
+        Returns the number of blocks deleted. Like add_blocks, each request
+        is retried on its own.
+        """
+        block_ids: List[str] = []
+        kwargs: Dict[str, Any] = {"block_id": page_id, "page_size": 100}
+        while True:
+            resp = retrier("notion").call(
+                self._slot_request, self.client.blocks.children.list, **kwargs
+            )
+            block_ids.extend(block["id"] for block in resp.get("results", []))
+            if not resp.get("has_more") or not resp.get("next_cursor"):
+                break
+            kwargs["start_cursor"] = resp["next_cursor"]
+        for block_id in block_ids:
+            retrier("notion").call(self._slot_request, self.client.blocks.delete, block_id=block_id)
+        return len(block_ids)
 
     def search_workspace(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
         """Search the Notion workspace for pages matching a query.
 
-        Returns a list of dicts with page_id, title, and url.
+        Returns a list of dicts with page_id, title, and url. Results come
+        from the local workspace index or the tool cache when one is set.
         """
-        resp = self.client.search(query=query, page_size=max_results)
-        results: List[Dict[str, str]] = []
-        for page in resp.get("results", []):
-            if page.get("object") != "page":
-                continue
-            page_id = page["id"]
-            url = page.get("url", "")
-            # Extract title from properties
-            title = ""
-            props = page.get("properties", {})
-            for prop in props.values():
-                if prop.get("type") == "title":
-                    title_parts = prop.get("title", [])
-                    title = "".join(t.get("plain_text", "") for t in title_parts)
-                    break
-            results.append({"page_id": page_id, "title": title, "url": url})
-        return results[:max_results]
+        if self.workspace is not None:
+            return self.workspace.search(query, max_results)
+        if self.tool_cache is not None:
+            results: List[Dict[str, str]] = self.tool_cache.call(
+                search_key(query, max_results), self._search_workspace, query, max_results
+            )
+            return results
+        return self._search_workspace(query, max_results)
+
+    def _search_workspace(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        resp = retrier("notion").call(
+            self._slot_request, self.client.search, query=query, page_size=max_results
+        )
+        return _search_results(resp, max_results)
 
     def fetch_page_content(self, page_id: str, max_chars: int = 4000) -> str:
         """Fetch the plain-text content of a Notion page's blocks.
 
         Concatenates text from all block types, truncated to max_chars.
+        Served from the workspace index (pages it holds) or the tool cache
+        when one is set.
         """
-        resp = self.client.blocks.children.list(block_id=page_id)
-        text_parts: List[str] = []
+        if self.workspace is not None:
+            content = self.workspace.fetch(page_id, max_chars)
+            if content is not None:
+                return content
+        if self.tool_cache is not None:
+            return str(self.tool_cache.call(
+                fetch_key(page_id, max_chars), self._fetch_page_content, page_id, max_chars
+            ))
+        return self._fetch_page_content(page_id, max_chars)
+
+    def _fetch_page_content(self, page_id: str, max_chars: int) -> str:
+        resp = retrier("notion").call(
+            self._slot_request, self.client.blocks.children.list, block_id=page_id
+        )
+        return _blocks_text(resp, max_chars)
+
+    def iter_workspace_pages(self) -> Iterator[Dict[str, Any]]:
+        """Yield every page shared with the integration, most recently edited first."""
+        body: Dict[str, Any] = {
+            "filter": {"property": "object", "value": "page"},
+            "sort": {"direction": "descending", "timestamp": "last_edited_time"},
+            "page_size": 100,
+        }
+        while True:
+            resp = retrier("notion").call(self._request, self.client.search, **body)
+            yield from resp.get("results", [])
+            if not resp.get("has_more") or not resp.get("next_cursor"):
+                return
+            body["start_cursor"] = resp["next_cursor"]
+
+    def page_text(self, page_id: str, max_chars: int) -> str:
+        """Plain text of a page's top-level blocks across all block pages, uncached."""
+        parts: List[str] = []
         total = 0
-        for block in resp.get("results", []):
-            block_type = block.get("type", "")
-            block_data = block.get(block_type, {})
-            rich_texts = block_data.get("rich_text", [])
-            for rt in rich_texts:
-                plain = rt.get("plain_text", "")
-                if plain:
-                    text_parts.append(plain)
-                    total += len(plain)
-                    if total >= max_chars:
-                        break
-            if total >= max_chars:
+        kwargs: Dict[str, Any] = {"block_id": page_id}
+        while total < max_chars:
+            resp = retrier("notion").call(self._request, self.client.blocks.children.list, **kwargs)
+            text = _blocks_text(resp, max_chars - total)
+            if text:
+                parts.append(text)
+                total += len(text) + 1
+            if not resp.get("has_more") or not resp.get("next_cursor"):
                 break
-        content = "\n".join(text_parts)
-        return content[:max_chars]
+            kwargs["start_cursor"] = resp["next_cursor"]
+        return "\n".join(parts)[:max_chars]
+
+
+class AsyncNotionClient:
+    """asyncio counterpart of NotionClient, built on notion_client.AsyncClient.
+
+    Every request holds a slot of an adaptive limit that starts at
+    config.max_concurrency, so tool calls made during enrichment share the
+    cap with the pipeline's own writes.
+    """
+
+    def __init__(
+        self,
+        config: NotionConfig,
+        tool_cache: Optional[ToolCache] = None,
+        workspace: Optional["WorkspaceIndex"] = None,
+    ):
+        self.client = AsyncClient(auth=config.token)
+        self.db_id = config.sources_db_id
+        self.tool_cache = tool_cache
+        self.workspace = workspace
+        self._slot = AsyncAdaptiveLimit("notion", config.max_concurrency, config.concurrency_ceiling)
+        self.limiter = notion_limiter(config)
+        self._missing: Optional[Set[str]] = None
+        self._schema_lock = asyncio.Lock()
+
+    async def _request(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Await one API request once the rate limiter allows it (see NotionClient._request).
+
+        The request holds one of the client's slots.
+        """
+        if self.limiter is not None:
+            await self.limiter.acquire_async()
+        try:
+            async with self._slot:
+                return await fn(*args, **kwargs)
+        except Exception as exc:
+            _pause_for(self.limiter, exc)
+            raise
+
+    async def _find_by_text(self, prop: str, value: str) -> Optional[Dict[str, Any]]:
+        """Return the first page whose rich-text prop equals value, or None (best-effort)."""
+        try:
+            resp = await retrier("notion").acall(
+                self._request,
+                self.client.request,
+                path=f"databases/{self.db_id}/query",
+                method="POST",
+                body=_text_query(prop, value),
+            )
+        except Exception as e:
+            log.warning("%s query failed, assuming %s… not seen: %s", prop, value[:12], e)
+            return None
+        results = resp.get("results", [])
+        return results[0] if results else None
+
+    async def missing_properties(self) -> Set[str]:
+        """OPTIONAL_PROPERTIES the Sources database lacks (see NotionClient.missing_properties)."""
+        async with self._schema_lock:
+            if self._missing is None:
+                try:
+                    db = await retrier("notion").acall(
+                        self._request, self.client.databases.retrieve, database_id=self.db_id
+                    )
+                except Exception as e:
+                    log.warning("Could not read the Sources database schema: %s", e)
+                    db = {}
+                self._missing = _missing_properties(db)
+            return self._missing
+
+    async def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the first page whose Hash matches, or None."""
+        return await self._find_by_text("Hash", content_hash)
+
+    async def find_by_md5(self, md5: str) -> Optional[Dict[str, Any]]:
+        """Return the first page whose Drive MD5 matches, or None."""
+        if "Drive MD5" in await self.missing_properties():
+            return None
+        return await self._find_by_text("Drive MD5", md5)
+
+    async def iter_source_pages(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every page in the Sources database, 100 per request."""
+        body: Dict[str, Any] = {"page_size": 100}
+        while True:
+            resp = await retrier("notion").acall(
+                self._request,
+                self.client.request,
+                path=f"databases/{self.db_id}/query",
+                method="POST",
+                body=body,
+            )
+            for page in resp.get("results", []):
+                yield page
+            if not resp.get("has_more") or not resp.get("next_cursor"):
+                return
+            body = {"page_size": 100, "start_cursor": resp["next_cursor"]}
+
+    async def title_exists(self, title: str) -> bool:
+        """Check if a page with this title already exists in the database."""
+        try:
+            resp = await retrier("notion").acall(
+                self._request, self.client.search, query=title, page_size=10
+            )
+            return _has_title(resp, self.db_id, title)
+        except Exception:
+            log.debug("title_exists search failed, assuming not seen")
+            return False
+
+    async def create_page(
+        self,
+        content: SourceContent,
+        properties: Optional[Dict[str, Any]] = None,
+        children: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        """Create a new page and return its ID (see NotionClient.create_page)."""
+        missing = await self.missing_properties()
+        args = _page_args(self.db_id, content, properties, children, missing)
+        resp = await self._request(self.client.pages.create, **args)
+        return str(resp["id"])
+
+    async def update_page_properties(self, page_id: str, properties: Dict[str, Any]) -> None:
+        """Update arbitrary properties on a page."""
+        await self._request(self.client.pages.update, page_id=page_id, properties=properties)
+
+    async def set_status(self, page_id: str, status: ContentStatus) -> None:
+        """Set the Status select property on a page."""
+        await self.update_page_properties(
+            page_id, {"Status": {"select": {"name": status.value}}}
+        )
+
+    async def add_blocks(self, page_id: str, blocks: List[Dict[str, Any]]) -> None:
+        """Append content blocks, retrying each request on its own (see NotionClient.add_blocks)."""
+        for i in range(0, len(blocks), BLOCKS_PER_REQUEST):
+            await retrier("notion").acall(
+                self._request,
+                self.client.blocks.children.append,
+                block_id=page_id,
+                children=blocks[i : i + BLOCKS_PER_REQUEST],
+            )
+
+    async def clear_blocks(self, page_id: str) -> int:
+        """Delete every top-level block of a page (see NotionClient.clear_blocks)."""
+        block_ids: List[str] = []
+        kwargs: Dict[str, Any] = {"block_id": page_id, "page_size": 100}
+        while True:
+            resp = await retrier("notion").acall(
+                self._request, self.client.blocks.children.list, **kwargs
+            )
+            block_ids.extend(block["id"] for block in resp.get("results", []))
+            if not resp.get("has_more") or not resp.get("next_cursor"):
+                break
+            kwargs["start_cursor"] = resp["next_cursor"]
+        for block_id in block_ids:
+            await retrier("notion").acall(self._request, self.client.blocks.delete, block_id=block_id)
+        return len(block_ids)
+
+    async def search_workspace(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        """Search the Notion workspace for pages matching a query (local index or cache first)."""
+        if self.workspace is not None:
+            return self.workspace.search(query, max_results)
+        if self.tool_cache is not None:
+            results: List[Dict[str, str]] = await self.tool_cache.acall(
+                search_key(query, max_results), self._search_workspace, query, max_results
+            )
+            return results
+        return await self._search_workspace(query, max_results)
+
+    async def _search_workspace(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        resp = await retrier("notion").acall(
+            self._request, self.client.search, query=query, page_size=max_results
+        )
+        return _search_results(resp, max_results)
+
+    async def fetch_page_content(self, page_id: str, max_chars: int = 4000) -> str:
+        """Fetch the plain-text content of a Notion page's blocks (local index or cache first)."""
+        if self.workspace is not None:
+            content = self.workspace.fetch(page_id, max_chars)
+            if content is not None:
+                return content
+        if self.tool_cache is not None:
+            return str(await self.tool_cache.acall(
+                fetch_key(page_id, max_chars), self._fetch_page_content, page_id, max_chars
+            ))
+        return await self._fetch_page_content(page_id, max_chars)
+
+    async def _fetch_page_content(self, page_id: str, max_chars: int) -> str:
+        resp = await retrier("notion").acall(
+            self._request, self.client.blocks.children.list, block_id=page_id
+        )
+        return _blocks_text(resp, max_chars)
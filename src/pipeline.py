@@ -1,28 +1,307 @@
 """Main pipeline: Drive PDFs -> AI enrichment -> Notion pages."""
+import heapq
+import itertools
 import logging
+import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional
 
+from . import metrics
+from .batch import BatchJob, batch_line
+from .catalog import SourceCatalog
+from .concurrency import AdaptiveLimit, report_limits
 from .config import PipelineConfig
 from .drive_client import DriveClient
-from .enrichment import enrich
-from .formatter import format_blocks
-from .models import ContentStatus, SourceContent
-from .notion_client import NotionClient
-from .retry import retry_on_transient
+from .drive_sync import DriveSync
+from .enrichment import build_client, enrich, input_budget
+from .extraction import ExtractedText, ExtractionError, build_extractor
+from .formatter import format_blocks, format_properties, format_property_updates
+from .index import DedupIndex
+from .models import ContentStatus, EnrichmentResult, SourceContent
+from .notion_client import BLOCKS_PER_REQUEST, NotionClient, is_validation_error, source_record
+from .profiling import build_profiler
+from .result_cache import ResultCache, build_result_cache
+from .retry import configure_services, retrier, retry_stats
+from .spool import SpooledPdf
+from .stages import Stage, StagedRunner
+from .tool_cache import ToolCache, build_tool_cache
+from .workspace_index import build_workspace_index, refresh_workspace
 
 log = logging.getLogger(__name__)
 
+# Statuses of pages a failed or interrupted run left behind
+_UNFINISHED = (ContentStatus.PROCESSING.value, ContentStatus.FAILED.value)
 
-class Pipeline:
+
+@dataclass
+class _Document:
+    """Work item carried through the per-document steps."""
+    file: Dict[str, Any]
+    idx: int
+    total: Optional[int]  # None while discovery is still streaming
+    pdf: Optional[SpooledPdf] = None
+    content_hash: str = ""
+    text: Optional[str] = None
+    truncated: bool = False
+    page_id: Optional[str] = None
+    result: Optional[EnrichmentResult] = None
+    outcome: Optional[str] = None  # "processed", "skipped" or "failed" once finished
+
+    @property
+    def name(self) -> str:
+        return str(self.file["name"])
+
+
+def discover_pdfs(files: Iterable[Dict[str, Any]], window: int = 100) -> Iterator[Dict[str, Any]]:
+    """Yield the Drive PDFs to process while the listing is still arriving.
+
+    Upload duplicates are dropped. Files are ordered smallest first within a
+    sliding window of window files rather than across the whole listing, so
+    the first documents start before discovery ends and memory stays
+    bounded; window=1 keeps listing order.
+    """
+    heap: List[Any] = []
+    order = itertools.count()  # Tie-breaker: equal sizes keep listing order
+    found = dupes_removed = 0
+    for f in files:
+        # Filter out Drive upload duplicates like "doc (1).pdf"
+        if Pipeline._is_duplicate(f["name"]):
+            dupes_removed += 1
+            continue
+        found += 1
+        heapq.heappush(heap, (int(f.get("size", 0)), next(order), f))
+        if len(heap) >= max(1, window):
+            yield heapq.heappop(heap)[2]
+
+    if dupes_removed:
+        print(f"Filtered {dupes_removed} duplicate upload(s)")
+    print(f"Found {found} PDFs in Drive folder")
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def _drive_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Drive RFC 3339 timestamp, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def source_content(
+    f: Dict[str, Any], content_hash: str, status: ContentStatus = ContentStatus.PROCESSING
+) -> SourceContent:
+    """Describe a Drive file as a page in the Sources database."""
+    return SourceContent(
+        title=f["name"],
+        hash=content_hash,
+        status=status,
+        drive_url=f.get("webViewLink"),
+        created_date=_drive_time(f.get("createdTime")),
+        drive_md5=f.get("md5Checksum"),
+        drive_modified=_drive_time(f.get("modifiedTime")),
+    )
+
+
+def resumable(known: Dict[str, Any], retry_failed: bool) -> bool:
+    """True if retry_failed is set and known (an index entry or source_record
+    dict) is a page left Processing or Failed."""
+    return bool(retry_failed and known.get("page_id") and known.get("status") in _UNFINISHED)
+
+
+class _DocumentRules:
+    """Skip, resume and bookkeeping rules shared by Pipeline and AsyncPipeline.
+
+    Each pipeline looks a document up its own way, with blocking calls or
+    awaits, and hands what it found to these methods. Both then skip,
+    resume, reuse cached results and record documents the same way.
+    """
+
+    config: PipelineConfig
+    sync: DriveSync
+    index: Optional[DedupIndex]
+    results: Optional[ResultCache]
+    catalog: Optional[SourceCatalog]
+    _print_lock: threading.Lock
+
+    def _say(self, message: str) -> None:
+        """Print a progress line without interleaving output from other workers."""
+        with self._print_lock:
+            print(message)
+
+    def _record(self, doc: _Document, status: Optional[str]) -> None:
+        """Remember a document's hash, page and status in the index and catalog."""
+        if self.index is not None:
+            self.index.record(doc.file, doc.content_hash, doc.page_id, status)
+        if self.catalog is not None and doc.page_id:
+            self.catalog.add_file(doc.file, doc.content_hash, doc.page_id, status)
+
+    def _resume(self, doc: _Document, known: Dict[str, Any]) -> bool:
+        """With retry_failed, take over a page left Processing or Failed.
+
+        known is an index entry or source_record dict. Returns False when the
+        page is finished (or retries are off), i.e. the file should be skipped.
+        """
+        if not resumable(known, self.config.retry_failed):
+            return False
+        doc.page_id = known["page_id"]
+        doc.content_hash = known.get("content_hash") or ""
+        self._say(f"  resume ({known['status']}): {doc.name}")
+        return True
+
+    def _skip(self, doc: _Document, reason: str) -> None:
+        self._say(f"  skip ({reason}): {doc.name}")
+        doc.outcome = "skipped"
+
+    def _skip_indexed(self, doc: _Document) -> bool:
+        """Skip a file the local index has a page for; costs no network calls."""
+        entry = self.index.lookup(doc.file) if self.index is not None else None
+        if not entry or not entry["page_id"] or self._resume(doc, entry):
+            return False
+        self._skip(doc, "indexed")
+        return True
+
+    def _skip_existing(self, doc: _Document, known: Optional[Dict[str, Any]]) -> bool:
+        """Skip a file whose Drive file ID or title is already in Sources."""
+        if known is None or self._resume(doc, known):
+            return False
+        self._skip(doc, "exists")
+        return True
+
+    def _skip_md5(self, doc: _Document, entry: Optional[Dict[str, Any]]) -> bool:
+        """Skip a file whose md5Checksum matched entry (index entry or source_record).
+
+        The match is recorded under this file's ID, so a renamed or
+        re-uploaded copy is skipped by the index alone on later runs.
+        """
+        if entry is None or self._resume(doc, entry):
+            return False
+        doc.content_hash, doc.page_id = entry["content_hash"] or "", entry["page_id"]
+        self._record(doc, entry["status"])
+        self._skip(doc, "dup md5")
+        return True
+
+    def _skip_hash(self, doc: _Document, indexed: bool, known: Optional[Dict[str, Any]]) -> bool:
+        """Skip a download whose content hash is in the index or matched Sources page known."""
+        if indexed:
+            self._skip(doc, "dup")
+            return True
+        if known is None or self._resume(doc, known):
+            return False
+        doc.page_id = known["page_id"]
+        self._record(doc, known["status"])
+        self._skip(doc, "dup")
+        return True
+
+    def _use_cached_result(self, doc: _Document) -> bool:
+        """Load a cached enrichment result for the document's content, if any."""
+        if self.results is None:
+            return False
+        doc.result = self.results.get(doc.content_hash)
+        if doc.result is None:
+            return False
+        self._say(f"  cached enrichment: {doc.name}")
+        return True
+
+    def _extracted(self, doc: _Document, extracted: ExtractedText) -> None:
+        """Keep the extracted text; a document without any fails."""
+        doc.text, doc.truncated = extracted.text, extracted.truncated
+        metrics.add("chars_extracted", len(doc.text or ""))
+        if not doc.text:
+            self._say(f"  fail (no text): {doc.name}")
+            doc.outcome = "failed"
+
+    def _extraction_failed(self, doc: _Document, e: ExtractionError) -> None:
+        log.warning("Extraction of %s (%s) stopped: %s", doc.name, doc.file["id"], e)
+        self._say(f"  fail (extract {e.reason}): {doc.name}")
+        doc.outcome = "failed"
+
+    def _cache_result(self, doc: _Document) -> None:
+        """Cache a fresh enrichment result (before any Notion write)."""
+        if self.results is not None and doc.result is not None:
+            self.results.put(doc.content_hash, doc.result)
+
+    def _enrich_failed(self, doc: _Document) -> None:
+        """Record a document whose page has been marked Failed after enrichment."""
+        self._record(doc, ContentStatus.FAILED.value)
+        self._say(f"  fail (enrich): {doc.name}")
+        doc.outcome = "failed"
+
+    def _written(self, doc: _Document) -> None:
+        """Record a document whose page is written and marked Enriched."""
+        self._record(doc, ContentStatus.ENRICHED.value)
+        self._say(f"  done: {doc.name}")
+        doc.outcome = "processed"
+
+    def _step_failed(self, doc: _Document, e: Exception) -> None:
+        """Turn an unexpected error in a step into a failed outcome."""
+        log.exception("Error processing %s", doc.name)
+        self._say(f"  error: {doc.name} — {e}")
+        doc.outcome = "failed"
+
+    def _step_done(self, doc: _Document) -> None:
+        """After a step: put a failed file without a page on the retry list, release its PDF."""
+        if doc.outcome == "failed" and doc.page_id is None:
+            # No page or index record to find it by: list it again next run
+            self.sync.retry_later(doc.file)
+        if doc.outcome is not None and doc.pdf is not None:
+            doc.pdf.close()
+            doc.pdf = None
+
+
+class Pipeline(_DocumentRules):
     """Ingest PDFs from Google Drive, enrich with AI, store in Notion."""
 
     def __init__(self, config: PipelineConfig):
         self.config = config
+        # Fresh retry budgets and circuits for drive, notion and openai
+        configure_services(config)
         self.drive = DriveClient(config.drive)
-        self.notion = NotionClient(config.notion)
+        # One tool cache per run, shared by every document and worker thread
+        self.tool_cache = build_tool_cache(config.notion)
+        self.notion = NotionClient(config.notion, tool_cache=self.tool_cache)
+        self.sync = DriveSync(
+            self.drive, config.state_dir, config.drive.incremental, config.drive.reconcile
+        )
+        # One pooled OpenAI client shared by all workers, so connections are
+        # kept alive from one document to the next
+        self.openai = build_client(config.openai)
+        self.extractor = build_extractor(config.extraction)
+        self.index = (
+            DedupIndex(os.path.join(config.state_dir, "index.sqlite3"))
+            if config.state_dir
+            else None
+        )
+        self.results = build_result_cache(config)
+        # Local copy of the workspace for tool calls; attached to the client
+        # once a refresh succeeds (until then tool calls query Notion)
+        self.workspace = build_workspace_index(config)
+        # Preloaded Sources database; None means dedup queries Notion per file.
+        # run() arms the preload; the first file not in the index triggers it.
+        self.catalog: Optional[SourceCatalog] = None
+        self._catalog_pending = False
+        self._catalog_lock = threading.Lock()
+        # Per-service caps on in-flight calls, independent of the worker count.
+        # Each adapts (AIMD) to the service's latency and transient errors.
+        self._slots = {
+            service: AdaptiveLimit(service, cfg.max_concurrency, cfg.concurrency_ceiling)
+            for service, cfg in (
+                ("drive", config.drive), ("openai", config.openai), ("notion", config.notion)
+            )
+        }
+        # Tool lookups made during enrichment count against the Notion limit too
+        self.notion.tool_slot = self._slots["notion"]
+        # Per-document cProfile/tracemalloc; None (the default) costs nothing
+        self.profiler = build_profiler(config)
+        self._print_lock = threading.Lock()
 
     @staticmethod
     def _is_duplicate(name: str) -> bool:
@@ -35,153 +314,547 @@ class Pipeline:
         size = int(f.get("size", 0))
         return f"{size / 1_048_576:.1f} MB"
 
+    def _call(self, service: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call fn under the service's retry policy, each attempt holding one of its slots.
+
+        Backoff waits hold no slot, and transient errors reach the limit.
+        """
+        return retrier(service).call(self._slots[service].call, fn, *args, **kwargs)
+
+    def _discover(self) -> Iterator[Dict[str, Any]]:
+        """Stream the filtered, ordered Drive PDFs to process."""
+        return discover_pdfs(self.sync.files(), self.config.drive.sort_window)
+
+    @staticmethod
+    def _header(f: Dict[str, Any], idx: int, total: Optional[int]) -> str:
+        """Progress line announcing a document."""
+        position = f"{idx}/{total}" if total else str(idx)
+        return f"[{position}] {f['name']} ({Pipeline._file_size_mb(f)})"
+
+    @staticmethod
+    def _summarize(
+        stats: Dict[str, Any],
+        start_time: float,
+        tool_cache: Optional[ToolCache] = None,
+        limits: Optional[Dict[str, AdaptiveLimit]] = None,
+        config: Optional[PipelineConfig] = None,
+    ) -> None:
+        """Print the end-of-run summary and, given the config, write the run report."""
+        seconds = time.monotonic() - start_time
+        print(
+            f"\nDone: {stats['processed']} processed, "
+            f"{stats['skipped']} skipped, {stats['failed']} failed "
+            f"out of {stats['total']} total ({seconds / 60:.1f} min)"
+        )
+        if tool_cache is not None:
+            tool_cache.report()
+        if limits:
+            report_limits(limits)
+        for service, counts in retry_stats().items():
+            if counts.get("retries") or counts.get("circuit_opened") or counts.get("budget_exhausted"):
+                print(
+                    f"Retries ({service}): {counts.get('retries', 0)} retried, "
+                    f"{counts.get('budget_exhausted', 0)} over budget, "
+                    f"circuit opened {counts.get('circuit_opened', 0)}x"
+                )
+        if config is not None:
+            Pipeline._write_report(config, stats, seconds, tool_cache, limits)
+
+    @staticmethod
+    def _write_report(config: PipelineConfig, stats: Dict[str, Any], seconds: float,
+                      tool_cache: Optional[ToolCache] = None,
+                      limits: Optional[Dict[str, AdaptiveLimit]] = None) -> None:
+        """Write the JSON run report (and Prometheus textfile, if configured)."""
+        extra: Dict[str, Any] = {
+            "retries": retry_stats(),
+            "concurrency": {service: limit.snapshot() for service, limit in (limits or {}).items()},
+        }
+        if tool_cache is not None:
+            extra["tool_cache"] = tool_cache.stats()
+        if "stages" in stats:
+            extra["queues"] = stats["stages"]
+        report = metrics.build_report(stats, seconds, extra)
+        report_dir = config.report_dir or (
+            os.path.join(config.state_dir, "reports") if config.state_dir else ""
+        )
+        try:
+            if report_dir:
+                stamp = metrics.current().started_at.strftime("%Y%m%dT%H%M%SZ")
+                path = os.path.join(report_dir, f"run-{stamp}.json")
+                metrics.write_json(path, report)
+                print(f"Run report: {path}")
+            if config.prometheus_textfile:
+                metrics.write_prometheus(config.prometheus_textfile, report)
+        except OSError as e:
+            log.warning("Could not write the run report: %s", e)
+
+    def rebuild_index(self) -> int:
+        """Repopulate the local dedup index from the Notion Sources database."""
+        if self.index is None:
+            raise RuntimeError("No state directory configured (PIPELINE_STATE_DIR)")
+        entries = (
+            record
+            for record in map(source_record, self.notion.iter_source_pages())
+            if record["drive_id"]
+        )
+        count = self.index.rebuild(entries)
+        print(f"Rebuilt dedup index with {count} entries at {self.index.path}")
+        return count
+
+    def refresh_workspace(self, rebuild: bool = False) -> bool:
+        """Update the workspace index and serve tool calls from it. False if unavailable."""
+        if self.workspace is None or not refresh_workspace(self.workspace, self.notion, rebuild):
+            return False
+        self.notion.workspace = self.workspace
+        return True
+
+    def _preload_sources(self) -> None:
+        """Read Sources into the catalog on first use during this run."""
+        self.catalog = None
+        self._catalog_pending = True
+
+    def _sources(self) -> Optional[SourceCatalog]:
+        """Return the catalog, reading the whole Sources database once if armed.
+
+        If the database cannot be queried, dedup falls back to one Notion
+        lookup per file.
+        """
+        if self._catalog_pending:
+            with self._catalog_lock:
+                if self._catalog_pending:
+                    try:
+                        with self._slots["notion"]:
+                            self.catalog = SourceCatalog.from_pages(self.notion.iter_source_pages())
+                        self._say(f"Loaded {len(self.catalog)} existing sources from Notion")
+                    except Exception as e:
+                        log.warning("Could not preload Sources, querying Notion per file: %s", e)
+                    self._catalog_pending = False
+        return self.catalog
+
     def run(self) -> Dict[str, int]:
         """Process all new PDFs. Returns stats dict."""
         start_time = time.monotonic()
+        metrics.start_run()
         stats = {"total": 0, "processed": 0, "skipped": 0, "failed": 0}
 
-        files: List[Dict[str, Any]] = self.drive.list_pdfs()
+        self.refresh_workspace()
+        self._preload_sources()
+        # Documents start as soon as they are discovered, so the total is
+        # only known once the listing is done.
+        files = self._discover()
 
-        # Filter out Drive upload duplicates like "doc (1).pdf"
-        before = len(files)
-        files = [f for f in files if not self._is_duplicate(f["name"])]
-        dupes_removed = before - len(files)
-        if dupes_removed:
-            print(f"Filtered {dupes_removed} duplicate upload(s)")
+        # tracemalloc is process-wide and cProfile per thread, so profiled
+        # documents run one at a time on this thread
+        workers = 1 if self.profiler is not None else max(1, self.config.workers)
+        if workers == 1:
+            for idx, f in enumerate(files, 1):
+                stats[self.process_one(f, idx, None)] += 1
+        else:
+            print(f"Processing with {workers} workers")
+            # Outcomes are tallied here on the calling thread as futures finish,
+            # so stats never needs to be shared with the workers.
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="doc") as pool:
+                futures = [
+                    pool.submit(self.process_one, f, idx, None)
+                    for idx, f in enumerate(files, 1)
+                ]
+                for future in as_completed(futures):
+                    stats[future.result()] += 1
 
-        # Sort by file size (smallest first)
-        files.sort(key=lambda f: int(f.get("size", 0)))
+        stats["total"] = stats["processed"] + stats["skipped"] + stats["failed"]
+        self.sync.commit()
+        self._summarize(stats, start_time, self.tool_cache, self._slots, self.config)
+        if self.profiler is not None:
+            self.profiler.report()
+        return stats
 
-        stats["total"] = len(files)
-        print(f"Found {len(files)} PDFs in Drive folder")
+    def run_staged(self) -> Dict[str, Any]:
+        """Process all new PDFs on a staged engine with bounded queues.
 
-        for idx, f in enumerate(files, 1):
-            file_id = f["id"]
-            name = f["name"]
-            size_str = self._file_size_mb(f)
-            print(f"[{idx}/{len(files)}] {name} ({size_str})")
+        Download, extract, enrich and Notion write each run on their own
+        worker pool, so CPU-bound extraction overlaps network-bound
+        enrichment and a slow stage holds back the ones before it. Returns
+        the stats dict plus a "stages" entry with per-stage metrics.
+        """
+        start_time = time.monotonic()
+        metrics.start_run()
+        stats: Dict[str, Any] = {"total": 0, "processed": 0, "skipped": 0, "failed": 0}
+        stats_lock = threading.Lock()
 
-            try:
-                # Title-based dedup (before downloading)
-                if self.notion.title_exists(name):
-                    stats["skipped"] += 1
-                    print(f"  skip (exists): {name}")
-                    continue
-
-                # Download and hash for dedup
-                pdf_bytes = retry_on_transient(self.drive.download_pdf, file_id)
-                content_hash = DriveClient.content_hash(pdf_bytes)
-
-                if self.notion.hash_exists(content_hash):
-                    stats["skipped"] += 1
-                    print(f"  skip (dup): {name}")
-                    continue
-
-                # Extract text
-                text = DriveClient.extract_text(pdf_bytes)
-                if not text:
-                    stats["failed"] += 1
-                    print(f"  fail (no text): {name}")
-                    continue
-
-                # Create Notion page as Processing
-                created = None
-                if f.get("createdTime"):
-                    try:
-                        created = datetime.fromisoformat(
-                            f["createdTime"].replace("Z", "+00:00")
-                        )
-                    except ValueError:
-                        pass
-
-                source = SourceContent(
-                    title=name,
-                    hash=content_hash,
-                    status=ContentStatus.PROCESSING,
-                    drive_url=f.get("webViewLink"),
-                    created_date=created,
-                )
-                page_id = retry_on_transient(self.notion.create_page, source)
-
-                # Enrich (pass notion client for agentic tool-use)
-                result = enrich(text, self.config.openai, notion=self.notion)
-                if not result:
-                    retry_on_transient(
-                        self.notion.set_status, page_id, ContentStatus.FAILED
-                    )
-                    stats["failed"] += 1
-                    print(f"  fail (enrich): {name}")
-                    continue
-
-                # Update page title with AI-generated title
-                if result.title:
-                    retry_on_transient(
-                        self.notion.update_page_properties,
-                        page_id,
-                        {"Title": {"title": [{"text": {"content": result.title}}]}},
-                    )
-
-                # Override Created Date with AI-inferred date if available
-                if result.created_date:
-                    try:
-                        ai_date = datetime.fromisoformat(result.created_date)
-                        retry_on_transient(
-                            self.notion.update_page_properties,
-                            page_id,
-                            {"Created Date": {"date": {"start": ai_date.date().isoformat()}}},
-                        )
-                    except ValueError:
-                        log.warning("Invalid created_date from enrichment: %s", result.created_date)
-
-                # Update properties with enrichment data
-                props: dict = {}
-                if result.content_type:
-                    props["Content-Type"] = {"select": {"name": result.content_type}}
-                if result.ai_primitives:
-                    props["AI-Primitive"] = {
-                        "multi_select": [{"name": t} for t in result.ai_primitives]
-                    }
-                if result.vendor:
-                    props["Vendor"] = {"select": {"name": result.vendor}}
-                if result.topical_tags:
-                    props["Topical-Tags"] = {
-                        "multi_select": [{"name": t} for t in result.topical_tags]
-                    }
-                if result.domain_tags:
-                    props["Domain-Tags"] = {
-                        "multi_select": [{"name": t} for t in result.domain_tags]
-                    }
-                if result.client_relevance:
-                    props["Client-Relevance"] = {
-                        "rich_text": [
-                            {"text": {"content": "; ".join(result.client_relevance)[:2000]}}
-                        ]
-                    }
-                if props:
-                    retry_on_transient(
-                        self.notion.update_page_properties, page_id, props
-                    )
-
-                # Add formatted blocks
-                blocks = format_blocks(result)
-                retry_on_transient(self.notion.add_blocks, page_id, blocks)
-
-                # Mark enriched
-                retry_on_transient(
-                    self.notion.set_status, page_id, ContentStatus.ENRICHED
-                )
-                stats["processed"] += 1
-                print(f"  done: {name}")
+        self.refresh_workspace()
+        self._preload_sources()
+        files = self._discover()
 
-            except Exception as e:
-                stats["failed"] += 1
-                log.exception("Error processing %s", name)
-                print(f"  error: {name} — {e}")
+        def stage_fn(
+            step: Callable[[_Document], None]
+        ) -> Callable[[_Document], Optional[_Document]]:
+            def fn(doc: _Document) -> Optional[_Document]:
+                self._run_step(step, doc)
+                if doc.outcome is None:
+                    return doc
+                with stats_lock:
+                    stats[doc.outcome] += 1
+                return None
+            return fn
 
-        elapsed = (time.monotonic() - start_time) / 60
-        print(
-            f"\nDone: {stats['processed']} processed, "
-            f"{stats['skipped']} skipped, {stats['failed']} failed "
-            f"out of {stats['total']} total ({elapsed:.1f} min)"
+        sizes = self.config.stages
+        runner = StagedRunner(
+            [
+                Stage("download", stage_fn(self._fetch_step), sizes.download_workers, sizes.queue_size),
+                Stage("extract", stage_fn(self._extract_step), sizes.extract_workers, sizes.queue_size),
+                Stage("enrich", stage_fn(self._enrich_step), sizes.enrich_workers, sizes.queue_size),
+                Stage("write", stage_fn(self._write_step), sizes.write_workers, sizes.queue_size),
+            ],
+            report_interval=sizes.report_interval,
         )
+        runner.run(_Document(f, idx, None) for idx, f in enumerate(files, 1))
+
+        stats["total"] = stats["processed"] + stats["skipped"] + stats["failed"]
+        self.sync.commit()
+        stats["stages"] = runner.snapshot()
+        for name, snap in stats["stages"].items():
+            print(
+                f"  {name:<9} workers={snap['workers']} processed={snap['processed']} "
+                f"max_queue={snap['max_queue_depth']} "
+                f"throughput={snap['throughput_per_min']:.1f}/min "
+                f"util={snap['utilization']:.0%}"
+            )
+        self._summarize(stats, start_time, self.tool_cache, self._slots, self.config)
+        return stats
+
+    def run_batch(self) -> Dict[str, int]:
+        """Enrich all new PDFs through the OpenAI Batch API.
+
+        Each file is downloaded and extracted and gets a Processing page,
+        and its tool-less enrichment request goes into one batch. Batches
+        cost half as much but can take hours, so this is meant for
+        backfills. Once the batch finishes, the results go through the
+        usual Notion write step. A batch that is still pending when the run
+        stops is resumed by the next run_batch() instead of being
+        resubmitted.
+        """
+        if not self.config.state_dir:
+            raise RuntimeError("Batch mode needs a state directory (PIPELINE_STATE_DIR)")
+        start_time = time.monotonic()
+        metrics.start_run()
+        stats = {"total": 0, "processed": 0, "skipped": 0, "failed": 0}
+        job = BatchJob(self.openai, self.config.state_dir, self.config.batch_poll_interval)
+
+        if job.load():
+            print(f"Resuming batch {job.batch_id} ({len(job.documents)} documents)")
+        else:
+            self._preload_sources()
+            complete = self._prepare_batch(job, stats)
+            if job.documents:
+                print(f"Submitted batch {job.submit()} with {len(job.documents)} documents")
+            # Every listed file now has a page, a batch request or a place on
+            # the retry list; files left out by a full batch keep the sync
+            # token where it was
+            if complete:
+                self.sync.commit()
+
+        if job.documents:
+            batch = job.wait()
+            print(f"Batch {job.batch_id} {batch.status}")
+            # Expired and cancelled batches still return what they finished
+            results = job.results(batch)
+            pending = list(job.documents.items())
+            for idx, (custom_id, entry) in enumerate(pending, 1):
+                doc = _Document(entry["file"], idx, len(pending))
+                doc.page_id, doc.content_hash = entry["page_id"], entry["content_hash"]
+                doc.result = results.get(custom_id)
+                self._say(self._header(doc.file, doc.idx, doc.total))
+                if doc.result is None:
+                    self._run_step(self._batch_failed_step, doc)
+                else:
+                    self._cache_result(doc)
+                    self._run_step(self._write_step, doc)
+                stats[doc.outcome or "failed"] += 1
+                # A run stopped mid-way resumes after the documents already written
+                job.done(custom_id)
+            job.clear()
+
+        stats["total"] = stats["processed"] + stats["skipped"] + stats["failed"]
+        self._summarize(stats, start_time, limits=self._slots, config=self.config)
         return stats
+
+    def _batch_failed_step(self, doc: _Document) -> None:
+        """Mark the page of a document whose batch request failed as Failed."""
+        doc.outcome = "failed"
+        self._say(f"  fail (batch): {doc.name}")
+        self._call("notion", self.notion.set_status, doc.page_id, ContentStatus.FAILED)
+        self._record(doc, ContentStatus.FAILED.value)
+
+    def _prepare_batch(self, job: BatchJob, stats: Dict[str, int]) -> bool:
+        """Download and extract new files, adding a request for each to the batch.
+
+        Documents with a cached result are written right away. Returns False
+        if the batch filled up before the listing ended.
+        """
+        for idx, f in enumerate(self._discover(), 1):
+            doc = _Document(f, idx, None)
+            for step in (self._fetch_step, self._extract_step):
+                self._run_step(step, doc)
+                if doc.outcome is not None:
+                    break
+            if doc.outcome is None and doc.result is not None:
+                for step in (self._enrich_step, self._write_step):
+                    self._run_step(step, doc)
+                    if doc.outcome is not None:
+                        break
+            if doc.outcome is not None:
+                stats[doc.outcome] += 1
+                continue
+
+            line = batch_line(f["id"], doc.text or "", self.config.openai, doc.truncated)
+            doc.text = None
+            if not job.fits(line):
+                self._say(f"Batch is full; {doc.name} and later files are left for the next run")
+                return False
+            try:
+                if doc.page_id is None:
+                    source = source_content(doc.file, doc.content_hash)
+                    doc.page_id = self._call("notion", self.notion.create_page, source)
+                    self._record(doc, ContentStatus.PROCESSING.value)
+            except Exception as e:
+                log.exception("Error processing %s", doc.name)
+                self._say(f"  error: {doc.name} — {e}")
+                stats["failed"] += 1
+                self.sync.retry_later(f)  # No page to find it by: list it again next run
+                continue
+            job.add(f["id"], line, {
+                "file": f, "page_id": doc.page_id, "content_hash": doc.content_hash,
+            })
+            self._say(f"  queued for batch: {doc.name}")
+        return True
+
+    def process_one(
+        self, f: Dict[str, Any], idx: int = 1, total: Optional[int] = 1
+    ) -> str:
+        """Process a single Drive file end to end.
+
+        Safe to call from multiple threads, except with a profiler (which
+        needs documents one at a time). Returns the outcome as a stats key:
+        "processed", "skipped", or "failed".
+        """
+        doc = _Document(f, idx, total)
+        with self.profiler.document(f) if self.profiler is not None else nullcontext():
+            for step in (self._fetch_step, self._extract_step, self._enrich_step, self._write_step):
+                self._run_step(step, doc)
+                if doc.outcome is not None:
+                    break
+        return doc.outcome or "failed"
+
+    def _run_step(self, step: Callable[[_Document], None], doc: _Document) -> None:
+        """Run one step, turning an unexpected error into a failed outcome."""
+        try:
+            step(doc)
+        except Exception as e:
+            self._step_failed(doc, e)
+        self._step_done(doc)
+
+    def _fetch_step(self, doc: _Document) -> None:
+        """Dedup on the Drive listing, download and hash, then dedup by content hash.
+
+        With retry_failed, a page left Processing or Failed is resumed rather
+        than skipped; if its enrichment result is cached, nothing is
+        downloaded and the next step is the Notion write.
+        """
+        self._say(self._header(doc.file, doc.idx, doc.total))
+
+        # Local index: already-processed files cost no network calls
+        if self._skip_indexed(doc):
+            return
+
+        # Drive file ID or title already in Sources (before downloading)
+        if doc.page_id is None and self._skip_existing(doc, self._existing(doc)):
+            return
+
+        # Drive's own checksum: a known md5 means known content, no download needed
+        if doc.page_id is None and self._skip_md5(doc, self._md5_entry(doc)):
+            return
+
+        if doc.content_hash and self._use_cached_result(doc):
+            return
+
+        # Download, hashing as the chunks stream in
+        with metrics.timed("download"):
+            doc.pdf = self._call("drive", self.drive.download, doc.file["id"])
+        metrics.add("bytes_downloaded", doc.pdf.size)
+        doc.content_hash = doc.pdf.sha256
+
+        if doc.page_id is None:
+            with metrics.timed("hash_check"):
+                indexed = self.index is not None and self.index.hash_known(doc.content_hash)
+                known = None if indexed else self._find_source("content_hash", doc.content_hash)
+            if self._skip_hash(doc, indexed, known):
+                return
+
+        if self._use_cached_result(doc):
+            doc.pdf.close()
+            doc.pdf = None
+
+    def _existing(self, doc: _Document) -> Optional[Dict[str, Any]]:
+        """Return the Sources record for this Drive file ID or title, if any.
+
+        The catalog answers both from memory. Without it, only the title is
+        checked, with a workspace search, and the record has no page details.
+        """
+        with metrics.timed("title_check"):
+            catalog = self._sources()
+            if catalog is not None:
+                return catalog.find("drive_id", doc.file["id"]) or catalog.find("name", doc.name)
+            with self._slots["notion"]:
+                exists = self.notion.title_exists(doc.name)
+        return {"page_id": None, "content_hash": None, "status": None} if exists else None
+
+    def _find_source(self, key: str, value: str) -> Optional[Dict[str, Any]]:
+        """Find a Sources page by "content_hash" or "md5" as a source_record dict."""
+        catalog = self._sources()
+        if catalog is not None:
+            return catalog.find(key, value)
+        find = self.notion.find_by_hash if key == "content_hash" else self.notion.find_by_md5
+        with self._slots["notion"]:
+            page = find(value)
+        return source_record(page) if page else None
+
+    def _md5_entry(self, doc: _Document) -> Optional[Dict[str, Any]]:
+        """Look the listing's md5Checksum up in the index, then in Notion."""
+        md5 = doc.file.get("md5Checksum")
+        if not md5:
+            return None
+        with metrics.timed("md5_check"):
+            entry = self.index.md5_known(md5) if self.index is not None else None
+            if entry is None:
+                entry = self._find_source("md5", md5)
+        return entry
+
+    def _extract_step(self, doc: _Document) -> None:
+        """Extract text from the downloaded PDF and release the download.
+
+        Extraction stops at the enrichment input budget, so pages past it
+        are never parsed.
+        """
+        if doc.result is not None:
+            return  # Enrichment came from the cache; the text is not needed
+        pdf = doc.pdf
+        if pdf is None:
+            raise ValueError(f"{doc.name} was not downloaded")
+        try:
+            with metrics.timed("extract"):
+                extracted = self.extractor.extract(pdf, input_budget(self.config.openai))
+        except ExtractionError as e:
+            self._extraction_failed(doc, e)
+            return
+        finally:
+            pdf.close()
+            doc.pdf = None
+        self._extracted(doc, extracted)
+
+    def _enrich_step(self, doc: _Document) -> None:
+        """Run AI enrichment, unless the result came from the cache.
+
+        A new document has no page yet: _write_step creates it complete. If
+        enrichment fails, a Failed page records the attempt. Fresh results
+        are cached before any Notion write.
+        """
+        if doc.result is not None:
+            return
+        if doc.text is None:
+            raise ValueError(f"{doc.name} has no extracted text to enrich")
+
+        # Enrich (pass notion client for agentic tool-use). Each model call
+        # holds an OpenAI slot; tool calls are paced by the Notion rate limit.
+        with metrics.timed("enrich"):
+            doc.result = enrich(
+                doc.text,
+                self.config.openai,
+                notion=self.notion,
+                truncated=doc.truncated,
+                client=self.openai,
+                slot=self._slots["openai"],
+            )
+        doc.text = None
+        if not doc.result:
+            if doc.page_id is None:
+                source = source_content(doc.file, doc.content_hash, ContentStatus.FAILED)
+                doc.page_id = self._call("notion", self.notion.create_page, source)
+            else:
+                self._call("notion", self.notion.set_status, doc.page_id, ContentStatus.FAILED)
+            self._enrich_failed(doc)
+            return
+        self._cache_result(doc)
+
+    def _write_step(self, doc: _Document) -> None:
+        """Write the enriched page to Notion and mark it Enriched.
+
+        A new document's page is created in one request; a resumed page is
+        updated in place, its body rewritten from scratch in case an
+        interrupted write left some of the blocks on it.
+        """
+        result = doc.result
+        if result is None:
+            raise ValueError(f"{doc.name} has no enrichment result to write")
+        blocks = format_blocks(result)
+        with metrics.timed("notion_write"):
+            if doc.page_id is None:
+                self._create_enriched(doc, result, blocks)
+            else:
+                self._update_enriched(doc, result, blocks)
+        self._written(doc)
+
+    def _create_enriched(
+        self, doc: _Document, result: EnrichmentResult, blocks: List[Dict[str, Any]]
+    ) -> None:
+        """Create the page with every property, its status and the first blocks at once.
+
+        Only blocks past the first BLOCKS_PER_REQUEST need more requests;
+        the page is created Processing until they are in. If Notion rejects
+        the combined request as invalid (e.g. one bad property value), the
+        page is written in separate steps instead. Any other error is
+        raised: the page may already exist, and a second create would
+        duplicate it.
+        """
+        first, overflow = blocks[:BLOCKS_PER_REQUEST], blocks[BLOCKS_PER_REQUEST:]
+        status = ContentStatus.PROCESSING if overflow else ContentStatus.ENRICHED
+        source = source_content(doc.file, doc.content_hash, status)
+        properties = format_properties(result)
+        try:
+            doc.page_id = self._call("notion", self.notion.create_page, source, properties, first)
+        except Exception as e:
+            if not is_validation_error(e):
+                raise
+            log.warning("Creating the page for %s in one request failed, writing it in steps: %s",
+                        doc.name, e)
+            source = source_content(doc.file, doc.content_hash)
+            doc.page_id = self._call("notion", self.notion.create_page, source)
+            self._record(doc, ContentStatus.PROCESSING.value)
+            self._update_enriched(doc, result, blocks, resumed=False)  # New, empty page
+            return
+        if overflow:
+            self._record(doc, ContentStatus.PROCESSING.value)
+            self.notion.add_blocks(doc.page_id, overflow)  # Retries each request itself
+            self._call("notion", self.notion.set_status, doc.page_id, ContentStatus.ENRICHED)
+
+    def _update_enriched(
+        self,
+        doc: _Document,
+        result: EnrichmentResult,
+        blocks: List[Dict[str, Any]],
+        resumed: bool = True,
+    ) -> None:
+        """Write enrichment properties and blocks to an existing page, then mark it Enriched.
+
+        A resumed page may hold blocks from an earlier, interrupted write
+        (e.g. a failed overflow append); they are deleted first so the body
+        is not duplicated.
+        """
+        page_id = doc.page_id
+        if page_id is None:
+            raise ValueError(f"{doc.name} has no page to update")
+        if resumed and self.notion.clear_blocks(page_id):
+            log.info("Cleared the partly written body of %s", doc.name)
+        for props in format_property_updates(result):
+            self._call("notion", self.notion.update_page_properties, page_id, props)
+        self.notion.add_blocks(page_id, blocks)
+        self._call("notion", self.notion.set_status, page_id, ContentStatus.ENRICHED)
@@ -0,0 +1,147 @@
+"""Per-document CPU and memory profiling for --profile runs."""
+import cProfile
+import json
+import logging
+import os
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .config import PipelineConfig
+
+log = logging.getLogger(__name__)
+
+# Allocations made by tracemalloc itself (snapshots) are not the document's
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+@dataclass
+class DocumentProfile:
+    file_id: str
+    name: str
+    seconds: float
+    peak_bytes: int  # Peak traced memory above what was allocated when it started
+    prof_path: str
+    alloc_path: str
+
+
+class DocumentProfiler:
+    """cProfile and tracemalloc around each document's processing.
+
+    For every document it writes <file_id>.prof (load with pstats or
+    snakeviz) and <file_id>.alloc.txt (the top source lines by memory
+    allocated while it ran) to directory. tracemalloc sees the whole
+    process, so documents must be profiled one at a time; cProfile sees only
+    the thread that enabled it, so work the document hands to other threads
+    (tool calls, digest sections) is missing unless it runs inline.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        top: int = 25,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.directory = directory
+        self.top = top
+        self._clock = clock
+        self.profiles: List[DocumentProfile] = []
+
+    def _path(self, file_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", file_id) + suffix)
+
+    @contextmanager
+    def document(self, f: Dict[str, Any]) -> Iterator[None]:
+        """Profile the block as the processing of Drive file f."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        start = self._clock()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = self._clock() - start
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            self._save(f, seconds, max(0, peak - baseline), profile, before, after)
+
+    def _save(
+        self,
+        f: Dict[str, Any],
+        seconds: float,
+        peak_bytes: int,
+        profile: cProfile.Profile,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+    ) -> None:
+        entry = DocumentProfile(
+            f["id"], f.get("name", ""), seconds, peak_bytes,
+            self._path(f["id"], ".prof"), self._path(f["id"], ".alloc.txt"),
+        )
+        top = after.filter_traces(_IGNORED).compare_to(before.filter_traces(_IGNORED), "lineno")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(entry.prof_path)
+            with open(entry.alloc_path, "w") as out:
+                out.write(
+                    f"{entry.name} ({entry.file_id}): {seconds:.2f}s, "
+                    f"peak {peak_bytes / 1_048_576:.1f} MB above start\n"
+                    f"Top {self.top} allocation sites (memory still held, change):\n"
+                )
+                for stat in top[: self.top]:
+                    out.write(f"{stat}\n")
+        except OSError as e:
+            log.warning("Could not write the profile of %s: %s", entry.name, e)
+        self.profiles.append(entry)
+
+    def report(self, count: int = 3) -> Optional[str]:
+        """Stop tracing, print the slowest and most memory-hungry documents and write summary.json."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if not self.profiles:
+            return None
+        slowest = sorted(self.profiles, key=lambda p: p.seconds, reverse=True)
+        hungriest = sorted(self.profiles, key=lambda p: p.peak_bytes, reverse=True)
+        print(f"Profiles: {self.directory}")
+        for p in slowest[:count]:
+            print(f"  slowest: {p.file_id} {p.name} ({p.seconds:.2f}s)")
+        for p in hungriest[:count]:
+            print(f"  memory:  {p.file_id} {p.name} (peak {p.peak_bytes / 1_048_576:.1f} MB)")
+        path = os.path.join(self.directory, "summary.json")
+        try:
+            with open(path, "w") as out:
+                json.dump(
+                    {
+                        "slowest": [p.file_id for p in slowest[:count]],
+                        "most_memory": [p.file_id for p in hungriest[:count]],
+                        "documents": [asdict(p) for p in slowest],
+                    },
+                    out,
+                    indent=2,
+                )
+        except OSError as e:
+            log.warning("Could not write the profile summary: %s", e)
+            return None
+        return path
+
+
+def build_profiler(config: PipelineConfig) -> Optional[DocumentProfiler]:
+    """A profiler writing to a fresh run-<UTC time> directory, or None unless profiling is on."""
+    if not config.profile:
+        return None
+    root = config.profile_dir or os.path.join(config.state_dir or ".", "profiles")
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return DocumentProfiler(os.path.join(root, f"run-{stamp}"), config.profile_top)
@@ -0,0 +1,88 @@
+"""Process-wide token-bucket rate limiting, shared by threads and asyncio tasks."""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class TokenBucket:
+    """Allow rate requests per second on average, with bursts of up to burst.
+
+    Every caller reserves a token under the lock and then sleeps outside it
+    until the token is due, so waiters are served in arrival order and a
+    sleeping thread never blocks the others. pause() (for a Retry-After)
+    empties the bucket until the given time, so callers queued during the
+    pause resume one token at a time instead of all at once.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()  # Time _tokens refers to; in the future while paused
+        self._lock = threading.Lock()
+        self.waited = 0.0  # Total seconds callers spent waiting for a token
+
+    def reserve(self) -> float:
+        """Take a token; returns how many seconds to wait before using it."""
+        with self._lock:
+            now = self._clock()
+            if now > self._updated:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            wait = (self._updated - now) + max(-self._tokens / self.rate, 0.0)
+            self.waited += wait
+            return wait
+
+    def acquire(self) -> None:
+        """Block the calling thread until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """asyncio version of acquire()."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold all callers for seconds (e.g. the server's Retry-After).
+
+        The bucket restarts with a single token when the pause ends; anyone
+        queued during the pause is then paced at rate, not released as a burst.
+        """
+        with self._lock:
+            until = self._clock() + seconds
+            if until > self._updated:
+                # Reservations already made still count against the budget.
+                due = self._tokens + (until - self._updated) * self.rate
+                self._tokens = min(1.0, due)
+                self._updated = until
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(key: str, rate: float, burst: int) -> Optional[TokenBucket]:
+    """The process-wide bucket for key (e.g. one Notion integration), or None if rate <= 0.
+
+    Clients built with the same key share one budget, whichever thread or
+    event loop they run on.
+    """
+    if rate <= 0:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None or (bucket.rate, bucket.burst) != (rate, max(1, burst)):
+            bucket = _buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
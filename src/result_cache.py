@@ -0,0 +1,142 @@
+"""On-disk cache of enrichment results, keyed by content, prompt version and digest settings."""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Optional
+
+from .config import PipelineConfig
+from .enrichment import PROMPT_VERSION, digest_settings
+from .models import EnrichmentResult
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    content_hash   TEXT NOT NULL,
+    model          TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    settings       TEXT NOT NULL,
+    result         TEXT NOT NULL,
+    size           INTEGER NOT NULL,
+    last_used      REAL NOT NULL,
+    PRIMARY KEY (content_hash, model, prompt_version, settings)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+
+class ResultCache:
+    """EnrichmentResults keyed by content hash, model, prompt version and settings.
+
+    settings describes how long documents are condensed (see
+    enrichment.digest_settings). A document whose Notion write failed can be
+    retried without another OpenAI tool loop. Entries for other models,
+    prompt versions or settings are never returned; they age out under the
+    size limit, or invalidate() drops them at once. Once the stored JSON
+    passes max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self, path: str, model: str, prompt_version: str, max_bytes: int, settings: str = ""
+    ):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.model = model
+        self.prompt_version = prompt_version
+        self.settings = settings
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(results)")]
+            if columns and "settings" not in columns:
+                # Written before settings were part of the key: start over
+                self._conn.execute("DROP TABLE results")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, content_hash: str) -> Optional[EnrichmentResult]:
+        """Return the cached result for this content under the current model, prompt and settings."""
+        key = (content_hash, self.model, self.prompt_version, self.settings)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT result FROM results "
+                "WHERE content_hash = ? AND model = ? AND prompt_version = ? AND settings = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE results SET last_used = ? "
+                "WHERE content_hash = ? AND model = ? AND prompt_version = ? AND settings = ?",
+                (time.time(), *key),
+            )
+        try:
+            return EnrichmentResult(**json.loads(row[0]))
+        except (TypeError, ValueError) as e:
+            log.warning("Dropping unreadable cached result for %s…: %s", content_hash[:12], e)
+            return None
+
+    def put(self, content_hash: str, result: EnrichmentResult) -> None:
+        """Store a result, then evict least recently used entries beyond max_bytes."""
+        data = json.dumps(asdict(result))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, self.model, self.prompt_version, self.settings,
+                 data, len(data), time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete the oldest entries until the total size fits (lock held)."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM results ORDER BY last_used"
+        ).fetchall()
+        doomed = []
+        for rowid, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((rowid,))
+            total -= size
+        self._conn.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+
+    def invalidate(self, model: Optional[str] = None, prompt_version: Optional[str] = None) -> int:
+        """Delete entries for a model and/or prompt version (all entries if neither).
+
+        Returns the number of entries deleted.
+        """
+        clauses, params = [], []
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if prompt_version is not None:
+            clauses.append("prompt_version = ?")
+            params.append(prompt_version)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM results{where}", params).rowcount
+
+
+def build_result_cache(config: PipelineConfig) -> Optional[ResultCache]:
+    """Open the result cache in the state directory, or None if disabled."""
+    if not config.state_dir or config.result_cache_mb <= 0:
+        return None
+    return ResultCache(
+        os.path.join(config.state_dir, "results.sqlite3"),
+        config.openai.model,
+        PROMPT_VERSION,
+        config.result_cache_mb * 1_048_576,
+        digest_settings(config.openai),
+    )
@@ -1,17 +1,26 @@
-"""Retry helper for transient API errors across Google, Notion, and OpenAI."""
+"""Retry policy engine for transient API errors across Google, Notion, and OpenAI."""
+import asyncio
+import email.utils
 import logging
+import random
+import threading
 import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .config import RetryPolicy
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 TRANSIENT_HTTP_CODES = {429, 500, 502, 503}
 
-# Max retries and initial backoff (doubles each attempt: 2s → 4s → 8s)
+# Default number of retries after the first attempt (RetryPolicy.max_retries)
 MAX_RETRIES = 3
-INITIAL_BACKOFF = 2
 
 
-def _is_transient(exc: Exception) -> bool:
+def _is_transient(exc: BaseException) -> bool:
     """Return True if the exception is a transient/retryable error."""
     # Google API errors
     try:
@@ -40,18 +49,224 @@ def _is_transient(exc: Exception) -> bool:
     return False
 
 
-def retry_on_transient(fn, *args, **kwargs):
-    """Call fn with retries on transient errors. Exponential backoff: 2s → 4s → 8s."""
-    last_exc = None
-    for attempt in range(MAX_RETRIES + 1):
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait before retrying, if it said.
+
+    Reads Retry-After (seconds or an HTTP date) or OpenAI's retry-after-ms
+    from a Notion error (.headers), an OpenAI error (.response.headers) or
+    a Google HttpError (.resp, a dict of lower-cased headers).
+    """
+    headers = getattr(exc, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is None:
+        headers = getattr(exc, "resp", None)
+    if headers is None:
+        return None
+    try:
+        millis = headers.get("retry-after-ms")
+        if millis is not None:
+            return max(0.0, float(millis) / 1000)
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is None:
+            return None
         try:
-            return fn(*args, **kwargs)
-        except Exception as exc:
-            last_exc = exc
-            if not _is_transient(exc) or attempt == MAX_RETRIES:
-                raise
-            delay = INITIAL_BACKOFF * (2 ** attempt)
-            log.warning("Transient error (attempt %d/%d), retrying in %ds: %s",
-                        attempt + 1, MAX_RETRIES, delay, exc)
-            time.sleep(delay)
-    raise last_exc  # unreachable, but satisfies type checkers
+            return max(0.0, float(value))
+        except ValueError:
+            when = email.utils.parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class CircuitOpenError(Exception):
+    """A service's circuit breaker is open; the call failed fast instead of retrying."""
+
+    def __init__(self, service: str, retry_in: float):
+        super().__init__(f"{service} is unavailable (circuit open for another {retry_in:.0f}s)")
+        self.service = service
+        self.retry_in = retry_in
+
+
+class Retrier:
+    """Retries one service's transient errors according to a RetryPolicy.
+
+    Each retry waits for the server's Retry-After if it sent one, otherwise
+    for a decorrelated-jitter backoff (uniform between base_delay and three
+    times the previous wait, capped at max_delay), so concurrent workers
+    do not retry in lockstep.
+
+    Retries draw on a budget shared by every caller: it holds up to
+    budget_burst retries and each call adds budget_ratio, so during an
+    outage at most that fraction of calls is retried.
+
+    breaker_threshold transient failures in a row open the circuit for
+    breaker_cooldown seconds. Calls in the middle of their retries then
+    fail fast with CircuitOpenError. New calls wait for the cooldown to end
+    before their first attempt, which pauses the queue rather than failing
+    it. A failure right after the cooldown re-opens the circuit; a success
+    closes it.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        policy: Optional[RetryPolicy] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Optional[Callable[[float], None]] = None,
+        async_sleep: Optional[Callable[[float], Any]] = None,
+        uniform: Callable[[float, float], float] = random.uniform,
+    ):
+        self.service = service
+        self.policy = policy or RetryPolicy()
+        self._clock = clock
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+        self._uniform = uniform
+        self._lock = threading.Lock()
+        self._budget = float(self.policy.budget_burst)
+        self._failures = 0  # Transient failures in a row
+        self._open_until = 0.0
+        self.stats: Counter = Counter()  # calls, retries, budget_exhausted, circuit_opened, failed_fast
+
+    def _admit(self) -> float:
+        """Count a new call; returns how long it must wait for the circuit to close."""
+        with self._lock:
+            self.stats["calls"] += 1
+            self._budget = min(self.policy.budget_burst, self._budget + self.policy.budget_ratio)
+            return max(0.0, self._open_until - self._clock())
+
+    def _succeeded(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def _retry_delay(self, exc: Exception, attempt: int, previous: float) -> Optional[float]:
+        """Seconds to wait before retrying after a transient error, or None to give up.
+
+        Raises CircuitOpenError (from exc) if the circuit is, or just became, open.
+        """
+        policy = self.policy
+        with self._lock:
+            now = self._clock()
+            self._failures += 1
+            if (
+                policy.breaker_threshold
+                and self._failures >= policy.breaker_threshold
+                and self._open_until <= now
+            ):
+                self._open_until = now + policy.breaker_cooldown
+                self.stats["circuit_opened"] += 1
+                log.warning("%s: %d transient errors in a row, pausing calls for %.0fs",
+                            self.service, self._failures, policy.breaker_cooldown)
+            if self._open_until > now:
+                self.stats["failed_fast"] += 1
+                raise CircuitOpenError(self.service, self._open_until - now) from exc
+            if attempt >= policy.max_retries:
+                return None
+            if self._budget < 1:
+                self.stats["budget_exhausted"] += 1
+                log.warning("%s: retry budget exhausted, not retrying: %s", self.service, exc)
+                return None
+            self._budget -= 1
+            self.stats["retries"] += 1
+        hint = retry_after(exc)
+        if hint is not None:
+            delay = min(hint, policy.max_delay)
+        else:
+            delay = min(policy.max_delay, self._uniform(policy.base_delay, previous * 3))
+        log.warning("%s: transient error (attempt %d/%d), retrying in %.1fs: %s",
+                    self.service, attempt + 1, policy.max_retries, delay, exc)
+        return delay
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call fn, retrying transient errors under this service's policy."""
+        wait = self._admit()
+        if wait > 0:
+            (self._sleep or time.sleep)(wait)
+        delay = self.policy.base_delay
+        attempt = 0
+        while True:
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                if not _is_transient(exc):
+                    raise
+                next_delay = self._retry_delay(exc, attempt, delay)
+                if next_delay is None:
+                    raise
+                delay = next_delay
+                (self._sleep or time.sleep)(delay)
+                attempt += 1
+            else:
+                self._succeeded()
+                return result
+
+    async def acall(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Await fn with the same policy as call(); waits use asyncio.sleep."""
+        wait = self._admit()
+        if wait > 0:
+            await (self._async_sleep or asyncio.sleep)(wait)
+        delay = self.policy.base_delay
+        attempt = 0
+        while True:
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as exc:
+                if not _is_transient(exc):
+                    raise
+                next_delay = self._retry_delay(exc, attempt, delay)
+                if next_delay is None:
+                    raise
+                delay = next_delay
+                await (self._async_sleep or asyncio.sleep)(delay)
+                attempt += 1
+            else:
+                self._succeeded()
+                return result
+
+
+_retriers: Dict[str, Retrier] = {}
+_retriers_lock = threading.Lock()
+
+
+def retrier(service: str) -> Retrier:
+    """The process-wide Retrier for a service ("drive", "notion", "openai", ...)."""
+    with _retriers_lock:
+        if service not in _retriers:
+            _retriers[service] = Retrier(service)
+        return _retriers[service]
+
+
+def configure(service: str, policy: RetryPolicy) -> Retrier:
+    """Install a fresh Retrier for service with policy (budget and circuit reset)."""
+    with _retriers_lock:
+        _retriers[service] = Retrier(service, policy)
+        return _retriers[service]
+
+
+def configure_services(config: Any) -> None:
+    """Install the retry policies of a PipelineConfig's drive, notion and openai sections."""
+    for service in ("drive", "notion", "openai"):
+        configure(service, getattr(config, service).retry)
+
+
+def retry_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every service's Retrier, for the run summary."""
+    with _retriers_lock:
+        return {service: dict(r.stats) for service, r in _retriers.items() if r.stats}
+
+
+def retry_on_transient(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call fn with retries on transient errors, under the default policy."""
+    return retrier("default").call(fn, *args, **kwargs)
+
+
+async def async_retry_on_transient(
+    fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any
+) -> T:
+    """Await fn with retries on transient errors, under the default policy.
+
+    Backoff uses asyncio.sleep, so waiting on a retry does not block other
+    tasks on the event loop.
+    """
+    return await retrier("default").acall(fn, *args, **kwargs)
@@ -1,12 +1,121 @@
 """CLI entry point for the knowledge pipeline."""
+import argparse
 import logging
 import sys
 
 from .config import PipelineConfig
+from .enrichment import PROMPT_VERSION
 from .pipeline import Pipeline
+from .result_cache import build_result_cache
 
 
-def main():
+def invalidate_results(config: PipelineConfig, selector: str) -> None:
+    """Delete cached enrichment results matching selector ("all", a model or a prompt version)."""
+    cache = build_result_cache(config)
+    if cache is None:
+        print("Result cache is disabled (PIPELINE_STATE_DIR / PIPELINE_RESULT_CACHE_MB)")
+        return
+    if selector == "all":
+        count = cache.invalidate()
+    else:
+        count = cache.invalidate(model=selector) + cache.invalidate(prompt_version=selector)
+    print(f"Removed {count} cached result(s) from {cache.path} (current prompt version {PROMPT_VERSION})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive PDFs -> AI enrichment -> Notion")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Documents to process concurrently (default: PIPELINE_WORKERS or 1)",
+    )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help="Run download/extract/enrich/write as separate stages with bounded queues",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Enrich through the OpenAI Batch API (half price, results within 24h); "
+        "a pending batch from an earlier run is resumed",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Also process PDFs in subfolders of the Drive folder (default: DRIVE_RECURSIVE)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only look at Drive files changed since the last run (default: DRIVE_INCREMENTAL)",
+    )
+    parser.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="With --incremental, list the full folder this run and reset the change token",
+    )
+    parser.add_argument(
+        "--extract-backend",
+        choices=["inline", "process"],
+        default=None,
+        help="Extract PDF text inline or in worker processes (default: EXTRACT_BACKEND or inline)",
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Repopulate the local dedup index from the Notion Sources database and exit",
+    )
+    parser.add_argument(
+        "--workspace-index",
+        action="store_true",
+        help="Answer enrichment searches from a local index of the Notion workspace, "
+        "refreshed at the start of each run (default: NOTION_WORKSPACE_INDEX)",
+    )
+    parser.add_argument(
+        "--rebuild-workspace-index",
+        action="store_true",
+        help="Re-crawl the whole Notion workspace into the local index and exit",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Resume pages left Processing or Failed instead of skipping them "
+        "(default: PIPELINE_RETRY_FAILED)",
+    )
+    parser.add_argument(
+        "--invalidate-results",
+        nargs="?",
+        const="all",
+        metavar="MODEL_OR_PROMPT_VERSION",
+        help="Drop cached enrichment results for a model or prompt version (default: all) and exit",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run on a single asyncio event loop with async OpenAI and Notion clients",
+    )
+    parser.add_argument(
+        "--async-tasks",
+        type=int,
+        default=None,
+        help="Documents in flight with --async (default: PIPELINE_ASYNC_TASKS or 32)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each document with cProfile and tracemalloc, one document at a time, "
+        "and name the slowest and most memory-hungry (output: PIPELINE_PROFILE_DIR)",
+    )
+    args = parser.parse_args()
+    if args.profile and (args.staged or args.batch or args.use_async):
+        parser.error("--profile runs documents one at a time; it cannot be combined with "
+                     "--staged, --batch or --async")
+    if args.profile and args.extract_backend == "process":
+        parser.error("--profile needs extraction in this process (--extract-backend inline)")
+
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s %(levelname)s %(name)s: %(message)s",
@@ -16,9 +125,58 @@ def main():
     except KeyError as e:
         print(f"Missing required environment variable: {e}", file=sys.stderr)
         sys.exit(1)
+    if args.workers is not None:
+        config.workers = args.workers
+    if args.async_tasks is not None:
+        config.async_tasks = args.async_tasks
+    if args.recursive:
+        config.drive.recursive = True
+    if args.incremental:
+        config.drive.incremental = True
+    if args.reconcile:
+        config.drive.reconcile = True
+    if args.extract_backend is not None:
+        config.extraction.backend = args.extract_backend
+    if args.workspace_index or args.rebuild_workspace_index:
+        config.notion.workspace_index = True
+
+    if args.retry_failed:
+        config.retry_failed = True
+    if args.profile:
+        # cProfile only sees the thread that enabled it: extract in this
+        # process and run tool calls and digest sections on the document's thread
+        config.profile = True
+        config.extraction.backend = "inline"
+        config.openai.tool_workers = 1
+        config.openai.digest_workers = 1
+
+    if args.invalidate_results is not None:
+        invalidate_results(config, args.invalidate_results)
+        return
+
+    if args.rebuild_index:
+        Pipeline(config).rebuild_index()
+        return
+
+    if args.rebuild_workspace_index:
+        if not Pipeline(config).refresh_workspace(rebuild=True):
+            sys.exit(1)
+        return
+
+    if args.batch:
+        Pipeline(config).run_batch()
+        return
+
+    if args.use_async:
+        from .async_pipeline import AsyncPipeline
+        AsyncPipeline(config).run_sync()
+        return
 
     pipeline = Pipeline(config)
-    pipeline.run()
+    if args.staged:
+        pipeline.run_staged()
+    else:
+        pipeline.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+"""Download buffer that hashes as it is written and spills large files to disk."""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Iterator, Optional, Union
+
+
+class SpooledPdf:
+    """A downloaded PDF, SHA-256 hashed chunk by chunk as it arrives.
+
+    Content stays in memory up to threshold bytes and moves to a named temp
+    file beyond that, so many large PDFs in flight do not add up in RSS.
+    Readers get a memory map of the file rather than a copy of its bytes.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buf = io.BytesIO()
+        self._file: Optional[BinaryIO] = None
+        self._hasher = hashlib.sha256()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, threshold: int = 8 * 1_048_576) -> "SpooledPdf":
+        spool = cls(threshold)
+        spool.write(data)
+        return spool
+
+    def write(self, data: bytes) -> int:
+        """File-like write used by MediaIoBaseDownload."""
+        self._hasher.update(data)
+        self.size += len(data)
+        if self._file is None and self.size > self.threshold:
+            self._spill()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._buf.write(data)
+        return len(data)
+
+    def _spill(self) -> None:
+        fd, self.path = tempfile.mkstemp(prefix="kp-", suffix=".pdf")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._buf.getbuffer())
+        self._buf = io.BytesIO()
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 of everything written so far."""
+        return self._hasher.hexdigest()
+
+    def flush(self) -> None:
+        """Make everything written so far visible to readers of path."""
+        if self._file is not None:
+            self._file.flush()
+
+    @contextmanager
+    def open(self) -> Iterator[Union[BinaryIO, mmap.mmap]]:
+        """Yield a seekable binary reader over the content."""
+        if self.path is None:
+            self._buf.seek(0)
+            yield self._buf
+            return
+        self.flush()
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            yield m
+
+    def getvalue(self) -> bytes:
+        """Copy the content into a bytes object."""
+        with self.open() as fp:
+            return fp.read()
+
+    def close(self) -> None:
+        """Release the buffer and delete any temp file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._buf = io.BytesIO()
+
+    def __enter__(self) -> "SpooledPdf":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,158 @@
+"""Staged producer/consumer engine: worker pools connected by bounded queues."""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+log = logging.getLogger(__name__)
+
+_STOP = object()  # Sentinel telling a stage worker to exit
+
+
+@dataclass
+class Stage:
+    """One step of a staged pipeline.
+
+    fn receives an item and returns the item to hand to the next stage,
+    or None when the item is finished (skipped, failed, or fully done).
+    queue_size bounds the stage's input queue, so a slow stage blocks the
+    stage in front of it instead of letting work pile up in memory.
+    """
+    name: str
+    fn: Callable[[Any], Optional[Any]]
+    workers: int = 1
+    queue_size: int = 4
+
+
+class StageMetrics:
+    """Thread-safe counters for a single stage."""
+
+    def __init__(self, stage: Stage, workers: int, inbox: "queue.Queue[Any]"):
+        self.stage = stage
+        self.workers = workers
+        self.inbox = inbox
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record_depth(self) -> None:
+        depth = self.inbox.qsize()
+        with self._lock:
+            self.max_depth = max(self.max_depth, depth)
+
+    def record_item(self, seconds: float) -> None:
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+
+    def snapshot(self, elapsed: float) -> Dict[str, float]:
+        with self._lock:
+            capacity = elapsed * self.workers
+            return {
+                "workers": self.workers,
+                "queue_depth": self.inbox.qsize(),
+                "max_queue_depth": self.max_depth,
+                "processed": self.processed,
+                "throughput_per_min": self.processed / elapsed * 60 if elapsed else 0.0,
+                "utilization": self.busy_seconds / capacity if capacity else 0.0,
+            }
+
+
+class StagedRunner:
+    """Run items through a chain of stages, each on its own worker pool."""
+
+    def __init__(self, stages: List[Stage], report_interval: float = 0.0):
+        if not stages:
+            raise ValueError("StagedRunner needs at least one stage")
+        self.stages = stages
+        self.report_interval = report_interval
+        self._queues: List["queue.Queue[Any]"] = [
+            queue.Queue(maxsize=max(1, s.queue_size)) for s in stages
+        ]
+        self._workers = [max(1, s.workers) for s in stages]
+        self.metrics = [
+            StageMetrics(s, n, q) for s, n, q in zip(stages, self._workers, self._queues)
+        ]
+        self._remaining = list(self._workers)
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self._finished: Optional[float] = None
+
+    def _put(self, index: int, item: Any) -> None:
+        self._queues[index].put(item)  # Blocks while the stage is saturated
+        self.metrics[index].record_depth()
+
+    def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        last = index == len(self.stages) - 1
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                break
+            t0 = time.monotonic()
+            try:
+                out = stage.fn(item)
+            except Exception:
+                # Stage functions handle their own errors; this only keeps the
+                # worker alive if one slips through.
+                log.exception("Unhandled error in stage %s", stage.name)
+                out = None
+            self.metrics[index].record_item(time.monotonic() - t0)
+            if out is not None and not last:
+                self._put(index + 1, out)
+
+        # The last worker of a stage to exit shuts down the next stage
+        with self._lock:
+            self._remaining[index] -= 1
+            drained = self._remaining[index] == 0
+        if drained and not last:
+            for _ in range(self._workers[index + 1]):
+                self._queues[index + 1].put(_STOP)
+
+    def _monitor(self, stop: threading.Event) -> None:
+        while not stop.wait(self.report_interval):
+            for name, snap in self.snapshot().items():
+                log.info(
+                    "stage %s: depth=%d processed=%d util=%.0f%%",
+                    name, snap["queue_depth"], snap["processed"], snap["utilization"] * 100,
+                )
+
+    def run(self, items: Iterable[Any]) -> None:
+        """Feed items into the first stage and block until every stage drains."""
+        self._started = time.monotonic()
+        threads: List[threading.Thread] = []
+        for index, stage in enumerate(self.stages):
+            for n in range(self._workers[index]):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        stop_monitor = threading.Event()
+        if self.report_interval > 0:
+            threading.Thread(target=self._monitor, args=(stop_monitor,), daemon=True).start()
+
+        try:
+            for item in items:
+                self._put(0, item)
+        finally:
+            for _ in range(self._workers[0]):
+                self._queues[0].put(_STOP)
+            for t in threads:
+                t.join()
+            stop_monitor.set()
+            self._finished = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage queue depth, throughput and utilization so far."""
+        end = self._finished or time.monotonic()
+        elapsed = end - self._started if self._started else 0.0
+        return {m.stage.name: m.snapshot(elapsed) for m in self.metrics}
@@ -0,0 +1,136 @@
+"""Run-scoped LRU/TTL cache for Notion lookups made by enrichment tool calls."""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .config import NotionConfig
+
+
+class ToolCache:
+    """Memoize search_workspace / fetch_page_content results across documents.
+
+    Entries expire after ttl seconds and the least recently used are dropped
+    beyond max_entries. While one caller is fetching a key, other callers
+    (threads or asyncio tasks) wait for that result instead of sending the
+    same request. Failures are passed to the waiters but not cached.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[str, Any]:
+        """Classify key as ("hit", value), ("wait", future) or ("miss", future) (lock held)."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return "hit", entry[1]
+            del self._entries[key]
+        if key in self._pending:
+            self.coalesced += 1
+            return "wait", self._pending[key]
+        self.misses += 1
+        future: Future = Future()
+        self._pending[key] = future
+        return "miss", future
+
+    def _finish(
+        self,
+        key: Hashable,
+        future: Future,
+        value: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        with self._lock:
+            del self._pending[key]
+            if error is None:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def call(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Return the cached value for key, or compute it once with fn(*args)."""
+        with self._lock:
+            state, value = self._lookup(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return value.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, result)
+        return result
+
+    async def acall(
+        self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        """asyncio version of call(): fn is a coroutine function."""
+        with self._lock:
+            state, value = self._lookup(key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return await asyncio.wrap_future(value)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counters; hit_rate counts coalesced waits as hits."""
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+    def report(self) -> None:
+        """Print the hit-rate line shown at the end of a run (if anything was looked up)."""
+        s = self.stats()
+        if s["hits"] + s["coalesced"] + s["misses"]:
+            print(
+                f"Notion tool cache: {s['hits']} hits, {s['coalesced']} coalesced, "
+                f"{s['misses']} misses ({s['hit_rate']:.0%} hit rate)"
+            )
+
+
+def search_key(query: str, max_results: int) -> Tuple[str, str, int]:
+    """Cache key for a workspace search; case and spacing do not change Notion's results."""
+    return ("search", " ".join(query.lower().split()), max_results)
+
+
+def fetch_key(page_id: str, max_chars: int) -> Tuple[str, str, int]:
+    """Cache key for a page fetch; page IDs are compared without dashes."""
+    return ("fetch", page_id.replace("-", ""), max_chars)
+
+
+def build_tool_cache(config: NotionConfig) -> Optional[ToolCache]:
+    """Return the run's tool cache, or None if NOTION_TOOL_CACHE_SIZE is 0."""
+    if config.tool_cache_size <= 0:
+        return None
+    return ToolCache(config.tool_cache_size, config.tool_cache_ttl)
@@ -0,0 +1,186 @@
+"""Local BM25 full-text index of the Notion workspace, for enrichment tool calls."""
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .config import PipelineConfig
+from .notion_client import page_title
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_id     TEXT PRIMARY KEY,
+    title       TEXT,
+    url         TEXT,
+    last_edited TEXT,
+    content     TEXT,
+    length      INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term    TEXT,
+    page_id TEXT,
+    tf      INTEGER,
+    PRIMARY KEY (term, page_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_page ON postings (page_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Stored text per page; fetch_notion_page returns at most 4000 characters
+MAX_PAGE_CHARS = 20_000
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if len(t) > 1]
+
+
+class WorkspaceIndex:
+    """Inverted index of workspace pages, ranked with BM25.
+
+    refresh() crawls pages shared with the integration, newest edits first,
+    and stops at the first page edited before the previous crawl, so later
+    refreshes only re-read what changed. search() and fetch() answer the
+    search_notion and fetch_notion_page tools without a Notion request.
+    Title terms count twice. Pages deleted or unshared in Notion stay
+    indexed until rebuild=True.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0])
+
+    def _watermark(self) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_edited'").fetchone()
+        return row[0] if row else None
+
+    def refresh(self, notion: Any, rebuild: bool = False) -> int:
+        """Index pages edited since the last refresh. Returns the number indexed.
+
+        notion is a NotionClient. Notion's last_edited_time has minute
+        precision, so pages edited in the watermark's minute are read again.
+        """
+        with self._lock, self._conn:
+            if rebuild:
+                self._conn.execute("DELETE FROM pages")
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM meta")
+            since = self._watermark()
+        newest = since
+        count = 0
+        for page in notion.iter_workspace_pages():
+            edited = page.get("last_edited_time", "")
+            if since and edited < since:
+                break
+            newest = max(newest or edited, edited)
+            self.add_page(page, notion.page_text(page["id"], MAX_PAGE_CHARS))
+            count += 1
+        if newest:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('last_edited', ?)", (newest,)
+                )
+        return count
+
+    def add_page(self, page: Dict[str, Any], content: str) -> None:
+        """Index (or re-index) one page with its plain-text content."""
+        title = page_title(page)
+        terms = Counter(_tokens(title) * 2 + _tokens(content))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM postings WHERE page_id = ?", (page["id"],))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (page["id"], title, page.get("url", ""), page.get("last_edited_time", ""),
+                 content, sum(terms.values())),
+            )
+            self._conn.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?)",
+                [(term, page["id"], tf) for term, tf in terms.items()],
+            )
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        """Return the best BM25 matches as page_id/title/url dicts."""
+        terms = set(_tokens(query))
+        if not terms:
+            return []
+        with self._lock:
+            n, avgdl = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM pages"
+            ).fetchone()
+            if not n:
+                return []
+            marks = ", ".join("?" for _ in terms)
+            rows = self._conn.execute(
+                f"SELECT p.term, p.page_id, p.tf, pg.length FROM postings p "
+                f"JOIN pages pg ON pg.page_id = p.page_id WHERE p.term IN ({marks})",
+                tuple(terms),
+            ).fetchall()
+            df = Counter(term for term, _, _, _ in rows)
+            scores: Dict[str, float] = {}
+            for term, page_id, tf, length in rows:
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                norm = tf + K1 * (1 - B + B * length / (avgdl or 1))
+                scores[page_id] = scores.get(page_id, 0.0) + idf * tf * (K1 + 1) / norm
+            best = sorted(scores, key=lambda p: (-scores[p], p))[:max_results]
+            meta = {
+                page_id: (title, url)
+                for page_id, title, url in self._conn.execute(
+                    f"SELECT page_id, title, url FROM pages "
+                    f"WHERE page_id IN ({', '.join('?' for _ in best)})",
+                    tuple(best),
+                )
+            } if best else {}
+        return [
+            {"page_id": p, "title": meta[p][0], "url": meta[p][1]} for p in best
+        ]
+
+    def fetch(self, page_id: str, max_chars: int = 4000) -> Optional[str]:
+        """Stored text of a page, or None if it is not indexed."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM pages WHERE page_id = ? OR REPLACE(page_id, '-', '') = ?",
+                (page_id, page_id.replace("-", "")),
+            ).fetchone()
+        return row[0][:max_chars] if row else None
+
+
+def build_workspace_index(config: PipelineConfig) -> Optional[WorkspaceIndex]:
+    """Open the workspace index in the state directory, or None if disabled."""
+    if not config.state_dir or not config.notion.workspace_index:
+        if config.notion.workspace_index:
+            log.warning("The workspace index needs PIPELINE_STATE_DIR; tool calls query Notion")
+        return None
+    return WorkspaceIndex(os.path.join(config.state_dir, "workspace.sqlite3"))
+
+
+def refresh_workspace(index: WorkspaceIndex, notion: Any, rebuild: bool = False) -> bool:
+    """Bring the index up to date; False (with a warning) if Notion could not be crawled."""
+    try:
+        count = index.refresh(notion, rebuild=rebuild)
+    except Exception as e:
+        log.warning("Could not refresh the workspace index, tool calls query Notion: %s", e)
+        return False
+    print(f"Workspace index: {count} page(s) updated, {len(index)} indexed")
+    return True
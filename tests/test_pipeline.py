@@ -1,7 +1,11 @@
 """Tests for the simplified knowledge pipeline."""
+import hashlib
+import io
 import json
+import logging
 import os
-from unittest.mock import MagicMock, patch
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -11,6 +15,8 @@ from src.formatter import format_blocks
 from src.enrichment import enrich
 from src.retry import retry_on_transient
 from src.pipeline import Pipeline
+from src.extraction import ExtractedText
+from src.spool import SpooledPdf
 
 
 # ---------------------------------------------------------------------------
@@ -34,6 +40,42 @@ def test_config_from_env(monkeypatch):
 # Models
 # ---------------------------------------------------------------------------
 
+def test_source_content_includes_drive_metadata():
+    from datetime import datetime, timezone
+    sc = SourceContent(
+        title="t.pdf", hash="h", drive_md5="abc",
+        drive_modified=datetime(2025, 3, 1, tzinfo=timezone.utc),
+    )
+    props = sc.to_notion_properties()
+    assert props["Drive MD5"]["rich_text"][0]["text"]["content"] == "abc"
+    assert props["Drive Modified"]["date"]["start"].startswith("2025-03-01")
+
+
+def test_new_pages_leave_out_properties_the_database_lacks():
+    from src.notion_client import NotionClient
+    from datetime import datetime, timezone
+
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db", requests_per_second=0))
+    api = client_cls.return_value
+    api.databases.retrieve.return_value = {"properties": {"Title": {}, "Hash": {}, "Drive MD5": {}}}
+    api.pages.create.return_value = {"id": "p1"}
+    sc = SourceContent(title="t.pdf", hash="h", drive_md5="abc",
+                       drive_modified=datetime(2025, 3, 1, tzinfo=timezone.utc))
+
+    notion.create_page(sc)
+    notion.create_page(sc)
+
+    props = api.pages.create.call_args.kwargs["properties"]
+    assert "Drive MD5" in props and "Drive Modified" not in props
+    api.databases.retrieve.assert_called_once_with(database_id="db")  # Schema read once
+
+    api.databases.retrieve.return_value = {"properties": {"Title": {}, "Hash": {}}}
+    notion._missing = None
+    assert notion.find_by_md5("abc") is None
+    api.request.assert_not_called()  # No query on a property that is not there
+
+
 def test_source_content_to_notion_properties():
     sc = SourceContent(title="test.pdf", hash="abc123", drive_url="https://drive.google.com/file/d/1/view")
     props = sc.to_notion_properties()
@@ -430,7 +472,8 @@ def test_retry_recovers_from_transient(mock_sleep):
         return "recovered"
     assert retry_on_transient(fn) == "recovered"
     assert call_count == 2
-    mock_sleep.assert_called_once_with(2)  # first backoff
+    mock_sleep.assert_called_once()
+    assert 1 <= mock_sleep.call_args[0][0] <= 3  # Jittered first backoff
 
 
 def test_retry_non_transient_propagates():
@@ -468,3 +511,2331 @@ def test_normal_filename_not_filtered():
     assert Pipeline._is_duplicate("report.pdf") is False
     assert Pipeline._is_duplicate("my (cool) report.pdf") is False
     assert Pipeline._is_duplicate("section (1) overview.pdf") is False
+
+
+# ---------------------------------------------------------------------------
+# Pipeline orchestration (mocked Drive / Notion / OpenAI)
+# ---------------------------------------------------------------------------
+
+def _pipeline_config(workers=1):
+    return PipelineConfig(
+        notion=NotionConfig(token="tok", sources_db_id="db123"),
+        drive=DriveConfig(folder_id="folder1"),
+        openai=OpenAIConfig(api_key="sk-test"),
+        workers=workers,
+    )
+
+
+def _make_pipeline(workers=1):
+    """Build a Pipeline whose Drive, Notion and OpenAI clients are MagicMocks."""
+    with patch("src.pipeline.DriveClient"), patch("src.pipeline.NotionClient"), \
+            patch("src.pipeline.build_client"):
+        pipeline = Pipeline(_pipeline_config(workers))
+    pipeline.notion.title_exists.return_value = False
+    pipeline.notion.find_by_hash.return_value = None
+    pipeline.notion.find_by_md5.return_value = None
+    pipeline.notion.iter_source_pages.return_value = []
+    pipeline.notion.create_page.return_value = "page-1"
+    pipeline.drive.download.side_effect = lambda file_id: SpooledPdf.from_bytes(file_id.encode())
+    pipeline.extractor = MagicMock()
+    pipeline.extractor.extract.return_value = ExtractedText("Some PDF text")
+    return pipeline
+
+
+def _drive_file(n):
+    return {"id": f"f{n}", "name": f"doc{n}.pdf", "size": str(n)}
+
+
+def _source_page(page_id, drive_id, content_hash, title="Doc"):
+    """A Sources database page as returned by databases/{id}/query."""
+    return {
+        "id": page_id,
+        "properties": {
+            "Title": {"type": "title", "title": [{"plain_text": title}]},
+            "Hash": {"type": "rich_text", "rich_text": [{"plain_text": content_hash}]},
+            "Status": {"type": "select", "select": {"name": "Enriched"}},
+            "Drive URL": {"type": "url", "url": f"https://drive.google.com/file/d/{drive_id}/view"},
+        },
+    }
+
+
+_ENRICHED = EnrichmentResult(
+    summary="Summary.", insights=["Insight"], content_type="Other", title="Doc"
+)
+
+
+def test_process_one_enriches_new_file():
+    pipeline = _make_pipeline()
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.process_one(_drive_file(1)) == "processed"
+    # One request: properties, final status and body together
+    source, properties, blocks = pipeline.notion.create_page.call_args.args
+    assert source.status == ContentStatus.ENRICHED
+    assert properties["Title"] == {"title": [{"text": {"content": "Doc"}}]}
+    assert blocks == format_blocks(_ENRICHED)
+    pipeline.notion.add_blocks.assert_not_called()
+    pipeline.notion.set_status.assert_not_called()
+    pipeline.notion.update_page_properties.assert_not_called()
+
+
+def test_process_one_skips_known_hash():
+    pipeline = _make_pipeline()
+    pipeline.notion.find_by_hash.return_value = {"id": "old-page", "properties": {}}
+    with patch("src.pipeline.enrich") as mock_enrich:
+        assert pipeline.process_one(_drive_file(1)) == "skipped"
+    mock_enrich.assert_not_called()
+    pipeline.notion.create_page.assert_not_called()
+
+
+def test_process_one_marks_failed_enrichment():
+    pipeline = _make_pipeline()
+    with patch("src.pipeline.enrich", return_value=None):
+        assert pipeline.process_one(_drive_file(1)) == "failed"
+    assert pipeline.notion.create_page.call_args.args[0].status == ContentStatus.FAILED
+    pipeline.notion.set_status.assert_not_called()
+
+
+def test_run_with_workers_aggregates_stats_and_caps_services():
+    import threading
+    import time as _time
+
+    from src.concurrency import AdaptiveLimit
+
+    pipeline = _make_pipeline(workers=8)
+    pipeline._slots["openai"] = AdaptiveLimit("openai", 2, maximum=2)
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(n) for n in range(1, 13)]
+    pipeline.notion.iter_source_pages.return_value = [
+        _source_page("old", "other", hashlib.sha256(b"f3").hexdigest())
+    ]
+
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+
+    def fake_enrich(text, config, notion=None, slot=None, **kwargs):
+        with slot:  # enrich() holds the slot around each model call
+            with lock:
+                in_flight["now"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            _time.sleep(0.01)
+            with lock:
+                in_flight["now"] -= 1
+        return _ENRICHED
+
+    with patch("src.pipeline.enrich", side_effect=fake_enrich):
+        stats = pipeline.run()
+
+    assert stats == {"total": 12, "processed": 11, "skipped": 1, "failed": 0}
+    assert in_flight["peak"] <= 2
+
+
+# ---------------------------------------------------------------------------
+# Staged engine
+# ---------------------------------------------------------------------------
+
+def test_staged_runner_applies_backpressure():
+    import threading
+    import time as _time
+    from src.stages import Stage, StagedRunner
+
+    produced = []
+    release = threading.Event()
+
+    def slow(item):
+        release.wait(timeout=2)
+        return item
+
+    def items():
+        for n in range(20):
+            produced.append(n)
+            yield n
+
+    runner = StagedRunner([
+        Stage("fast", lambda x: x, workers=1, queue_size=2),
+        Stage("slow", slow, workers=1, queue_size=2),
+    ])
+    t = threading.Thread(target=runner.run, args=(items(),))
+    t.start()
+    _time.sleep(0.2)
+    # fast stage's queue + worker + slow stage's queue + worker bound the backlog
+    assert len(produced) <= 8
+    release.set()
+    t.join(timeout=5)
+    snap = runner.snapshot()
+    assert snap["fast"]["processed"] == 20
+    assert snap["slow"]["processed"] == 20
+    assert snap["slow"]["max_queue_depth"] <= 2
+
+
+def test_run_staged_matches_sequential_outcomes():
+    pipeline = _make_pipeline()
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(n) for n in range(1, 7)]
+    pipeline.notion.iter_source_pages.return_value = [
+        _source_page("old", "other", "h-old", title="doc2.pdf")
+    ]
+    pipeline.extractor.extract.side_effect = (
+        lambda pdf, max_chars=None: ExtractedText(None if pdf.getvalue() == b"f4" else "text")
+    )
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        stats = pipeline.run_staged()
+
+    assert {k: stats[k] for k in ("total", "processed", "skipped", "failed")} == {
+        "total": 6, "processed": 4, "skipped": 1, "failed": 1,
+    }
+    assert stats["stages"]["download"]["processed"] == 6
+    assert stats["stages"]["write"]["processed"] == 4
+
+
+# ---------------------------------------------------------------------------
+# Async pipeline (fake clients)
+# ---------------------------------------------------------------------------
+
+class _RecordingNotion:
+    """Fake NotionClient that records every write."""
+
+    def __init__(self, calls, latency=0.0, pages=()):
+        self.calls = calls
+        self.latency = latency
+        self.pages = list(pages)
+
+    def iter_source_pages(self):
+        return iter(self.pages)
+
+    def title_exists(self, title):
+        return False
+
+    def find_by_hash(self, content_hash):
+        return None
+
+    def find_by_md5(self, md5):
+        return None
+
+    def create_page(self, content, properties=None, children=None):
+        props = {**content.to_notion_properties(), **(properties or {})}
+        self.calls.append(("create_page", props, children))
+        return f"page-{content.hash}"
+
+    def update_page_properties(self, page_id, properties):
+        self.calls.append(("update_page_properties", page_id, properties))
+
+    def set_status(self, page_id, status):
+        self.calls.append(("set_status", page_id, status))
+
+    def add_blocks(self, page_id, blocks):
+        self.calls.append(("add_blocks", page_id, blocks))
+
+    def clear_blocks(self, page_id):
+        self.calls.append(("clear_blocks", page_id))
+        return 0
+
+    def search_workspace(self, query, max_results=5):
+        return [{"page_id": "c1", "title": "Client", "url": "https://notion.so/c1"}]
+
+    def fetch_page_content(self, page_id, max_chars=4000):
+        return "Client notes"
+
+
+class _AsyncRecordingNotion(_RecordingNotion):
+    """Async fake with the same behavior as _RecordingNotion."""
+
+    def __getattribute__(self, name):
+        attr = object.__getattribute__(self, name)
+        if name in ("calls", "latency", "pages") or not callable(attr):
+            return attr
+        if name == "iter_source_pages":
+            async def pages():
+                for page in attr():
+                    yield page
+            return pages
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+
+
+_ENRICH_JSON = {
+    "summary": "Summary.",
+    "insights": ["Insight"],
+    "content_type": "Industry Report",
+    "ai_primitives": ["LLM"],
+    "vendor": "Acme",
+    "topical_tags": ["AI"],
+    "domain_tags": ["AI/ML"],
+    "client_relevance": ["Client — Workshop: relevant."],
+    "created_date": "2025-01-15",
+    "title": "A Clean Title",
+}
+
+
+def _model_turn(input_items):
+    """Search Notion on the first turn, then return the final JSON."""
+    if any(item.get("type") == "function_call_output" for item in input_items):
+        return _mock_text_response(_ENRICH_JSON)
+    fc = _mock_function_call("call_1", "search_notion", {"query": "AI adoption"})
+    return _mock_tool_response([fc])
+
+
+def _fake_async_openai(latency):
+    import asyncio
+
+    async def create(**kwargs):
+        await asyncio.sleep(latency)
+        return _model_turn(kwargs["input"])
+
+    client = MagicMock()
+    client.responses.create = create
+    return client
+
+
+def _fake_sync_openai(latency):
+    import time as _time
+
+    def create(**kwargs):
+        _time.sleep(latency)
+        return _model_turn(kwargs["input"])
+
+    client = MagicMock()
+    client.responses.create.side_effect = create
+    return client
+
+
+def _async_pipeline(calls, workers=None, latency=0, pages=()):
+    from src.async_pipeline import AsyncPipeline
+
+    fakes = _make_pipeline()
+    config = _pipeline_config()
+    if workers is not None:
+        config.async_tasks = workers
+    apipe = AsyncPipeline(
+        config,
+        drive=fakes.drive,
+        notion=_AsyncRecordingNotion(calls, pages=pages),
+        openai_client=_fake_async_openai(latency),
+    )
+    apipe.extractor = fakes.extractor
+    return apipe
+
+
+def test_async_pipeline_writes_same_notion_output_as_sync():
+    files = [_drive_file(1)]
+
+    sync_calls = []
+    pipeline = _make_pipeline()
+    pipeline.notion = _RecordingNotion(sync_calls)
+    pipeline.drive.iter_pdfs.return_value = files
+    pipeline.openai = _fake_sync_openai(0)
+    sync_stats = pipeline.run()
+
+    async_calls = []
+    apipe = _async_pipeline(async_calls, workers=1, latency=0)
+    apipe.drive.iter_pdfs.return_value = files
+    async_stats = apipe.run_sync()
+
+    assert sync_stats == async_stats == {"total": 1, "processed": 1, "skipped": 0, "failed": 0}
+    assert async_calls == sync_calls
+    assert [call[0] for call in sync_calls] == ["create_page"]  # One request per document
+
+
+def test_async_pipeline_throughput_beats_sequential():
+    import time as _time
+
+    files = [_drive_file(n) for n in range(1, 11)]
+    latency = 0.05  # per OpenAI call; two calls per document
+
+    pipeline = _make_pipeline(workers=1)
+    pipeline.notion = _RecordingNotion([])
+    pipeline.drive.iter_pdfs.return_value = files
+    pipeline.openai = _fake_sync_openai(latency)
+    t0 = _time.monotonic()
+    sync_stats = pipeline.run()
+    sync_elapsed = _time.monotonic() - t0
+
+    apipe = _async_pipeline([], workers=10, latency=latency)
+    apipe.drive.iter_pdfs.return_value = files
+    t0 = _time.monotonic()
+    async_stats = apipe.run_sync()
+    async_elapsed = _time.monotonic() - t0
+
+    assert sync_stats["processed"] == async_stats["processed"] == 10
+    assert async_elapsed * 3 < sync_elapsed
+
+
+def test_async_pipeline_overlaps_documents_by_default():
+    import time as _time
+
+    latency = 0.05
+    apipe = _async_pipeline([], latency=latency)  # Default async_tasks, workers stays 1
+    apipe.drive.iter_pdfs.return_value = [_drive_file(n) for n in range(1, 11)]
+    t0 = _time.monotonic()
+    stats = apipe.run_sync()
+
+    assert stats["processed"] == 10
+    assert _time.monotonic() - t0 < 10 * 2 * latency / 3
+
+
+def test_async_pipeline_lists_early_failures_again(tmp_path):
+    from src.drive_sync import DriveSync
+
+    apipe = _async_pipeline([])
+    apipe.drive.folder_id, apipe.drive.recursive = "folder1", False
+    apipe.drive.start_page_token.return_value = "1"
+    apipe.drive.iter_pdfs.return_value = [_drive_file(1), _drive_file(2)]
+    apipe.sync = DriveSync(apipe.drive, str(tmp_path), incremental=True)
+
+    def download(file_id):
+        if file_id == "f1":
+            raise ValueError("download failed")
+        return SpooledPdf.from_bytes(file_id.encode())
+
+    apipe.drive.download.side_effect = download
+
+    stats = apipe.run_sync()
+
+    assert stats == {"total": 2, "processed": 1, "skipped": 0, "failed": 1}
+    saved = json.loads((tmp_path / "drive_sync.json").read_text())
+    assert [f["id"] for f in saved["retry"]] == ["f1"]
+
+
+# ---------------------------------------------------------------------------
+# PDF text extraction
+# ---------------------------------------------------------------------------
+
+def _tiny_pdf(pages):
+    """Build a minimal valid PDF with one text line per entry in each page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        ops = b"BT /F1 12 Tf 72 720 Td 14 TL " + b" ".join(
+            b"(" + line.encode("latin-1") + b") Tj T*" for line in lines
+        ) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(ops) + ops + b"\nendstream")
+        content_num = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_num
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref,
+    )
+    return bytes(out)
+
+
+def test_process_extractor_matches_inline_text():
+    from src.config import ExtractionConfig
+    from src.extraction import ProcessExtractor, extract_pdf_text
+
+    pdf = _tiny_pdf([["Quarterly AI adoption report", "Page one body"], ["Second page"]])
+    inline = extract_pdf_text(pdf).text
+    assert "Quarterly AI adoption report" in inline
+
+    extractor = ProcessExtractor(ExtractionConfig(backend="process", workers=2, timeout=60))
+    assert extractor.extract(pdf).text == inline
+
+
+def test_process_extractor_kills_slow_documents():
+    from src.config import ExtractionConfig
+    from src.extraction import ExtractionError, ProcessExtractor
+
+    # No worker can start, import pdfminer and parse within a microsecond
+    extractor = ProcessExtractor(ExtractionConfig(backend="process", timeout=1e-6))
+    with pytest.raises(ExtractionError) as exc_info:
+        extractor.extract(_tiny_pdf([["text"]]))
+    assert exc_info.value.reason == "timeout"
+
+
+def test_extract_step_reports_extraction_error():
+    from src.extraction import ExtractionError
+
+    pipeline = _make_pipeline()
+    pipeline.extractor = MagicMock()
+    pipeline.extractor.extract.side_effect = ExtractionError("timeout", "too slow")
+    with patch("src.pipeline.enrich") as mock_enrich:
+        assert pipeline.process_one(_drive_file(1)) == "failed"
+    mock_enrich.assert_not_called()
+
+
+def test_stream_pdf_text_matches_full_extraction():
+    from pdfminer.high_level import extract_text as pdfminer_extract
+    from src.extraction import clean_text, stream_pdf_text
+
+    pdf = _tiny_pdf([["Intro\xa0line", "  padded  "], ["Page two"], [], ["Last page"]])
+    expected = clean_text(pdfminer_extract(io.BytesIO(pdf)))
+    streamed = stream_pdf_text(pdf)
+    assert streamed.text == expected
+    assert streamed.truncated is False
+
+
+def test_stream_pdf_text_stops_at_budget():
+    from src import extraction
+    from src.extraction import stream_pdf_text
+
+    pages = [[f"Page {n} line {i}" for i in range(5)] for n in range(1, 31)]
+    pdf = _tiny_pdf(pages)
+    full = stream_pdf_text(pdf).text
+
+    interpreter = extraction.PDFPageInterpreter
+    with patch.object(interpreter, "process_page", autospec=True,
+                      side_effect=interpreter.process_page) as spy:
+        partial = stream_pdf_text(pdf, max_chars=100)
+
+    assert partial.truncated is True
+    assert len(partial.text) == 100
+    assert partial.text == full[:100]
+    assert spy.call_count < len(pages)
+    assert stream_pdf_text(pdf, max_chars=len(full)).truncated is False
+
+
+def test_enrich_marks_truncated_input():
+    config = OpenAIConfig(api_key="sk-test", model="gpt-5.3-codex")
+    with patch("src.enrichment.OpenAI") as MockOpenAI:
+        client = MockOpenAI.return_value
+        client.responses.create.return_value = _mock_text_response({"summary": "s"})
+        enrich("short text", config, truncated=True)
+    sent = client.responses.create.call_args.kwargs["input"][0]["content"]
+    assert sent.endswith("[...truncated]")
+
+
+def test_spooled_pdf_hashes_incrementally_and_spills():
+    import os as _os
+
+    data = _tiny_pdf([["Spilled document"]])
+    spool = SpooledPdf(threshold=64)
+    for i in range(0, len(data), 50):
+        spool.write(data[i:i + 50])
+
+    assert spool.sha256 == hashlib.sha256(data).hexdigest()
+    assert spool.size == len(data)
+    assert spool.path and _os.path.exists(spool.path)
+    with spool.open() as fp:
+        assert fp.read() == data
+
+    from src.extraction import InlineExtractor
+    assert InlineExtractor().extract(spool).text == "Spilled document"
+
+    path = spool.path
+    spool.close()
+    assert not _os.path.exists(path)
+
+
+def test_process_extractor_reads_spilled_file():
+    from src.config import ExtractionConfig
+    from src.extraction import ProcessExtractor
+
+    with SpooledPdf.from_bytes(_tiny_pdf([["From disk"]]), threshold=1) as spool:
+        assert spool.path
+        extractor = ProcessExtractor(ExtractionConfig(backend="process", timeout=60))
+        assert extractor.extract(spool).text == "From disk"
+
+
+# ---------------------------------------------------------------------------
+# Local dedup index
+# ---------------------------------------------------------------------------
+
+def test_dedup_index_matches_on_drive_metadata(tmp_path):
+    from src.index import DedupIndex
+
+    index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    f = {"id": "f1", "name": "a.pdf", "size": "10", "md5Checksum": "m1",
+         "modifiedTime": "2025-01-01T00:00:00Z"}
+    assert index.lookup(f) is None
+
+    index.record(f, "h1", "page-1", "Enriched")
+    assert index.lookup(f)["page_id"] == "page-1"
+    assert index.hash_known("h1")
+    assert index.lookup({**f, "md5Checksum": "m2"}) is None
+
+    # Entries restored from Notion match by ID and pick up Drive metadata
+    index.rebuild([{"drive_id": "f2", "content_hash": "h2", "page_id": "page-2"}])
+    assert not index.hash_known("h1")
+    g = {"id": "f2", "name": "b.pdf", "size": "5", "md5Checksum": "m5"}
+    assert index.lookup(g)["page_id"] == "page-2"
+    assert index.lookup({**g, "md5Checksum": "changed"}) is None
+
+
+def test_indexed_files_skip_with_zero_network_calls(tmp_path):
+    pipeline = _make_pipeline()
+    from src.index import DedupIndex
+    pipeline.index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    files = [_drive_file(n) for n in range(1, 4)]
+    pipeline.drive.iter_pdfs.return_value = files
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.run()["processed"] == 3
+
+    pipeline.notion.reset_mock()
+    pipeline.drive.download.reset_mock()
+    with patch("src.pipeline.enrich") as mock_enrich:
+        stats = pipeline.run()
+
+    assert stats["skipped"] == 3
+    mock_enrich.assert_not_called()
+    pipeline.drive.download.assert_not_called()
+    assert pipeline.notion.method_calls == []
+
+
+def test_rebuild_index_from_notion(tmp_path):
+    from src.index import DedupIndex
+
+    pipeline = _make_pipeline()
+    pipeline.index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    pipeline.notion.iter_source_pages.return_value = iter(
+        [_source_page("p1", "f1", "h1"), _source_page("p2", "f2", "h2"), {"id": "p3", "properties": {}}]
+    )
+    assert pipeline.rebuild_index() == 2
+    assert pipeline.index.lookup(_drive_file(1))["page_id"] == "p1"
+    assert pipeline.index.hash_known("h2")
+
+
+def test_known_md5_skips_download():
+    pipeline = _make_pipeline()
+    pipeline.notion.find_by_md5.return_value = {"id": "page-9", "properties": {}}
+    f = {**_drive_file(1), "md5Checksum": "m1"}
+    assert pipeline.process_one(f) == "skipped"
+    pipeline.drive.download.assert_not_called()
+    pipeline.notion.find_by_md5.assert_called_once_with("m1")
+
+
+def test_md5_in_index_covers_reuploaded_copy(tmp_path):
+    from src.index import DedupIndex
+
+    pipeline = _make_pipeline()
+    pipeline.index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    original = {**_drive_file(1), "md5Checksum": "m1"}
+    pipeline.index.record(original, "h1", "page-1", "Enriched")
+
+    copy = {**_drive_file(2), "md5Checksum": "m1"}
+    assert pipeline.process_one(copy) == "skipped"
+    pipeline.drive.download.assert_not_called()
+    pipeline.notion.find_by_md5.assert_not_called()
+    assert pipeline.index.lookup(copy)["page_id"] == "page-1"
+
+
+# ---------------------------------------------------------------------------
+# Preloaded Sources catalog
+# ---------------------------------------------------------------------------
+
+def test_catalog_preload_replaces_per_file_queries():
+    pipeline = _make_pipeline(workers=4)
+    files = [{**_drive_file(n), "md5Checksum": f"m{n}"} for n in range(1, 251)]
+    pipeline.drive.iter_pdfs.return_value = files
+    known = [
+        _source_page(f"p{n}", f"f{n}", hashlib.sha256(f"f{n}".encode()).hexdigest(), title=f"AI title {n}")
+        for n in range(1, 201)
+    ]
+    pipeline.notion.iter_source_pages.return_value = known
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        stats = pipeline.run()
+
+    assert stats["skipped"] == 200 and stats["processed"] == 50
+    pipeline.notion.iter_source_pages.assert_called_once()
+    pipeline.notion.title_exists.assert_not_called()
+    pipeline.notion.find_by_hash.assert_not_called()
+    pipeline.notion.find_by_md5.assert_not_called()
+
+
+def test_catalog_dedups_pages_created_during_run():
+    pipeline = _make_pipeline()
+    first, copy = _drive_file(1), {**_drive_file(1), "id": "f1-copy", "name": "copy.pdf"}
+    pipeline.drive.download.side_effect = lambda file_id: SpooledPdf.from_bytes(b"same")
+    pipeline.drive.iter_pdfs.return_value = [first, copy]
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        stats = pipeline.run()
+
+    assert stats["processed"] == 1 and stats["skipped"] == 1
+    pipeline.notion.create_page.assert_called_once()
+
+
+def test_catalog_load_failure_falls_back_to_queries():
+    pipeline = _make_pipeline()
+    pipeline.notion.iter_source_pages.side_effect = RuntimeError("databases.query removed")
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1)]
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        stats = pipeline.run()
+
+    assert pipeline.catalog is None and stats["processed"] == 1
+    pipeline.notion.find_by_hash.assert_called_once()
+
+
+def test_async_pipeline_skips_files_in_preloaded_catalog():
+    calls = []
+    apipe = _async_pipeline(calls, workers=2, latency=0, pages=[_source_page("p1", "f1", "h1")])
+    apipe.drive.iter_pdfs.return_value = [_drive_file(1), _drive_file(2)]
+
+    stats = apipe.run_sync()
+
+    assert stats["skipped"] == 1 and stats["processed"] == 1
+    assert apipe.catalog.find("drive_id", "f2")["page_id"] == "page-" + hashlib.sha256(b"f2").hexdigest()
+    apipe.drive.download.assert_called_once_with("f2")
+
+
+# ---------------------------------------------------------------------------
+# Drive discovery
+# ---------------------------------------------------------------------------
+
+class _FakeDriveFiles:
+    """Stands in for service.files(): serves a folder tree in pages."""
+
+    def __init__(self, tree, page_size, parents=None):
+        self.tree = tree  # folder ID -> list of child file dicts
+        self.page_size = page_size
+        self.parents = parents or {}  # folder ID -> its parent folder IDs
+        self.requests = []
+
+    def get(self, fileId, fields):
+        return MagicMock(execute=lambda: {"id": fileId, "parents": self.parents.get(fileId, [])})
+
+    def list(self, q, fields, pageSize, pageToken=None):
+        import re as _re
+
+        folder_id = _re.match(r"'([^']+)' in parents", q).group(1)
+        children = [
+            f for f in self.tree.get(folder_id, [])
+            if f["mimeType"] == "application/pdf" or "folder" in q
+        ]
+        start = int(pageToken or 0)
+        self.requests.append((folder_id, start))
+        end = start + self.page_size
+        response = {"files": children[start:end]}
+        if end < len(children):
+            response["nextPageToken"] = str(end)
+        return MagicMock(execute=lambda: response)
+
+
+class _FakeDriveChanges:
+    """Stands in for service.changes(): a token is an offset into the change log."""
+
+    def __init__(self, log, page_size):
+        self.log = log
+        self.page_size = page_size
+
+    def getStartPageToken(self):
+        return MagicMock(execute=lambda: {"startPageToken": str(len(self.log))})
+
+    def list(self, pageToken, fields, pageSize, spaces):
+        if not pageToken.isdigit():
+            raise RuntimeError("Invalid pageToken")
+        start = int(pageToken)
+        end = min(start + self.page_size, len(self.log))
+        response = {"changes": self.log[start:end]}
+        if end < len(self.log):
+            response["nextPageToken"] = str(end)
+        else:
+            response["newStartPageToken"] = str(end)
+        return MagicMock(execute=lambda: response)
+
+
+@contextmanager
+def _fake_drive(tree, page_size=1000, recursive=False, changes=None, parents=None):
+    """Yield a real DriveClient whose API service serves tree and a change log."""
+    from src.drive_client import DriveClient
+
+    files = _FakeDriveFiles(tree, page_size, parents)
+    service = MagicMock()
+    service.files.return_value = files
+    service.changes.return_value = _FakeDriveChanges(changes if changes is not None else [], page_size)
+    with patch("src.drive_client._build_credentials"), \
+            patch("src.drive_client.build", return_value=service):
+        yield DriveClient(DriveConfig(folder_id="root", recursive=recursive)), files
+
+
+def _pdf(n, size=1):
+    return {"id": f"f{n}", "name": f"doc{n}.pdf", "size": str(size), "mimeType": "application/pdf"}
+
+
+def _folder(folder_id):
+    return {"id": folder_id, "name": folder_id, "mimeType": "application/vnd.google-apps.folder"}
+
+
+def test_iter_pdfs_follows_next_page_token():
+    with _fake_drive({"root": [_pdf(n) for n in range(2500)]}) as (drive, files):
+        assert len(list(drive.iter_pdfs())) == 2500
+    assert files.requests == [("root", 0), ("root", 1000), ("root", 2000)]
+
+
+def test_iter_pdfs_recurses_into_subfolders_once():
+    tree = {
+        "root": [_pdf(1), _folder("a"), _folder("b")],
+        "a": [_pdf(2), _pdf(3), _folder("c")],
+        "b": [_folder("c")],  # Same folder under two parents
+        "c": [_pdf(4)],
+    }
+    with _fake_drive(tree, page_size=1, recursive=True) as (drive, files):
+        found = [f["id"] for f in drive.iter_pdfs()]
+        top_only = [f["id"] for f in drive.iter_pdfs(recursive=False)]
+    assert sorted(found) == ["f1", "f2", "f3", "f4"]
+    assert top_only == ["f1"]
+    assert sum(1 for folder_id, start in files.requests if folder_id == "c" and start == 0) == 1
+
+
+def test_discover_pdfs_streams_with_bounded_sort_window():
+    from src.pipeline import discover_pdfs
+
+    listed = []
+
+    def listing():
+        for n, size in enumerate([50, 40, 30, 20, 10, 5], 1):
+            listed.append(n)
+            yield _pdf(n, size)
+        yield {**_pdf(7), "name": "doc6 (1).pdf"}
+
+    drive = MagicMock()
+    drive.iter_pdfs.return_value = listing()
+    files = discover_pdfs(drive.iter_pdfs(), window=3)
+
+    first = next(files)
+    assert len(listed) == 3  # Started before the listing finished
+    assert first["id"] == "f3"
+    assert [f["id"] for f in files] == ["f4", "f5", "f6", "f2", "f1"]
+
+
+def _change(f, parents=("root",), **extra):
+    return {"fileId": f["id"], "file": {**f, "parents": list(parents), **extra}}
+
+
+def test_incremental_sync_lists_only_changes_since_last_run(tmp_path):
+    from src.drive_sync import DriveSync
+
+    log = []
+    tree = {"root": [_pdf(1), _pdf(2), _pdf(3)]}
+    with _fake_drive(tree, page_size=2, changes=log) as (drive, files):
+        def run(**kwargs):
+            sync = DriveSync(drive, str(tmp_path), incremental=True, **kwargs)
+            found = [f["id"] for f in sync.files()]
+            sync.commit()
+            return found
+
+        assert run() == ["f1", "f2", "f3"]  # First run: full listing
+        listings = len(files.requests)
+
+        log.extend([
+            _change(_pdf(1), size="9"),
+            _change(_pdf(10)),
+            _change(_pdf(1), size="10"),  # Changed twice: reported once
+            _change(_pdf(11), parents=("elsewhere",)),
+            _change(_pdf(12), trashed=True),
+            _change({**_pdf(13), "mimeType": "text/plain"}),
+            {"fileId": "f2", "removed": True},
+        ])
+        assert sorted(run()) == ["f1", "f10"]
+        assert run() == []  # Nothing changed since
+        assert len(files.requests) == listings
+
+        assert run(reconcile=True) == ["f1", "f2", "f3"]
+        assert len(files.requests) > listings
+
+
+def test_incremental_sync_falls_back_to_full_listing(tmp_path):
+    from src.drive_sync import DriveSync
+
+    (tmp_path / "drive_sync.json").write_text(
+        json.dumps({"folder_id": "root", "recursive": True, "start_page_token": "expired"})
+    )
+    tree = {"root": [_pdf(1), _folder("sub")], "sub": [_pdf(2)]}
+    log = [_change(_pdf(3), parents=("sub",)), _change(_pdf(4), parents=("outside",))]
+    with _fake_drive(tree, recursive=True, changes=log, parents={"sub": ["root"]}) as (drive, _):
+        sync = DriveSync(drive, str(tmp_path), incremental=True)
+        assert sorted(f["id"] for f in sync.files()) == ["f1", "f2"]
+        sync.commit()
+        assert drive.list_changes("0") == ([log[0]["file"]], "2")
+
+    saved = json.loads((tmp_path / "drive_sync.json").read_text())
+    assert saved["start_page_token"] == "2"
+
+
+def test_incremental_sync_lists_early_failures_again(tmp_path):
+    from src.drive_sync import DriveSync
+
+    pipeline = _make_pipeline()
+    pipeline.drive.folder_id, pipeline.drive.recursive = "folder1", False
+    pipeline.drive.start_page_token.return_value = "1"
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1), _drive_file(2)]
+    pipeline.drive.list_changes.return_value = ([], "2")
+    pipeline.sync = DriveSync(pipeline.drive, str(tmp_path), incremental=True)
+
+    def download(file_id):
+        if file_id == "f1":
+            raise ValueError("download failed")
+        return SpooledPdf.from_bytes(file_id.encode())
+
+    pipeline.drive.download.side_effect = download
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.run()["failed"] == 1
+
+    saved = json.loads((tmp_path / "drive_sync.json").read_text())
+    assert saved["start_page_token"] == "1"
+    assert [f["id"] for f in saved["retry"]] == ["f1"]  # Failed before it had a page
+
+    pipeline.sync = DriveSync(pipeline.drive, str(tmp_path), incremental=True)
+    pipeline.drive.download.side_effect = lambda file_id: SpooledPdf.from_bytes(file_id.encode())
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        stats = pipeline.run()  # No Drive changes since: only the retry is listed
+
+    assert stats == {"total": 1, "processed": 1, "skipped": 0, "failed": 0}
+    assert json.loads((tmp_path / "drive_sync.json").read_text())["retry"] == []
+
+
+# ---------------------------------------------------------------------------
+# Enrichment result cache
+# ---------------------------------------------------------------------------
+
+def test_result_cache_keys_on_model_and_prompt_and_evicts(tmp_path):
+    from dataclasses import asdict
+    from src.result_cache import ResultCache
+
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path, "model-a", "v1", max_bytes=10_000)
+    cache.put("h1", _ENRICHED)
+    assert cache.get("h1") == _ENRICHED
+    assert ResultCache(path, "model-b", "v1", 10_000).get("h1") is None
+    assert ResultCache(path, "model-a", "v2", 10_000).get("h1") is None
+    assert ResultCache(path, "model-a", "v1", 10_000, settings="other").get("h1") is None
+
+    entry_size = len(json.dumps(asdict(_ENRICHED)))
+    small = ResultCache(path, "model-a", "v1", max_bytes=entry_size * 2)
+    small.put("h2", _ENRICHED)
+    small.get("h1")  # h1 is now more recently used than h2
+    small.put("h3", _ENRICHED)
+    assert small.get("h2") is None
+    assert small.get("h1") == small.get("h3") == _ENRICHED
+
+    assert small.invalidate(model="model-b") == 0
+    assert small.invalidate(prompt_version="v1") == 2
+    assert small.get("h1") is None
+
+
+def test_result_cache_key_covers_digest_settings(tmp_path):
+    from dataclasses import replace
+    from src.enrichment import digest_settings
+    from src.result_cache import build_result_cache
+
+    config = _pipeline_config()
+    config.state_dir = str(tmp_path)
+    base = config.openai = replace(config.openai, digest_threshold=80_000)  # Condensing on
+    build_result_cache(config).put("h1", _ENRICHED)
+    assert build_result_cache(config).get("h1") == _ENRICHED
+
+    for changed in (replace(base, summary_model="mini"), replace(base, chunk_tokens=4_000),
+                    replace(base, digest_threshold=40_000), replace(base, digest_threshold=0)):
+        assert digest_settings(changed) != digest_settings(base)
+        config.openai = changed
+        assert build_result_cache(config).get("h1") is None
+
+
+def test_result_cache_drops_entries_keyed_without_settings(tmp_path):
+    import sqlite3
+    from src.result_cache import ResultCache
+
+    path = str(tmp_path / "results.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE results (content_hash TEXT, model TEXT, prompt_version TEXT, "
+                     "result TEXT, size INTEGER, last_used REAL)")
+        conn.execute("INSERT INTO results VALUES ('h1', 'm', 'v', '{}', 2, 0)")
+    cache = ResultCache(path, "m", "v", 10_000)
+    assert cache.get("h1") is None
+    cache.put("h1", _ENRICHED)
+    assert cache.get("h1") == _ENRICHED
+
+
+def test_retry_after_failed_write_makes_no_llm_calls(tmp_path):
+    from src.index import DedupIndex
+    from src.result_cache import ResultCache
+
+    pipeline = _make_pipeline()
+    pipeline.index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    pipeline.results = ResultCache(str(tmp_path / "results.sqlite3"), "m", "v", 1_048_576)
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1)]
+
+    def create_page(source, properties=None, children=None):
+        if properties:
+            raise _transient(400)  # Rejected as one request
+        return "page-1"
+
+    pipeline.notion.create_page.side_effect = create_page
+    pipeline.notion.add_blocks.side_effect = RuntimeError("Notion 502")
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.run()["failed"] == 1  # Left Processing on page-1
+
+    pipeline.config.retry_failed = True
+    pipeline.notion.add_blocks.side_effect = None
+    pipeline.notion.create_page.reset_mock()
+    pipeline.drive.download.reset_mock()
+    with patch("src.pipeline.enrich") as mock_enrich:
+        stats = pipeline.run()
+
+    assert stats["processed"] == 1
+    mock_enrich.assert_not_called()
+    pipeline.drive.download.assert_not_called()
+    pipeline.notion.create_page.assert_not_called()  # The first run's page is reused
+    pipeline.notion.set_status.assert_called_with("page-1", ContentStatus.ENRICHED)
+    assert pipeline.index.lookup(_drive_file(1))["status"] == "Enriched"
+
+
+def test_failed_pages_are_skipped_without_retry_failed(tmp_path):
+    from src.index import DedupIndex
+
+    pipeline = _make_pipeline()
+    pipeline.index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    pipeline.index.record(_drive_file(1), "h1", "page-0", "Failed")
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1)]
+
+    assert pipeline.run()["skipped"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Notion tool cache
+# ---------------------------------------------------------------------------
+
+def test_tool_cache_coalesces_concurrent_searches():
+    import threading
+    import time as _time
+    from src.notion_client import NotionClient
+    from src.tool_cache import ToolCache
+
+    release = threading.Event()
+    cache = ToolCache()
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db"), tool_cache=cache)
+
+    def search(query, page_size):
+        release.wait(timeout=2)
+        return {"results": [{"object": "page", "id": "c1", "url": "u", "properties": {}}]}
+
+    client_cls.return_value.search.side_effect = search
+    results = []
+    threads = [
+        threading.Thread(target=lambda q=q: results.append(notion.search_workspace(q)))
+        for q in ("Private Equity", "private  equity", "private equity")
+    ]
+    for t in threads:
+        t.start()
+    deadline = _time.monotonic() + 2
+    while cache.stats()["coalesced"] < 2 and _time.monotonic() < deadline:
+        _time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(timeout=2)
+
+    assert notion.search_workspace("PRIVATE EQUITY")[0]["page_id"] == "c1"
+    assert client_cls.return_value.search.call_count == 1
+    assert len(results) == 3
+    assert cache.stats() == {"hits": 1, "coalesced": 2, "misses": 1, "hit_rate": 0.75}
+
+
+def test_tool_cache_expires_and_evicts():
+    from src.tool_cache import ToolCache
+
+    cache = ToolCache(max_entries=2, ttl=60)
+    calls = []
+    fetch = lambda key: calls.append(key) or key.upper()
+
+    with patch("src.tool_cache.time.monotonic", return_value=0.0):
+        for key in ("a", "b", "a", "c"):  # "c" evicts "b", the least recently used
+            cache.call(key, fetch, key)
+        assert cache.call("a", fetch, "a") == "A"
+        cache.call("b", fetch, "b")
+    with patch("src.tool_cache.time.monotonic", return_value=61.0):
+        cache.call("a", fetch, "a")  # Expired
+
+    assert calls == ["a", "b", "c", "b", "a"]
+
+
+def test_tool_cache_does_not_cache_failures():
+    from src.tool_cache import ToolCache
+
+    cache = ToolCache()
+    with pytest.raises(RuntimeError):
+        cache.call("k", MagicMock(side_effect=RuntimeError("502")))
+    assert cache.call("k", lambda: "ok") == "ok"
+
+
+def test_async_tool_cache_coalesces_tasks():
+    import asyncio
+    from src.tool_cache import ToolCache
+
+    cache = ToolCache()
+    calls = []
+
+    async def fetch(page_id):
+        calls.append(page_id)
+        await asyncio.sleep(0.01)
+        return "Client notes"
+
+    async def main():
+        return await asyncio.gather(*(cache.acall(("fetch", "p1"), fetch, "p1") for _ in range(5)))
+
+    assert asyncio.run(main()) == ["Client notes"] * 5
+    assert calls == ["p1"]
+
+
+# ---------------------------------------------------------------------------
+# Local workspace index
+# ---------------------------------------------------------------------------
+
+def _workspace_page(page_id, title, edited):
+    return {
+        "object": "page",
+        "id": page_id,
+        "url": f"https://notion.so/{page_id}",
+        "last_edited_time": edited,
+        "properties": {"title": {"type": "title", "title": [{"plain_text": title}]}},
+    }
+
+
+class _FakeWorkspace:
+    """Stand-in NotionClient for crawls: pages newest first, text by page ID."""
+
+    def __init__(self, pages, texts):
+        self.pages = pages
+        self.texts = texts
+        self.read = []
+
+    def iter_workspace_pages(self):
+        yield from self.pages
+
+    def page_text(self, page_id, max_chars):
+        self.read.append(page_id)
+        return self.texts[page_id][:max_chars]
+
+
+def test_workspace_index_ranks_with_bm25(tmp_path):
+    from src.workspace_index import WorkspaceIndex
+
+    index = WorkspaceIndex(str(tmp_path / "workspace.sqlite3"))
+    index.add_page(_workspace_page("p1", "Acme Corp", "2026-01-01T00:00:00.000Z"),
+                   "Client since 2019. Private equity portfolio.")
+    index.add_page(_workspace_page("p2", "Meeting notes", "2026-01-01T00:00:00.000Z"),
+                   "Discussed Acme briefly, then lunch, budget, hiring and travel.")
+    index.add_page(_workspace_page("p3", "Recipes", "2026-01-01T00:00:00.000Z"), "Pasta.")
+
+    assert index.search("acme") == [
+        {"page_id": "p1", "title": "Acme Corp", "url": "https://notion.so/p1"},
+        {"page_id": "p2", "title": "Meeting notes", "url": "https://notion.so/p2"},
+    ]
+    assert index.search("acme", max_results=1)[0]["page_id"] == "p1"
+    assert index.search("unknown words") == []
+    assert index.fetch("p1", max_chars=10) == "Client sin"
+    assert index.fetch("missing") is None
+
+
+def test_workspace_index_refresh_stops_at_last_crawl(tmp_path):
+    from src.workspace_index import WorkspaceIndex
+
+    index = WorkspaceIndex(str(tmp_path / "workspace.sqlite3"))
+    old = [
+        _workspace_page("p2", "Beta", "2026-01-02T00:00:00.000Z"),
+        _workspace_page("p1", "Alpha", "2026-01-01T00:00:00.000Z"),
+    ]
+    first = _FakeWorkspace(old, {"p1": "first", "p2": "second"})
+    assert index.refresh(first) == 2
+
+    edited = _workspace_page("p1", "Alpha", "2026-01-03T00:00:00.000Z")
+    older = _workspace_page("p0", "Old", "2025-12-01T00:00:00.000Z")
+    second = _FakeWorkspace([edited, old[0], older], {"p0": "", "p1": "rewritten", "p2": "second"})
+    assert index.refresh(second) == 2  # p1 changed; p2 shares the watermark minute
+    assert second.read == ["p1", "p2"]
+    assert index.fetch("p1") == "rewritten"
+    assert len(index) == 2
+
+    assert index.refresh(second, rebuild=True) == 3
+    assert len(index) == 3
+
+
+def test_notion_tools_served_from_workspace_index(tmp_path):
+    from src.notion_client import NotionClient
+    from src.workspace_index import WorkspaceIndex
+
+    index = WorkspaceIndex(str(tmp_path / "workspace.sqlite3"))
+    index.add_page(_workspace_page("abc-123", "Acme Corp", "2026-01-01T00:00:00.000Z"), "Client notes")
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db"), workspace=index)
+    client_cls.return_value.blocks.children.list.return_value = {
+        "results": [{"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": "Live"}]}}]
+    }
+
+    assert notion.search_workspace("ACME")[0]["page_id"] == "abc-123"
+    assert notion.fetch_page_content("abc123") == "Client notes"
+    client_cls.return_value.search.assert_not_called()
+    assert notion.fetch_page_content("not-indexed") == "Live"  # Falls back to Notion
+
+
+# ---------------------------------------------------------------------------
+# Concurrent tool calls within an iteration
+# ---------------------------------------------------------------------------
+
+def test_enrich_runs_tool_calls_concurrently_in_call_order():
+    import threading
+    import time as _time
+
+    calls = [
+        _mock_function_call(f"call_{i}", "fetch_notion_page", {"page_id": f"p{i}"})
+        for i in range(4)
+    ]
+    final = _mock_text_response({"summary": "Done.", "insights": []})
+    config = OpenAIConfig(
+        api_key="sk-test", model="gpt-5.3-codex", tool_workers=4, chain_responses=False
+    )
+
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fetch(page_id):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        _time.sleep(0.05 if page_id == "p0" else 0.01)  # First call finishes last
+        with lock:
+            active[0] -= 1
+        return f"text of {page_id}"
+
+    notion = MagicMock()
+    notion.fetch_page_content.side_effect = fetch
+    with patch("src.enrichment.OpenAI") as MockOpenAI:
+        client = MockOpenAI.return_value
+        client.responses.create.side_effect = [_mock_tool_response(calls), final]
+        result = enrich("Some text", config, notion=notion)
+
+    assert result.summary == "Done."
+    assert peak[0] == 4
+    sent = client.responses.create.call_args_list[1].kwargs["input"][1:]
+    assert [(item["type"], item["call_id"]) for item in sent] == [
+        (kind, f"call_{i}") for i in range(4) for kind in ("function_call", "function_call_output")
+    ]
+    assert [json.loads(item["output"])["content"] for item in sent[1::2]] == [
+        f"text of p{i}" for i in range(4)
+    ]
+
+
+def test_enrich_async_gathers_tool_calls():
+    import asyncio
+    from src.enrichment import enrich_async
+
+    calls = [
+        _mock_function_call(f"call_{i}", "search_notion", {"query": f"q{i}"})
+        for i in range(3)
+    ]
+    final = _mock_text_response({"summary": "Done.", "insights": []})
+    started = []
+
+    class Notion:
+        async def search_workspace(self, query):
+            started.append(query)
+            await asyncio.sleep(0.01 if query != "q0" else 0.03)
+            # Every call was started before any of them finished
+            assert len(started) == 3
+            return [{"page_id": query}]
+
+    client = MagicMock()
+    client.responses.create = AsyncMock(side_effect=[_mock_tool_response(calls), final])
+    config = OpenAIConfig(api_key="sk-test", model="gpt-5.3-codex")
+
+    result = asyncio.run(enrich_async("Some text", config, notion=Notion(), client=client))
+
+    assert result.summary == "Done."
+    outputs = client.responses.create.call_args_list[1].kwargs["input"]
+    assert [json.loads(item["output"])[0]["page_id"] for item in outputs] == ["q0", "q1", "q2"]
+
+
+# ---------------------------------------------------------------------------
+# Shared OpenAI client
+# ---------------------------------------------------------------------------
+
+def test_enrich_uses_injected_client():
+    config = OpenAIConfig(api_key="sk-test", model="gpt-5.3-codex")
+    client = MagicMock()
+    client.responses.create.return_value = _mock_text_response({"summary": "s"})
+
+    with patch("src.enrichment.OpenAI") as MockOpenAI:
+        result = enrich("Some text", config, client=client)
+
+    assert result.summary == "s"
+    MockOpenAI.assert_not_called()
+
+
+def test_pipeline_shares_one_pooled_openai_client():
+    from src.enrichment import _http_options
+
+    pipeline = _make_pipeline(workers=3)
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(n) for n in range(1, 4)]
+    clients = []
+
+    def fake_enrich(text, config, client=None, **kwargs):
+        clients.append(client)
+        return _ENRICHED
+
+    with patch("src.pipeline.enrich", side_effect=fake_enrich):
+        assert pipeline.run()["processed"] == 3
+    assert clients == [pipeline.openai] * 3
+
+    options = _http_options(OpenAIConfig(api_key="k", max_concurrency=6, timeout=30, keepalive_expiry=15))
+    assert options["limits"].max_connections == 24  # Room for the limit to grow (4 x 6)
+    ceiling = OpenAIConfig(api_key="k", max_concurrency=6, concurrency_ceiling=10)
+    assert _http_options(ceiling)["limits"].max_connections == 10
+    assert options["limits"].keepalive_expiry == 15
+    assert options["timeout"].read == 30
+
+
+# ---------------------------------------------------------------------------
+# Batch API mode
+# ---------------------------------------------------------------------------
+
+class _FakeBatchAPI:
+    """Local stand-in for the OpenAI Files and Batches endpoints.
+
+    An uploaded JSONL is "run" through answer(body) -> output text (or None
+    for a failed request) once the batch has been polled `polls` times.
+    """
+
+    def __init__(self, answer, polls=2):
+        from types import SimpleNamespace as NS
+
+        self._ns = NS
+        self.answer = answer
+        self.polls = polls
+        self.uploads = {}
+        self.contents = {}
+        self.batches = NS(create=self._create_batch, retrieve=self._retrieve)
+        self.files = NS(create=self._create_file, content=lambda file_id: NS(text=self.contents[file_id]))
+        self.requests = []
+
+    def _create_file(self, file, purpose):
+        assert purpose == "batch"
+        file_id = f"file-{len(self.uploads) + 1}"
+        self.uploads[file_id] = file.read().decode()
+        return self._ns(id=file_id)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        assert endpoint == "/v1/responses"
+        self.requests = [json.loads(line) for line in self.uploads[input_file_id].splitlines()]
+        self.remaining = self.polls
+        return self._ns(id="batch-1")
+
+    def _retrieve(self, batch_id):
+        self.remaining -= 1
+        if self.remaining > 0:
+            counts = self._ns(total=len(self.requests), completed=0, failed=0)
+            return self._ns(id=batch_id, status="in_progress", request_counts=counts)
+        out, errors = [], []
+        for req in self.requests:
+            text = self.answer(req["body"])
+            if text is None:
+                errors.append({"custom_id": req["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "boom"}})
+                continue
+            body = {"output": [{"type": "message",
+                                "content": [{"type": "output_text", "text": text}]}]}
+            out.append({"custom_id": req["custom_id"], "error": None,
+                        "response": {"status_code": 200, "body": body}})
+        self.contents["out"] = "\n".join(map(json.dumps, out))
+        self.contents["err"] = "\n".join(map(json.dumps, errors))
+        return self._ns(id=batch_id, status="completed", output_file_id="out",
+                        error_file_id="err" if errors else None)
+
+
+def _batch_pipeline(tmp_path, api, files):
+    pipeline = _make_pipeline()
+    pipeline.config.state_dir = str(tmp_path)
+    pipeline.config.batch_poll_interval = 0
+    pipeline.openai = api
+    pipeline.drive.iter_pdfs.return_value = files
+    return pipeline
+
+
+def test_batch_mode_submits_tool_less_requests_and_writes_results(tmp_path):
+    answers = iter([json.dumps({"summary": "batched"}), None, json.dumps({"summary": "batched"})])
+    api = _FakeBatchAPI(lambda body: next(answers))
+    pipeline = _batch_pipeline(tmp_path, api, [_drive_file(n) for n in range(1, 4)])
+    pipeline.notion.create_page.side_effect = ["page-1", "page-2", "page-3"]
+
+    stats = pipeline.run_batch()
+
+    assert stats == {"total": 3, "processed": 2, "skipped": 0, "failed": 1}
+    assert [r["custom_id"] for r in api.requests] == ["f1", "f2", "f3"]
+    body = api.requests[0]["body"]
+    assert "tools" not in body and body["text"] == {"format": {"type": "json_object"}}
+    assert pipeline.notion.create_page.call_count == 3
+    assert pipeline.notion.add_blocks.call_count == 2
+    pipeline.notion.set_status.assert_any_call("page-2", ContentStatus.FAILED)
+    assert os.listdir(tmp_path) == ["reports"]  # Batch state cleared; the run report stays
+
+
+def test_batch_mode_resumes_pending_batch(tmp_path):
+    api = _FakeBatchAPI(lambda body: json.dumps({"summary": "batched"}), polls=3)
+    pipeline = _batch_pipeline(tmp_path, api, [_drive_file(1), _drive_file(2)])
+
+    with patch("src.batch.time.sleep", side_effect=[None, KeyboardInterrupt]):
+        with pytest.raises(KeyboardInterrupt):
+            pipeline.run_batch()  # Stopped while the batch is still in progress
+    assert os.path.exists(tmp_path / "batch.json")
+
+    resumed = _batch_pipeline(tmp_path, api, [])
+    with patch("src.batch.time.sleep"):
+        stats = resumed.run_batch()
+
+    assert stats["processed"] == 2
+    resumed.drive.download.assert_not_called()
+    resumed.notion.create_page.assert_not_called()
+    assert resumed.notion.add_blocks.call_count == 2
+
+
+def test_batch_mode_resumes_mid_write_without_rewriting_documents(tmp_path):
+    api = _FakeBatchAPI(lambda body: json.dumps({"summary": "batched"}))
+    pipeline = _batch_pipeline(tmp_path, api, [_drive_file(n) for n in range(1, 4)])
+    pipeline.notion.create_page.side_effect = ["page-1", "page-2", "page-3"]
+    pipeline.notion.add_blocks.side_effect = [None, KeyboardInterrupt]
+
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.run_batch()  # Stopped while writing the second document
+    with open(tmp_path / "batch.json") as f:
+        assert sorted(json.load(f)["documents"]) == ["f2", "f3"]
+
+    resumed = _batch_pipeline(tmp_path, api, [])
+    stats = resumed.run_batch()
+
+    assert stats["processed"] == 2
+    assert [c.args[0] for c in resumed.notion.add_blocks.call_args_list] == ["page-2", "page-3"]
+    assert not os.path.exists(tmp_path / "batch.json")
+
+
+def test_batch_mode_lists_files_without_a_page_again(tmp_path):
+    from src.drive_sync import DriveSync
+
+    api = _FakeBatchAPI(lambda body: json.dumps({"summary": "batched"}))
+    pipeline = _batch_pipeline(tmp_path, api, [_drive_file(1), _drive_file(2)])
+    pipeline.drive.folder_id, pipeline.drive.recursive = "folder1", False
+    pipeline.drive.start_page_token.return_value = "1"
+    pipeline.sync = DriveSync(pipeline.drive, str(tmp_path), incremental=True)
+    pipeline.notion.create_page.side_effect = [ValueError("notion down"), "page-2"]
+
+    stats = pipeline.run_batch()
+
+    assert stats == {"total": 2, "processed": 1, "skipped": 0, "failed": 1}
+    saved = json.loads((tmp_path / "drive_sync.json").read_text())
+    assert saved["start_page_token"] == "1"
+    assert [f["id"] for f in saved["retry"]] == ["f1"]
+
+
+def test_batch_mode_failed_status_error_does_not_stop_the_fan_out(tmp_path):
+    answers = iter([None, json.dumps({"summary": "batched"})])
+    api = _FakeBatchAPI(lambda body: next(answers))
+    pipeline = _batch_pipeline(tmp_path, api, [_drive_file(1), _drive_file(2)])
+    pipeline.notion.create_page.side_effect = ["page-1", "page-2"]
+    pipeline.notion.set_status.side_effect = [ValueError("notion down"), None]
+
+    stats = pipeline.run_batch()
+
+    assert stats == {"total": 2, "processed": 1, "skipped": 0, "failed": 1}
+    pipeline.notion.add_blocks.assert_called_once()
+    assert pipeline.notion.add_blocks.call_args.args[0] == "page-2"
+
+
+# ---------------------------------------------------------------------------
+# Chained enrichment turns (previous_response_id)
+# ---------------------------------------------------------------------------
+
+def test_enrich_chains_turns_and_sends_only_new_tool_outputs(caplog):
+    from types import SimpleNamespace as NS
+
+    first = _mock_tool_response([_mock_function_call("call_1", "search_notion", {"query": "PE"})])
+    first.id = "resp_1"
+    first.usage = NS(input_tokens=20_000, input_tokens_details=NS(cached_tokens=0))
+    second = _mock_tool_response([_mock_function_call("call_2", "fetch_notion_page", {"page_id": "p1"})])
+    second.id = "resp_2"
+    second.usage = NS(input_tokens=20_300, input_tokens_details=NS(cached_tokens=19_968))
+    final = _mock_text_response({"summary": "Done."})
+    final.usage = NS(input_tokens=20_600, input_tokens_details=NS(cached_tokens=20_224))
+
+    notion = MagicMock()
+    notion.search_workspace.return_value = [{"page_id": "p1"}]
+    notion.fetch_page_content.return_value = "Client notes"
+    client = MagicMock()
+    client.responses.create.side_effect = [first, second, final]
+    config = OpenAIConfig(api_key="sk-test", model="gpt-5.3-codex")
+
+    with caplog.at_level(logging.INFO, logger="src.enrichment"):
+        result = enrich("Document text", config, notion=notion, client=client)
+
+    assert result.summary == "Done."
+    requests = [c.kwargs for c in client.responses.create.call_args_list]
+    assert "previous_response_id" not in requests[0]
+    assert requests[0]["input"][0]["content"].endswith("Document text")
+    assert [r.get("previous_response_id") for r in requests[1:]] == ["resp_1", "resp_2"]
+    assert [[item["call_id"] for item in r["input"]] for r in requests[1:]] == [["call_1"], ["call_2"]]
+    assert all(item["type"] == "function_call_output" for r in requests[1:] for item in r["input"])
+    # Stable prefix: every turn carries the same instructions and tools
+    assert len({(r["instructions"], json.dumps(r["tools"])) for r in requests}) == 1
+    assert "60900 tokens (40192 cached) over 3 request(s)" in caplog.text
+
+
+# ---------------------------------------------------------------------------
+# Map-reduce enrichment of long documents
+# ---------------------------------------------------------------------------
+
+def test_chunk_text_splits_at_paragraphs_within_token_budget():
+    from src.enrichment import chunk_text
+
+    paragraphs = [f"Paragraph {i} " + "word " * 150 for i in range(10)]
+    chunks = chunk_text("\n\n".join(paragraphs), max_tokens=500)  # ~2000 characters
+
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    assert all(chunk.startswith("Paragraph") for chunk in chunks)
+    assert "".join(chunks).count("Paragraph") == 10
+    assert chunk_text("x" * 5000, max_tokens=500) == ["x" * 2000, "x" * 2000, "x" * 1000]
+
+
+def test_enrich_condenses_long_document_instead_of_truncating():
+    from src.enrichment import SECTION_PROMPT
+
+    text = "\n\n".join(f"Part {i}. " + "detail " * 2000 for i in range(4)) + "\n\nConclusion: adopt."
+    config = OpenAIConfig(
+        api_key="sk-test", digest_threshold=20_000, chunk_tokens=4_000, summary_model="mini"
+    )
+
+    def create(**kwargs):
+        if kwargs["instructions"] == SECTION_PROMPT:
+            section = kwargs["input"][0]["content"]
+            response = MagicMock()
+            response.output_text = "Summary: " + ("adopt" if "Conclusion" in section else "details")
+            return response
+        return _mock_text_response({"summary": "Condensed."})
+
+    client = MagicMock()
+    client.responses.create.side_effect = create
+    result = enrich(text, config, client=client)
+
+    assert result.summary == "Condensed."
+    requests = [c.kwargs for c in client.responses.create.call_args_list]
+    sections = [r for r in requests if r["instructions"] == SECTION_PROMPT]
+    assert len(sections) == len(requests) - 1 > 1
+    assert {r["model"] for r in sections} == {"mini"}
+    final = requests[-1]["input"][0]["content"]
+    assert f"summaries of its {len(sections)} consecutive sections" in final
+    assert "Summary: adopt" in final and "[...truncated]" not in final
+
+
+def test_condensing_is_opt_in_and_summarizes_on_a_small_model():
+    from dataclasses import replace
+    from src.enrichment import MAX_INPUT_CHARS, _section_request, input_budget
+
+    config = OpenAIConfig(api_key="sk-test")
+    assert input_budget(config) == MAX_INPUT_CHARS  # Extraction stops at the enrichment budget
+
+    condensing = replace(config, digest_threshold=80_000)
+    assert input_budget(condensing) == condensing.max_document_chars
+    assert _section_request(condensing, "text", 1, 2)["model"] != condensing.model
+
+
+def test_enrich_truncates_when_condensing_fails():
+    from src.enrichment import SECTION_PROMPT
+
+    config = OpenAIConfig(api_key="sk-test", digest_threshold=1_000, chunk_tokens=100)
+
+    def create(**kwargs):
+        if kwargs["instructions"] == SECTION_PROMPT:
+            raise RuntimeError("429")
+        return _mock_text_response({"summary": "s"})
+
+    client = MagicMock()
+    client.responses.create.side_effect = create
+
+    with patch("src.enrichment.MAX_INPUT_CHARS", 1_000):
+        result = enrich("word " * 300, config, client=client)
+
+    assert result.summary == "s"
+    assert client.responses.create.call_args.kwargs["input"][0]["content"].endswith("[...truncated]")
+
+
+# ---------------------------------------------------------------------------
+# Single-request page creation
+# ---------------------------------------------------------------------------
+
+def test_long_page_body_overflows_into_add_blocks():
+    pipeline = _make_pipeline()
+    calls = []
+    pipeline.notion = _RecordingNotion(calls)
+    long_result = EnrichmentResult(
+        summary="Summary.", insights=[f"Insight {i}" for i in range(120)], content_type="Other"
+    )
+    with patch("src.pipeline.enrich", return_value=long_result):
+        assert pipeline.process_one(_drive_file(1)) == "processed"
+
+    blocks = format_blocks(long_result)
+    (_, props, first), (_, page_id, rest), status = calls
+    assert props["Status"] == {"select": {"name": "Processing"}}
+    assert props["Content-Type"] == {"select": {"name": "Other"}}
+    assert first == blocks[:100] and rest == blocks[100:]
+    assert status == ("set_status", page_id, ContentStatus.ENRICHED)
+
+
+class _PageBodies(_RecordingNotion):
+    """_RecordingNotion that keeps each page's blocks; the first append fails."""
+
+    def __init__(self, calls):
+        super().__init__(calls)
+        self.bodies = {}
+        self.fail_next_append = True
+
+    def create_page(self, content, properties=None, children=None):
+        page_id = super().create_page(content, properties, children)
+        self.bodies[page_id] = list(children or [])
+        return page_id
+
+    def add_blocks(self, page_id, blocks):
+        super().add_blocks(page_id, blocks)
+        if self.fail_next_append:
+            self.fail_next_append = False
+            raise RuntimeError("Notion 502")
+        self.bodies[page_id] += blocks
+
+    def clear_blocks(self, page_id):
+        super().clear_blocks(page_id)
+        cleared, self.bodies[page_id] = len(self.bodies[page_id]), []
+        return cleared
+
+
+def test_resuming_after_a_failed_overflow_append_does_not_duplicate_blocks(tmp_path):
+    from src.index import DedupIndex
+    from src.result_cache import ResultCache
+
+    pipeline = _make_pipeline()
+    pipeline.index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    pipeline.results = ResultCache(str(tmp_path / "results.sqlite3"), "m", "v", 1_048_576)
+    pipeline.notion = _PageBodies([])
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1)]
+    long_result = EnrichmentResult(
+        summary="Summary.", insights=[f"Insight {i}" for i in range(120)], content_type="Other"
+    )
+    with patch("src.pipeline.enrich", return_value=long_result):
+        assert pipeline.run()["failed"] == 1  # First 100 blocks in, overflow append failed
+
+    pipeline.config.retry_failed = True
+    with patch("src.pipeline.enrich") as mock_enrich:
+        assert pipeline.run()["processed"] == 1
+    mock_enrich.assert_not_called()
+    (page_id, body), = pipeline.notion.bodies.items()
+    assert body == format_blocks(long_result)
+
+
+def test_rejected_single_request_create_falls_back_to_steps():
+    pipeline = _make_pipeline()
+    pipeline.notion.create_page.side_effect = [_transient(400), "page-2"]
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.process_one(_drive_file(1)) == "processed"
+
+    combined, plain = pipeline.notion.create_page.call_args_list
+    assert len(combined.args) == 3 and len(plain.args) == 1  # Properties and blocks, then neither
+    pipeline.notion.add_blocks.assert_called_once()
+    assert pipeline.notion.add_blocks.call_args.args[0] == "page-2"
+    pipeline.notion.set_status.assert_called_with("page-2", ContentStatus.ENRICHED)
+
+
+def test_single_request_create_timeout_is_not_retried_as_a_second_page():
+    from notion_client.errors import RequestTimeoutError
+
+    pipeline = _make_pipeline()
+    pipeline.notion.create_page.side_effect = RequestTimeoutError()
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.process_one(_drive_file(1)) == "failed"
+
+    # The write may have landed; creating another page could duplicate it
+    pipeline.notion.create_page.assert_called_once()
+    pipeline.notion.add_blocks.assert_not_called()
+
+
+def test_async_create_enriched_falls_back_only_on_validation_errors():
+    import asyncio
+    from notion_client.errors import RequestTimeoutError
+    from src.pipeline import _Document
+
+    apipe = _async_pipeline([], workers=1, latency=0)
+    apipe.notion = MagicMock(
+        create_page=AsyncMock(side_effect=[_transient(400), "page-2"]),
+        update_page_properties=AsyncMock(), add_blocks=AsyncMock(), set_status=AsyncMock(),
+    )
+    blocks = format_blocks(_ENRICHED)
+
+    doc = _Document(_drive_file(1), 1, 1, content_hash="h")
+    asyncio.run(apipe._create_enriched(doc, _ENRICHED, blocks))
+    assert doc.page_id == "page-2"
+    apipe.notion.add_blocks.assert_awaited_once_with("page-2", blocks)
+
+    apipe.notion.create_page = AsyncMock(side_effect=RequestTimeoutError())
+    with pytest.raises(RequestTimeoutError):
+        asyncio.run(apipe._create_enriched(
+            _Document(_drive_file(1), 1, 1, content_hash="h"), _ENRICHED, blocks
+        ))
+    apipe.notion.create_page.assert_awaited_once()
+
+
+# ---------------------------------------------------------------------------
+# Notion rate limiting
+# ---------------------------------------------------------------------------
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_paces_requests_after_burst():
+    from src.rate_limit import TokenBucket
+
+    clock = _Clock()
+    bucket = TokenBucket(rate=3.0, burst=3, clock=clock)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(1 / 3) and waits[4] == pytest.approx(2 / 3)
+
+    clock.now = 10.0  # Idle long enough to refill, but never past the burst
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1 / 3)
+
+
+def test_token_bucket_pause_holds_every_caller():
+    from src.rate_limit import TokenBucket
+
+    clock = _Clock()
+    bucket = TokenBucket(rate=100.0, burst=10, clock=clock)
+    bucket.pause(2.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+    clock.now = 1.5
+    assert bucket.reserve() == pytest.approx(0.51)  # Queued behind the first caller
+    clock.now = 2.5
+    assert bucket.reserve() == 0.0
+
+
+def test_token_bucket_paces_callers_queued_during_pause():
+    from src.rate_limit import TokenBucket
+
+    clock = _Clock()
+    bucket = TokenBucket(rate=3.0, burst=3, clock=clock)
+    clock.now = 1.0
+    bucket.pause(5.0)
+    releases = [clock.now + bucket.reserve() for _ in range(12)]
+    assert releases == pytest.approx([6.0 + i / 3 for i in range(12)])
+
+
+def test_token_bucket_pause_keeps_earlier_reservations():
+    from src.rate_limit import TokenBucket
+
+    clock = _Clock()
+    bucket = TokenBucket(rate=1.0, burst=1, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 1.0, 2.0, 3.0]
+    bucket.pause(1.0)  # Shorter than the queue already booked
+    assert bucket.reserve() == pytest.approx(4.0)
+
+
+def test_shared_bucket_is_per_integration():
+    from src.rate_limit import shared_bucket
+
+    first = shared_bucket("test:tok-a", 3.0, 3)
+    assert shared_bucket("test:tok-a", 3.0, 3) is first
+    assert shared_bucket("test:tok-b", 3.0, 3) is not first
+    assert shared_bucket("test:tok-a", 0, 3) is None
+
+
+def test_notion_client_pauses_limiter_and_raises_on_429():
+    from notion_client.errors import APIResponseError
+    from src.notion_client import NotionClient
+
+    config = NotionConfig(token="t-429", sources_db_id="db")
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(config)
+    client_cls.return_value.pages.update.side_effect = [_transient(429, {"Retry-After": "2"})]
+    notion.limiter = MagicMock()
+
+    with pytest.raises(APIResponseError):
+        notion.set_status("p1", ContentStatus.ENRICHED)
+
+    assert client_cls.return_value.pages.update.call_count == 1  # The Retrier resends, not the client
+    notion.limiter.pause.assert_called_once_with(2.0)
+
+
+def test_notion_429s_are_retried_only_by_the_retrier():
+    from notion_client.errors import APIResponseError
+    from src.notion_client import NotionClient
+
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db"))
+    update = client_cls.return_value.pages.update
+    notion.limiter = MagicMock()
+    clock = _FakeClock()
+
+    update.side_effect = [_transient(429, {"Retry-After": "2"}), None]
+    _retrier(clock, breaker_threshold=0).call(notion.set_status, "p1", ContentStatus.ENRICHED)
+    assert update.call_count == 2 and clock.sleeps == [2.0]
+    assert notion.limiter.acquire.call_count == 2  # Every attempt waits for a token
+
+    update.reset_mock()
+    update.side_effect = _transient(429)
+    with pytest.raises(APIResponseError):
+        _retrier(clock, max_retries=3, breaker_threshold=0).call(
+            notion.set_status, "p1", ContentStatus.ENRICHED
+        )
+    assert update.call_count == 4  # max_retries + 1, not squared
+
+
+def test_add_blocks_paced_by_limiter():
+    from src.notion_client import NotionClient
+
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db"))
+    notion.limiter = MagicMock()
+    notion.add_blocks("p1", [{"type": "divider"}] * 250)
+    assert client_cls.return_value.blocks.children.append.call_count == 3
+    assert notion.limiter.acquire.call_count == 3
+
+
+def test_add_blocks_retries_only_the_failed_chunk():
+    from src.notion_client import NotionClient
+
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db"))
+    notion.limiter = MagicMock()
+    append = client_cls.return_value.blocks.children.append
+    append.side_effect = [None, _transient(429, {"Retry-After": "1"}), None, None]
+    blocks = [{"type": "divider", "n": i} for i in range(250)]
+    clock = _FakeClock()
+
+    with patch("src.notion_client.retrier", return_value=_retrier(clock, breaker_threshold=0)):
+        notion.add_blocks("p1", blocks)
+    sent = [c.kwargs["children"] for c in append.call_args_list]
+    assert sent == [blocks[:100], blocks[100:200], blocks[100:200], blocks[200:]]
+    assert clock.sleeps == [1.0]
+
+
+def test_clear_blocks_deletes_every_top_level_block():
+    from src.notion_client import NotionClient
+
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db"))
+    notion.limiter = MagicMock()
+    blocks = client_cls.return_value.blocks
+    blocks.children.list.side_effect = [
+        {"results": [{"id": "b1"}, {"id": "b2"}], "has_more": True, "next_cursor": "c"},
+        {"results": [{"id": "b3"}], "has_more": False},
+    ]
+    blocks.delete.side_effect = [None, _transient(502), None, None]
+    clock = _FakeClock()
+
+    with patch("src.notion_client.retrier", return_value=_retrier(clock, breaker_threshold=0)):
+        assert notion.clear_blocks("p1") == 3
+    assert blocks.children.list.call_args_list[1].kwargs["start_cursor"] == "c"
+    assert [c.kwargs["block_id"] for c in blocks.delete.call_args_list] == ["b1", "b2", "b2", "b3"]
+
+
+def test_async_notion_client_honors_retry_after():
+    import asyncio
+    from src.config import RetryPolicy
+    from src.notion_client import AsyncNotionClient
+    from src.retry import Retrier
+
+    with patch("src.notion_client.AsyncClient") as client_cls:
+        notion = AsyncNotionClient(NotionConfig(token="t", sources_db_id="db"))
+    client_cls.return_value.search = AsyncMock(
+        side_effect=[_transient(429, {"Retry-After": "0.5"}), {"results": []}]
+    )
+    notion.limiter = MagicMock(acquire_async=AsyncMock())
+    sleep = AsyncMock()
+
+    with patch("src.notion_client.retrier", return_value=Retrier("notion", RetryPolicy(), async_sleep=sleep)):
+        assert asyncio.run(notion.search_workspace("acme")) == []
+    notion.limiter.pause.assert_called_once_with(0.5)
+    sleep.assert_awaited_once_with(0.5)
+    assert notion.limiter.acquire_async.await_count == 2
+
+
+# ---------------------------------------------------------------------------
+# Retry policy engine
+# ---------------------------------------------------------------------------
+
+class _FakeClock:
+    """monotonic() and sleep() for Retrier tests: sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _transient(status=503, headers=None):
+    import httpx
+    from notion_client.errors import APIResponseError
+
+    return APIResponseError(
+        "service_unavailable", status, "unavailable", httpx.Headers(headers or {}), ""
+    )
+
+
+def _retrier(clock, **policy):
+    from src.config import RetryPolicy
+    from src.retry import Retrier
+
+    return Retrier(
+        "notion", RetryPolicy(**policy), clock=clock, sleep=clock.sleep,
+        uniform=lambda low, high: high,  # Worst case of the jitter range
+    )
+
+
+def _failing(n, result="ok", **kwargs):
+    errors = iter([_transient(**kwargs) for _ in range(n)])
+
+    def fn():
+        for exc in errors:
+            raise exc
+        return result
+    return fn
+
+
+def test_retrier_uses_decorrelated_jitter_capped_at_max_delay():
+    clock = _FakeClock()
+    r = _retrier(clock, base_delay=1.0, max_delay=5.0, breaker_threshold=0)
+    assert r.call(_failing(3)) == "ok"
+    assert clock.sleeps == [3.0, 5.0, 5.0]  # uniform(1, 3), uniform(1, 9) -> cap, ...
+    assert r.stats["retries"] == 3
+
+
+def test_retrier_jitter_spreads_concurrent_retries():
+    import random
+    from src.config import RetryPolicy
+    from src.retry import Retrier
+
+    delays = set()
+    for seed in range(5):
+        clock = _FakeClock()
+        rng = random.Random(seed)
+        Retrier("notion", RetryPolicy(), clock=clock, sleep=clock.sleep, uniform=rng.uniform).call(_failing(1))
+        delays.add(clock.sleeps[0])
+    assert len(delays) == 5 and all(1.0 <= d <= 3.0 for d in delays)
+
+
+def test_retrier_honors_retry_after():
+    clock = _FakeClock()
+    r = _retrier(clock, max_delay=30.0)
+    assert r.call(_failing(1, status=429, headers={"retry-after": "7"})) == "ok"
+    assert clock.sleeps == [7.0]
+
+
+def test_retry_after_reads_each_sdk():
+    from types import SimpleNamespace
+    from src.retry import retry_after
+
+    google = SimpleNamespace(resp={"status": "429", "retry-after": "4"})
+    openai_error = SimpleNamespace(response=SimpleNamespace(headers={"retry-after-ms": "1500"}))
+    assert retry_after(google) == 4.0
+    assert retry_after(openai_error) == 1.5
+    assert retry_after(_transient(429, {"Retry-After": "2"})) == 2.0
+    assert retry_after(ValueError("no headers")) is None
+
+
+def test_retry_budget_limits_retries_across_calls():
+    from src.retry import _is_transient
+
+    clock = _FakeClock()
+    r = _retrier(clock, budget_burst=2, budget_ratio=0.5, breaker_threshold=0)
+    assert _is_transient(_transient())
+    assert r.call(_failing(2)) == "ok"  # Spends the burst
+    with pytest.raises(Exception, match="unavailable"):
+        r.call(_failing(2))  # 0.5 refilled: not enough for a retry
+    assert r.stats["budget_exhausted"] == 1
+
+
+def test_circuit_opens_fails_fast_and_pauses_new_calls():
+    from src.retry import CircuitOpenError
+
+    clock = _FakeClock()
+    r = _retrier(clock, max_retries=10, breaker_threshold=3, breaker_cooldown=30.0)
+    with pytest.raises(CircuitOpenError):
+        r.call(_failing(10))
+    assert len(clock.sleeps) == 2  # Third failure opened the circuit: no more backoff
+    assert r.stats["circuit_opened"] == 1
+
+    opened_at = clock.now
+    assert r.call(lambda: "up again") == "up again"  # Waited out the cooldown first
+    assert clock.now == pytest.approx(opened_at + 30.0)
+
+    # Closed again: a single failure is retried as usual
+    assert r.call(_failing(1)) == "ok"
+    assert r.stats["circuit_opened"] == 1
+
+
+def test_circuit_reopens_when_probe_fails():
+    from src.retry import CircuitOpenError
+
+    clock = _FakeClock()
+    r = _retrier(clock, breaker_threshold=2, breaker_cooldown=10.0)
+    with pytest.raises(CircuitOpenError):
+        r.call(_failing(5))
+    with pytest.raises(CircuitOpenError):
+        r.call(_failing(5))  # After the cooldown, the first failure re-opens it
+    assert r.stats["circuit_opened"] == 2
+
+
+def test_async_retrier_uses_same_policy():
+    import asyncio
+    from src.config import RetryPolicy
+    from src.retry import Retrier
+
+    clock = _FakeClock()
+
+    async def fake_sleep(seconds):
+        clock.sleep(seconds)
+
+    r = Retrier("openai", RetryPolicy(), clock=clock, async_sleep=fake_sleep, uniform=lambda a, b: a)
+    errors = iter([_transient(), _transient()])
+
+    async def fn():
+        for exc in errors:
+            raise exc
+        return "ok"
+
+    assert asyncio.run(r.acall(fn)) == "ok"
+    assert clock.sleeps == [1.0, 1.0]
+
+
+def test_retry_policy_from_env(monkeypatch):
+    from src.config import RetryPolicy
+
+    monkeypatch.setenv("DRIVE_MAX_RETRIES", "5")
+    monkeypatch.setenv("DRIVE_BREAKER_COOLDOWN", "12.5")
+    policy = RetryPolicy.from_env("DRIVE")
+    assert (policy.max_retries, policy.breaker_cooldown) == (5, 12.5)
+    assert RetryPolicy.from_env("NOTION").max_retries == 3
+
+
+# ---------------------------------------------------------------------------
+# Adaptive (AIMD) concurrency
+# ---------------------------------------------------------------------------
+
+def _complete(limit, clock, n, latency=1.0, exc=None):
+    """Run n overlapping calls through limit, each taking latency seconds."""
+    for _ in range(n):
+        limit.__enter__()
+    clock.now += latency
+    for _ in range(n):
+        limit.__exit__(type(exc) if exc else None, exc, None)
+
+
+def _saturated(limit, n):
+    """Complete n calls while keeping every slot of limit busy."""
+    for _ in range(n):
+        while limit.in_flight < int(limit.limit):
+            limit.__enter__()
+        limit.__exit__(None, None, None)
+
+
+def test_adaptive_limit_grows_additively_while_saturated():
+    from src.concurrency import AdaptiveLimit
+
+    clock = _FakeClock()
+    limit = AdaptiveLimit("drive", 2, maximum=4, clock=clock)
+    for _ in range(5):
+        _complete(limit, clock, 1)
+    assert limit.snapshot()["limit"] == 2  # Half the slots idle: no growth
+    _saturated(limit, 3)
+    assert limit.snapshot()["limit"] == 3  # 2 + 1/2 + 1/2.5 + 1/2.9: about one slot per 2-3 calls
+    _saturated(limit, 20)
+    s = limit.snapshot()
+    assert (s["limit"], s["high"], s["increases"]) == (4, 4, 2)  # Capped at maximum
+
+
+def test_adaptive_limit_holds_when_latency_degrades():
+    from src.concurrency import AdaptiveLimit
+
+    clock = _FakeClock()
+    limit = AdaptiveLimit("openai", 2, clock=clock)
+    _complete(limit, clock, 2, latency=1.0)
+    before = limit.limit
+    _complete(limit, clock, 2, latency=5.0)  # Over tolerance x best latency
+    assert limit.limit == before
+
+
+def test_adaptive_limit_cuts_once_per_round_trip_on_transient_errors():
+    from src.concurrency import AdaptiveLimit
+
+    clock = _FakeClock()
+    limit = AdaptiveLimit("notion", 8, clock=clock)
+    _complete(limit, clock, 3, latency=1.0, exc=_transient(429))
+    assert limit.snapshot()["limit"] == 4  # Three errors, one cut
+    clock.now += 2.0
+    _complete(limit, clock, 1, latency=1.0, exc=_transient(503))
+    _complete(limit, clock, 1, latency=1.0, exc=ValueError("bad request"))
+    s = limit.snapshot()
+    assert (s["limit"], s["low"], s["decreases"], s["errors"]) == (2, 2, 2, 4)
+    for _ in range(10):
+        _complete(limit, clock, 1, latency=1.0, exc=_transient())
+        clock.now += 5
+    assert limit.snapshot()["limit"] == 1  # Never below the minimum
+
+
+def test_adaptive_limit_blocks_callers_over_the_limit():
+    import threading
+    import time as _time
+    from src.concurrency import AdaptiveLimit
+
+    limit = AdaptiveLimit("drive", 2, maximum=2)
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+
+    def work():
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        _time.sleep(0.01)
+        with lock:
+            in_flight["now"] -= 1
+
+    threads = [threading.Thread(target=limit.call, args=(work,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=2)
+    assert in_flight["peak"] == 2
+    assert limit.snapshot()["calls"] == 6
+
+
+def test_pipeline_call_reports_each_transient_attempt_to_the_limit():
+    pipeline = _make_pipeline()
+    attempts = iter([_transient(502)])
+
+    def create(source):
+        for exc in attempts:
+            raise exc
+        return "page-1"
+
+    with patch("src.retry.time.sleep"):
+        assert pipeline._call("notion", create, None) == "page-1"
+    s = pipeline._slots["notion"].snapshot()
+    assert (s["calls"], s["errors"], s["decreases"], s["in_flight"]) == (2, 1, 1, 0)
+    assert s["low"] == 1  # 3 halved, then regrowing on the successful retry
+
+
+def test_sync_tool_lookups_hold_a_notion_slot():
+    from src.notion_client import NotionClient
+
+    pipeline = _make_pipeline()
+    assert pipeline.notion.tool_slot is pipeline._slots["notion"]
+
+    with patch("src.notion_client.Client") as client_cls:
+        notion = NotionClient(NotionConfig(token="t", sources_db_id="db", requests_per_second=0))
+    client_cls.return_value.search.side_effect = [_transient(429), {"results": []}]
+    client_cls.return_value.blocks.children.list.return_value = {"results": []}
+    notion.tool_slot = pipeline._slots["notion"]
+
+    with patch("src.retry.time.sleep"):
+        assert notion.search_workspace("acme") == []
+    assert notion.fetch_page_content("p1") == ""
+    s = notion.tool_slot.snapshot()
+    assert (s["calls"], s["errors"], s["in_flight"]) == (3, 1, 0)  # Every attempt, 429 included
+
+
+def test_async_adaptive_limit_caps_tasks():
+    import asyncio
+    from src.concurrency import AsyncAdaptiveLimit
+
+    limit = AsyncAdaptiveLimit("openai", 3, maximum=3)
+    in_flight = {"now": 0, "peak": 0}
+
+    async def work():
+        async with limit:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(10)))
+
+    asyncio.run(main())
+    assert in_flight["peak"] == 3
+    assert limit.snapshot()["in_flight"] == 0
+
+
+# ---------------------------------------------------------------------------
+# Run metrics and report
+# ---------------------------------------------------------------------------
+
+def test_run_metrics_time_stages_and_count_errors():
+    from src.metrics import RunMetrics
+
+    clock = _FakeClock()
+    m = RunMetrics(clock=clock)
+    for seconds in (0.2, 0.7, 3.0):
+        with m.timed("download"):
+            clock.now += seconds
+    with pytest.raises(RuntimeError):
+        with m.timed("extract"):
+            clock.now += 400
+            raise RuntimeError("pdfminer")
+    m.add("bytes_downloaded", 1024)
+
+    snap = m.snapshot()
+    download = snap["stages"]["download"]
+    assert (download["count"], download["sum"], download["max"]) == (3, 3.9, 3.0)
+    assert download["buckets"]["0.25"] == 1 and download["buckets"]["1.0"] == 1
+    assert download["p50"] == 1.0 and download["p95"] == 5.0
+    assert snap["stages"]["extract"]["buckets"]["+Inf"] == 1
+    assert snap["counters"] == {"bytes_downloaded": 1024, "extract_errors": 1}
+
+
+def test_add_usage_counts_response_tokens():
+    from types import SimpleNamespace as NS
+    from src import metrics
+
+    m = metrics.start_run()
+    metrics.add_usage(NS(input_tokens=1200, output_tokens=300,
+                         input_tokens_details=NS(cached_tokens=1024)))
+    metrics.add_usage(MagicMock())  # No integer counts: ignored
+    metrics.add_usage(None)
+    assert m.snapshot()["counters"] == {
+        "cached_tokens": 1024, "input_tokens": 1200, "output_tokens": 300,
+    }
+
+
+def test_run_writes_json_report_and_prometheus_textfile(tmp_path):
+    pipeline = _make_pipeline()
+    pipeline.config.report_dir = str(tmp_path / "reports")
+    pipeline.config.prometheus_textfile = str(tmp_path / "textfile" / "pipeline.prom")
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1), _drive_file(2)]
+    pipeline.notion.search_workspace.return_value = []
+    pipeline.openai = _fake_sync_openai(0)
+    pipeline.notion.create_page.side_effect = [_transient(502), "page-1", "page-2"]
+
+    with patch("src.retry.time.sleep"):
+        assert pipeline.run()["processed"] == 2
+
+    (name,) = os.listdir(tmp_path / "reports")
+    with open(tmp_path / "reports" / name) as f:
+        report = json.load(f)
+    assert report["documents"] == {"total": 2, "processed": 2, "skipped": 0, "failed": 0}
+    stages = report["stages"]
+    for stage in ("title_check", "download", "hash_check", "extract", "enrich", "notion_write"):
+        assert stages[stage]["count"] == 2, stage
+    assert stages["enrich_iteration"]["count"] == 4  # A tool turn and a final turn each
+    assert stages["tool_call"]["count"] == 2
+    assert report["counters"]["bytes_downloaded"] == len(b"f1") + len(b"f2")
+    assert report["concurrency"]["openai"]["calls"] == 4
+    assert report["retries"]["notion"]["retries"] == 1
+
+    prom = (tmp_path / "textfile" / "pipeline.prom").read_text()
+    assert 'knowledge_pipeline_stage_seconds_count{stage="download"} 2' in prom
+    assert 'knowledge_pipeline_stage_seconds_bucket{stage="download",le="+Inf"} 2' in prom
+    assert 'knowledge_pipeline_documents{outcome="processed"} 2' in prom
+    assert 'knowledge_pipeline_concurrency_limit{service="openai"}' in prom
+    assert 'knowledge_pipeline_retries_total{service="notion",event="retries"} 1' in prom
+
+
+# ---------------------------------------------------------------------------
+# Profiling (--profile)
+# ---------------------------------------------------------------------------
+
+def test_profiler_writes_per_document_profiles_and_flags_outliers(tmp_path, capsys):
+    import pstats
+    import tracemalloc
+
+    from src.profiling import DocumentProfiler
+
+    clock = iter([0.0, 0.5, 10.0, 14.0])
+    profiler = DocumentProfiler(str(tmp_path), top=5, clock=lambda: next(clock))
+    held = []
+    with profiler.document({"id": "small", "name": "small.pdf"}):
+        held.append(bytearray(1024))
+    with profiler.document({"id": "big", "name": "big.pdf"}):
+        held.append(bytearray(8 * 1_048_576))
+    path = profiler.report(count=1)
+
+    assert not tracemalloc.is_tracing()
+    assert pstats.Stats(str(tmp_path / "small.prof")).total_calls > 0
+    allocations = (tmp_path / "big.alloc.txt").read_text()
+    assert "big.pdf (big): 4.00s" in allocations
+    assert "test_pipeline.py" in allocations  # The bytearray line
+    with open(path) as f:
+        summary = json.load(f)
+    assert summary["slowest"] == ["big"]
+    assert summary["most_memory"] == ["big"]
+    assert [d["file_id"] for d in summary["documents"]] == ["big", "small"]
+    out = capsys.readouterr().out
+    assert "slowest: big big.pdf (4.00s)" in out
+    assert "memory:  big big.pdf (peak 8.0 MB)" in out
+
+
+def test_pipeline_profiles_one_document_at_a_time(tmp_path):
+    from src.profiling import build_profiler
+
+    pipeline = _make_pipeline(workers=4)
+    pipeline.config.profile = True
+    pipeline.config.profile_dir = str(tmp_path)
+    pipeline.profiler = build_profiler(pipeline.config)
+    pipeline.drive.iter_pdfs.return_value = [_drive_file(1), _drive_file(2)]
+
+    with patch("src.pipeline.enrich", return_value=_ENRICHED), \
+            patch("src.pipeline.ThreadPoolExecutor") as pool:
+        assert pipeline.run()["processed"] == 2
+
+    pool.assert_not_called()
+    (run_dir,) = os.listdir(tmp_path)
+    assert sorted(os.listdir(tmp_path / run_dir)) == [
+        "f1.alloc.txt", "f1.prof", "f2.alloc.txt", "f2.prof", "summary.json"
+    ]
+
+
+def test_single_worker_tools_and_sections_run_on_the_calling_thread():
+    """--profile sets one worker each so cProfile, which is per thread, sees them."""
+    import threading
+    from types import SimpleNamespace
+    from src.enrichment import _execute_tools, build_digest
+
+    threads = set()
+
+    def create(**kwargs):
+        threads.add(threading.get_ident())
+        response = MagicMock()
+        response.output_text = "Section summary."
+        return response
+
+    client = MagicMock()
+    client.responses.create.side_effect = create
+    config = OpenAIConfig(api_key="sk-test", chunk_tokens=100, digest_workers=1)
+    _, sections = build_digest("word " * 1000, config, client)
+
+    call = SimpleNamespace(name="search_notion", arguments='{"query": "q"}')
+    notion = MagicMock()
+    notion.search_workspace.side_effect = lambda *a, **k: threads.add(threading.get_ident()) or []
+    _execute_tools([call, call], notion, workers=1)
+
+    assert sections > 1 and notion.search_workspace.call_count == 2
+    assert threads == {threading.get_ident()}
+
+
+def test_pipeline_without_profile_does_not_trace():
+    import tracemalloc
+
+    pipeline = _make_pipeline()
+    assert pipeline.profiler is None
+    with patch("src.pipeline.enrich", return_value=_ENRICHED):
+        assert pipeline.process_one(_drive_file(1)) == "processed"
+    assert not tracemalloc.is_tracing()